@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
-import { getIncident } from '../utils/api';
+import { getIncident, downloadVideo, getVideoStreamUrl } from '../utils/api';
 
 const IncidentDetail = () => {
     const { incidentId } = useParams();
@@ -9,6 +9,10 @@ const IncidentDetail = () => {
     const { isAuthenticated } = useAuth();
     const videoRef = useRef(null);
     const playerContainerRef = useRef(null);
+    // Streaming: el token de la URL caduca; se vuelve a pedir al fallar la carga
+    const streamPathRef = useRef(null);
+    const tokenRenewedRef = useRef(false);
+    const resumeRef = useRef(null);
 
     const [incident, setIncident] = useState(null);
     const [loading, setLoading] = useState(true);
@@ -72,24 +76,31 @@ const IncidentDetail = () => {
             setLoading(true);
             setError(null);
 
-            console.log(`🔍 Obteniendo incidente ${incidentId} con Base64...`);
+            console.log(`🔍 Obteniendo incidente ${incidentId}...`);
 
             const data = await getIncident(incidentId);
             console.log('📊 Datos del incidente recibidos:', data);
 
             setIncident(data);
 
-            if (data.video_base64) {
+            const videoInfoData = {
+                duration: parseFloat(data.video_duration) || 0,
+                fps: parseInt(data.video_fps) || 15,
+                codec: data.video_codec || 'mp4v',
+                resolution: data.video_resolution || '640x480',
+                file_size: parseInt(data.video_file_size) || 0
+            };
+
+            if (data.video_stream_url) {
+                // El navegador descarga por rangos: reproduce y salta sin bajar el video entero
+                console.log(`🎥 Video por streaming: ${data.video_stream_url}`);
+                setVideoInfo(videoInfoData);
+                streamPathRef.current = data.video_stream_url;
+                setVideoBase64(await getVideoStreamUrl(data.video_stream_url));
+                setVideoError(null);
+            } else if (data.video_base64) {
                 console.log(`🎥 Base64 encontrado: ${data.video_base64.length} caracteres`);
 
-                const videoInfoData = {
-                    duration: parseFloat(data.video_duration) || 0,
-                    fps: parseInt(data.video_fps) || 15,
-                    codec: data.video_codec || 'mp4v',
-                    resolution: data.video_resolution || '640x480',
-                    file_size: parseInt(data.video_file_size) || 0
-                };
-
                 setVideoInfo(videoInfoData);
                 await processVideoBase64(data.video_base64, data.video_codec || 'mp4v');
             } else {
@@ -164,9 +175,43 @@ const IncidentDetail = () => {
             setVideoLoaded(true);
             setIsBuffering(false);
             console.log('🎥 Video cargado - Duración:', videoRef.current.duration);
+
+            // Tras renovar el token se retoma donde estaba el usuario
+            const resume = resumeRef.current;
+            if (resume) {
+                resumeRef.current = null;
+                videoRef.current.currentTime = resume.time;
+                if (resume.playing) {
+                    videoRef.current.play().catch(() => {});
+                }
+            }
+            tokenRenewedRef.current = false;
         }
     };
 
+    const handleVideoError = async (e) => {
+        // Token caducado (401 al reproducir o saltar): pedir uno nuevo una sola vez
+        if (streamPathRef.current && !tokenRenewedRef.current) {
+            tokenRenewedRef.current = true;
+            const video = videoRef.current;
+            resumeRef.current = {
+                time: video ? video.currentTime : 0,
+                playing: video ? !video.paused : false
+            };
+            try {
+                console.log('🔑 Renovando token de reproducción del video');
+                setVideoBase64(await getVideoStreamUrl(streamPathRef.current));
+                return;
+            } catch (err) {
+                console.error('❌ Error renovando token del video:', err);
+            }
+        }
+
+        console.error('Error en video:', e);
+        setVideoError('Error al cargar el video');
+        setIsBuffering(false);
+    };
+
     const handleSeek = (e) => {
         if (!videoRef.current) {
             return;
@@ -227,19 +272,26 @@ const IncidentDetail = () => {
         return `${minutes}:${seconds.toString().padStart(2, '0')}`;
     };
 
-    const handleDownloadVideo = () => {
+    const handleDownloadVideo = async () => {
         try {
             if (!videoBase64) {
                 alert('No hay video disponible para descargar');
                 return;
             }
 
+            // Con streaming el src es una URL de otro origen: se descarga como blob
+            const isDataUrl = videoBase64.startsWith('data:');
+            const href = isDataUrl ? videoBase64 : URL.createObjectURL(await downloadVideo(incidentId));
+
             const link = document.createElement('a');
-            link.href = videoBase64;
+            link.href = href;
             link.download = `evidencia_incidente_${incidentId}.mp4`;
             document.body.appendChild(link);
             link.click();
             document.body.removeChild(link);
+            if (!isDataUrl) {
+                URL.revokeObjectURL(href);
+            }
 
             console.log('📥 Descarga de video iniciada');
         } catch (err) {
@@ -434,11 +486,7 @@ const IncidentDetail = () => {
                                                 onPause={() => setIsPlaying(false)}
                                                 onWaiting={() => setIsBuffering(true)}
                                                 onCanPlay={() => setIsBuffering(false)}
-                                                onError={(e) => {
-                                                    console.error('Error en video:', e);
-                                                    setVideoError('Error al cargar el video');
-                                                    setIsBuffering(false);
-                                                }}
+                                                onError={handleVideoError}
                                                 preload="metadata"
                                             />
 
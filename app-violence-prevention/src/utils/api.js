@@ -117,6 +117,14 @@ export const getVideoInfo = async (incidentId) => {
     }
 };
 
+// URL del video para <video src>: el navegador pide rangos (206) y en la query va
+// un token de reproducción corto y válido solo para este video, nunca el de sesión
+export const getVideoStreamUrl = async (streamPath) => {
+    const response = await api.post(`${streamPath}/token`);
+    const separator = streamPath.includes('?') ? '&' : '?';
+    return `${API_URL}${streamPath}${separator}token=${encodeURIComponent(response.data.token)}`;
+};
+
 export const downloadVideo = async (incidentId) => {
     try {
         const response = await api.get(`/api/v1/files/videos/${incidentId}`, {
@@ -0,0 +1,93 @@
+"""
+Vistas derivadas de un frame (visualización, detector, clasificador) calculadas una sola vez
+"""
+import cv2
+import threading
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import configuracion
+
+
+class VistasFrame:
+    """
+    Pirámide perezosa de resoluciones de un frame capturado
+
+    Cada vista se obtiene del frame original ajustándolo dentro de una caja
+    sin deformarlo (se conserva el aspect ratio, nunca se amplía) y se
+    memoiza: todos los consumidores del frame (streaming, YOLO, TimesFormer)
+    comparten el mismo redimensionado. El frame original es de solo lectura.
+
+    Las dimensiones resultantes se redondean a números pares para que
+    también sirvan directamente a los codificadores YUV420.
+    """
+
+    def __init__(self, frame: np.ndarray):
+        self.original = frame
+        self._vistas: Dict[Tuple[int, int, int], Tuple[np.ndarray, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def forma(self) -> Tuple[int, int]:
+        return self.original.shape[:2]
+
+    def redimensionada(
+        self,
+        ancho_max: int,
+        alto_max: int,
+        interpolacion: int = cv2.INTER_LINEAR
+    ) -> Tuple[np.ndarray, float]:
+        """
+        Frame ajustado dentro de `ancho_max` x `alto_max`
+
+        Returns:
+            (imagen, escala) con escala = lado de la vista / lado del original
+        """
+        clave = (ancho_max, alto_max, interpolacion)
+        with self._lock:
+            vista = self._vistas.get(clave)
+            if vista is not None:
+                return vista
+
+            alto, ancho = self.original.shape[:2]
+            escala = min(ancho_max / ancho, alto_max / alto, 1.0)
+            nuevo_ancho = max(2, int(round(ancho * escala)) // 2 * 2)
+            nuevo_alto = max(2, int(round(alto * escala)) // 2 * 2)
+
+            if (nuevo_ancho, nuevo_alto) == (ancho, alto):
+                vista = (self.original, 1.0)
+            else:
+                imagen = cv2.resize(self.original, (nuevo_ancho, nuevo_alto), interpolation=interpolacion)
+                vista = (imagen, nuevo_ancho / ancho)
+
+            self._vistas[clave] = vista
+            return vista
+
+    def visualizacion(self, ancho: Optional[int] = None, alto: Optional[int] = None) -> np.ndarray:
+        """Vista para streaming (por defecto DISPLAY_WIDTH x DISPLAY_HEIGHT)"""
+        imagen, _ = self.redimensionada(
+            ancho or configuracion.DISPLAY_WIDTH,
+            alto or configuracion.DISPLAY_HEIGHT
+        )
+        return imagen
+
+    def detector(self, tamano_entrada: Tuple[int, int]) -> Tuple[np.ndarray, float]:
+        """Vista para YOLO: cabe en su entrada, así el letterbox solo añade padding"""
+        ancho, alto = tamano_entrada
+        return self.redimensionada(ancho, alto)
+
+    def clasificador(self) -> np.ndarray:
+        """Vista para TimesFormer (reducción con INTER_AREA, como su preprocesado)"""
+        tamano = configuracion.TIMESFORMER_CONFIG["input_size"]
+        imagen, _ = self.redimensionada(tamano, tamano, cv2.INTER_AREA)
+        return imagen
+
+    @staticmethod
+    def a_original(detecciones: List[Dict[str, Any]], escala: float) -> List[Dict[str, Any]]:
+        """Lleva cajas [x, y, w, h] de una vista a coordenadas del frame original"""
+        if escala == 1.0:
+            return detecciones
+        inversa = 1.0 / escala
+        return [
+            {**deteccion, 'bbox': [valor * inversa for valor in deteccion['bbox']]}
+            for deteccion in detecciones
+        ]
@@ -0,0 +1,257 @@
+"""
+Planificadores de micro-lotes para inferencia compartida entre cámaras
+"""
+import asyncio
+import time
+from abc import ABC, abstractmethod
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from app.ai.timesformer_engine import MotorTimesFormer
+from app.config import configuracion
+from app.utils.logger import obtener_logger
+
+logger = obtener_logger(__name__)
+
+
+class PlanificadorLotes(ABC):
+    """
+    Base para agrupar peticiones de todos los pipelines activos en lotes
+
+    Los trabajadores esperan la primera petición, acumulan las que lleguen
+    hasta `tamano_lote` o hasta que venza el plazo máximo de espera, ejecutan
+    el lote completo en el executor y devuelven a cada llamador su resultado
+    a través de su futuro.
+    """
+
+    nombre = "lotes"
+
+    def __init__(self, tamano_lote: int, espera_maxima_ms: float):
+        self.tamano_lote = tamano_lote
+        self.espera_maxima = espera_maxima_ms / 1000.0
+
+        self._cola: Optional[asyncio.Queue] = None
+        self._trabajadores: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Estadísticas
+        self.lotes_ejecutados = 0
+        self.elementos_procesados = 0
+        self.tiempo_total_lotes = 0.0
+
+    def _preparar(self):
+        """Resuelve el modelo a usar antes de arrancar los trabajadores"""
+
+    def _numero_trabajadores(self) -> int:
+        return 1
+
+    @abstractmethod
+    def _ejecutar_lote(self, elementos: List[Any]) -> List[Any]:
+        """Ejecuta el lote de forma síncrona (en el executor) y devuelve un resultado por elemento"""
+
+    def _iniciar(self):
+        """Crea la cola y los trabajadores en el loop actual"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._cola is not None:
+            return
+
+        self._preparar()
+
+        self._loop = loop
+        self._cola = asyncio.Queue()
+        self._trabajadores = [
+            loop.create_task(self._trabajador(i))
+            for i in range(self._numero_trabajadores())
+        ]
+        print(f"🧮 Planificador de {self.nombre} iniciado: lote máx {self.tamano_lote}, "
+              f"espera máx {self.espera_maxima * 1000:.0f}ms, {len(self._trabajadores)} trabajadores")
+
+    async def enviar(self, elemento: Any) -> Any:
+        """Encola un elemento y espera su resultado"""
+        self._iniciar()
+        futuro = self._loop.create_future()
+        await self._cola.put((elemento, futuro))
+        return await futuro
+
+    async def _recolectar_lote(self) -> List[Tuple[Any, asyncio.Future]]:
+        """Espera el primer elemento y acumula más hasta llenar el lote o vencer el plazo"""
+        lote = [await self._cola.get()]
+        limite = self._loop.time() + self.espera_maxima
+
+        while len(lote) < self.tamano_lote:
+            restante = limite - self._loop.time()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(self._cola.get(), timeout=restante))
+            except asyncio.TimeoutError:
+                break
+
+        # Descartar peticiones cuyos llamadores ya no esperan
+        return [(elemento, futuro) for elemento, futuro in lote if not futuro.done()]
+
+    async def _trabajador(self, indice: int):
+        """Bucle de un trabajador: recolecta, infiere y reparte resultados"""
+        while True:
+            try:
+                lote = await self._recolectar_lote()
+                if not lote:
+                    continue
+
+                elementos = [elemento for elemento, _ in lote]
+
+                inicio = time.perf_counter()
+                try:
+                    resultados = await self._loop.run_in_executor(None, self._ejecutar_lote, elementos)
+                except Exception as e:
+                    for _, futuro in lote:
+                        if not futuro.done():
+                            futuro.set_exception(e)
+                    continue
+
+                self.tiempo_total_lotes += time.perf_counter() - inicio
+                self.lotes_ejecutados += 1
+                self.elementos_procesados += len(lote)
+
+                for (_, futuro), resultado in zip(lote, resultados):
+                    if not futuro.done():
+                        futuro.set_result(resultado)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error en trabajador {indice} del planificador de {self.nombre}: {e}")
+                print(f"❌ Error en trabajador {indice} del planificador de {self.nombre}: {e}")
+
+    def detener(self):
+        """Cancela los trabajadores y las peticiones pendientes"""
+        for tarea in self._trabajadores:
+            tarea.cancel()
+        self._trabajadores = []
+
+        if self._cola is not None:
+            while not self._cola.empty():
+                _, futuro = self._cola.get_nowait()
+                if not futuro.done():
+                    futuro.cancel()
+        self._cola = None
+        self._loop = None
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        """Obtiene estadísticas del planificador"""
+        return {
+            'tamano_lote_maximo': self.tamano_lote,
+            'espera_maxima_ms': self.espera_maxima * 1000,
+            'lotes_ejecutados': self.lotes_ejecutados,
+            'elementos_procesados': self.elementos_procesados,
+            'elementos_por_lote_promedio': (
+                self.elementos_procesados / self.lotes_ejecutados if self.lotes_ejecutados else 0.0
+            ),
+            'latencia_lote_promedio_ms': (
+                self.tiempo_total_lotes / self.lotes_ejecutados * 1000 if self.lotes_ejecutados else 0.0
+            ),
+            'en_cola': self._cola.qsize() if self._cola is not None else 0
+        }
+
+
+class PlanificadorInferencia(PlanificadorLotes):
+    """
+    Agrupa los clips TimesFormer listos de todas las cámaras
+
+    Cada clip llega como tensor [1, C, T, H, W]; se apilan en la dimensión
+    de batch y cada llamador recibe sus logits (array 1D).
+    """
+
+    nombre = "TimesFormer"
+
+    def __init__(
+        self,
+        motor: Optional[MotorTimesFormer] = None,
+        tamano_lote: Optional[int] = None,
+        espera_maxima_ms: Optional[float] = None,
+        precision: Optional[str] = None
+    ):
+        super().__init__(
+            tamano_lote or configuracion.MAX_BATCH_SIZE,
+            espera_maxima_ms if espera_maxima_ms is not None
+            else configuracion.TIMESFORMER_BATCH_MAX_WAIT_MS
+        )
+        self.motor = motor
+        self.precision = precision
+
+    def _preparar(self):
+        if self.motor is None:
+            from app.ai.model_loader import cargador_modelos
+            self.motor = cargador_modelos.obtener_motor_timesformer(self.precision)
+
+        # Un modelo exportado con batch fijo limita el tamaño de lote
+        if self.motor.lote_maximo:
+            self.tamano_lote = min(self.tamano_lote, self.motor.lote_maximo)
+
+    def _numero_trabajadores(self) -> int:
+        return self.motor.max_concurrencia
+
+    def _ejecutar_lote(self, tensores: List[np.ndarray]) -> List[np.ndarray]:
+        entrada = tensores[0] if len(tensores) == 1 else np.concatenate(tensores, axis=0)
+        logits = self.motor.inferir(entrada)[0]
+        return [logits[i] for i in range(len(tensores))]
+
+
+class PlanificadorPersonas(PlanificadorLotes):
+    """
+    Agrupa los frames de todas las cámaras para detección de personas YOLO
+
+    Cada llamador envía `(detector, frame)` con el detector de su pipeline y
+    recibe su lista de detecciones. Los frames de detectores equivalentes
+    (mismo modelo y umbral) se infieren juntos en una sola pasada.
+    """
+
+    nombre = "YOLO"
+
+    def __init__(
+        self,
+        tamano_lote: Optional[int] = None,
+        espera_maxima_ms: Optional[float] = None
+    ):
+        super().__init__(
+            tamano_lote or configuracion.YOLO_MAX_BATCH_SIZE,
+            espera_maxima_ms if espera_maxima_ms is not None
+            else configuracion.YOLO_BATCH_MAX_WAIT_MS
+        )
+
+    def _ejecutar_lote(self, elementos: List[Tuple[Any, np.ndarray]]) -> List[List[Dict[str, Any]]]:
+        grupos: Dict[Tuple[int, float], List[int]] = {}
+        for indice, (detector, _) in enumerate(elementos):
+            grupos.setdefault((id(detector.modelo), detector.confianza_minima), []).append(indice)
+
+        resultados: List[List[Dict[str, Any]]] = [[] for _ in elementos]
+        for indices in grupos.values():
+            detector = elementos[indices[0]][0]
+            detecciones = detector.detectar_lote([elementos[i][1] for i in indices])
+            for indice, deteccion in zip(indices, detecciones):
+                resultados[indice] = deteccion
+        return resultados
+
+
+# Instancias globales de los planificadores
+planificador_inferencia = PlanificadorInferencia()
+planificador_personas = PlanificadorPersonas()
+
+_planificadores_timesformer: Dict[str, PlanificadorInferencia] = {}
+
+
+def obtener_planificador_timesformer(precision: Optional[str] = None) -> PlanificadorInferencia:
+    """Planificador del motor TimesFormer de la precisión indicada (uno por motor)"""
+    precision = (precision or configuracion.TIMESFORMER_PRECISION).lower()
+    if precision == configuracion.TIMESFORMER_PRECISION.lower():
+        return planificador_inferencia
+    if precision not in _planificadores_timesformer:
+        _planificadores_timesformer[precision] = PlanificadorInferencia(precision=precision)
+    return _planificadores_timesformer[precision]
+
+
+def detener_planificadores():
+    """Detiene todos los planificadores activos"""
+    planificador_inferencia.detener()
+    planificador_personas.detener()
+    for planificador in _planificadores_timesformer.values():
+        planificador.detener()
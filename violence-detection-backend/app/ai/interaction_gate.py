@@ -0,0 +1,115 @@
+"""
+Compuerta de interacción entre personas antes de la clasificación de violencia
+"""
+import numpy as np
+from typing import Dict, Any, List, Optional
+from app.config import configuracion
+
+
+class CompuertaInteraccion:
+    """
+    Primera etapa de la cascada YOLO → TimesFormer
+
+    Un frame es una interacción plausible cuando hay al menos `min_personas`
+    detectadas y alguna pareja está cerca: su IoU alcanza `iou_minimo` o la
+    distancia entre centros, relativa a la altura media de ambas cajas, no
+    supera `distancia_maxima`. La compuerta se abre tras `frames_minimos`
+    frames consecutivos con interacción y se mantiene `frames_retencion`
+    frames más después de perderla.
+    """
+
+    def __init__(
+        self,
+        min_personas: Optional[int] = None,
+        distancia_maxima: Optional[float] = None,
+        iou_minimo: Optional[float] = None,
+        frames_minimos: Optional[int] = None,
+        frames_retencion: Optional[int] = None
+    ):
+        self.habilitada = configuracion.INTERACTION_GATE_ENABLED
+        self.min_personas = min_personas or configuracion.INTERACTION_MIN_PERSONS
+        self.distancia_maxima = (
+            distancia_maxima if distancia_maxima is not None else configuracion.INTERACTION_MAX_DISTANCE
+        )
+        self.iou_minimo = iou_minimo if iou_minimo is not None else configuracion.INTERACTION_MIN_IOU
+        self.frames_minimos = frames_minimos or configuracion.INTERACTION_MIN_FRAMES
+        self.frames_retencion = (
+            frames_retencion if frames_retencion is not None else configuracion.INTERACTION_HOLD_FRAMES
+        )
+
+        self.clips_puntuados = 0
+        self.clips_omitidos = 0
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.frames_consecutivos = 0
+        self._retencion_restante = 0
+        self.abierta = False
+
+    def _hay_pareja_cercana(self, detecciones: List[Dict[str, Any]]) -> bool:
+        """Comprueba de forma vectorizada si alguna pareja de cajas [x, y, w, h] está cerca"""
+        cajas = np.array([d['bbox'] for d in detecciones], dtype=np.float32)
+        x1, y1 = cajas[:, 0], cajas[:, 1]
+        x2, y2 = x1 + cajas[:, 2], y1 + cajas[:, 3]
+        areas = cajas[:, 2] * cajas[:, 3]
+
+        # Solapamiento (IoU) entre todas las parejas
+        ancho = np.clip(np.minimum(x2[:, None], x2[None]) - np.maximum(x1[:, None], x1[None]), 0, None)
+        alto = np.clip(np.minimum(y2[:, None], y2[None]) - np.maximum(y1[:, None], y1[None]), 0, None)
+        interseccion = ancho * alto
+        iou = interseccion / (areas[:, None] + areas[None] - interseccion + 1e-7)
+
+        # Distancia entre centros normalizada por la altura media (independiente de la profundidad)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        distancia = np.hypot(cx[:, None] - cx[None], cy[:, None] - cy[None])
+        altura_media = (cajas[:, 3][:, None] + cajas[:, 3][None]) / 2 + 1e-7
+        distancia_relativa = distancia / altura_media
+
+        cercanas = (iou >= self.iou_minimo) | (distancia_relativa <= self.distancia_maxima)
+        np.fill_diagonal(cercanas, False)
+        return bool(cercanas.any())
+
+    def evaluar(self, detecciones: List[Dict[str, Any]]) -> bool:
+        """
+        Actualiza el estado con las detecciones de un frame
+
+        Returns:
+            True si los clips actuales merecen pasar a TimesFormer
+        """
+        if not self.habilitada:
+            self.abierta = True
+            return True
+
+        interaccion = (
+            len(detecciones) >= self.min_personas and self._hay_pareja_cercana(detecciones)
+        )
+
+        if interaccion:
+            self.frames_consecutivos += 1
+            if self.frames_consecutivos >= self.frames_minimos:
+                self._retencion_restante = self.frames_retencion
+        else:
+            self.frames_consecutivos = 0
+            if self._retencion_restante > 0:
+                self._retencion_restante -= 1
+
+        self.abierta = self.frames_consecutivos >= self.frames_minimos or self._retencion_restante > 0
+        return self.abierta
+
+    def registrar_clip(self, puntuado: bool):
+        """Contabiliza una ventana lista para inferir según se haya evaluado u omitido"""
+        if puntuado:
+            self.clips_puntuados += 1
+        else:
+            self.clips_omitidos += 1
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        total = self.clips_puntuados + self.clips_omitidos
+        return {
+            'habilitada': self.habilitada,
+            'abierta': self.abierta,
+            'frames_consecutivos': self.frames_consecutivos,
+            'clips_puntuados': self.clips_puntuados,
+            'clips_omitidos': self.clips_omitidos,
+            'ratio_omision': self.clips_omitidos / total if total else 0.0
+        }
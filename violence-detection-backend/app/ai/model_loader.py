@@ -1,12 +1,11 @@
 """
 Cargador de modelos de IA
 """
-import torch
-import onnxruntime as ort
-import numpy as np
+import threading
 from pathlib import Path
-from typing import Dict, Any, Optional, Union
-from ultralytics import YOLO
+from typing import Any, Optional, Union
+from app.ai.timesformer_engine import MotorTimesFormer
+from app.ai.yolo_onnx import ModeloYoloOnnx
 from app.config import configuracion
 from app.utils.logger import obtener_logger
 
@@ -20,25 +19,64 @@ class CargadorModelos:
     def __init__(self):
         self.device = self._configurar_dispositivo()
         self.modelos = {}
+        self._lock_timesformer = threading.Lock()
     
     def _configurar_dispositivo(self) -> str:
         """Configura el dispositivo (GPU/CPU)"""
-        if configuracion.USE_GPU and torch.cuda.is_available():
-            device = f"cuda:{configuracion.GPU_DEVICE}"
-            logger.info(f"Usando GPU: {torch.cuda.get_device_name(configuracion.GPU_DEVICE)}")
-            print(f"Usando GPU: {torch.cuda.get_device_name(configuracion.GPU_DEVICE)}")
-        else:
-            device = "cpu"
-            logger.warning("GPU no disponible, usando CPU")
-            print("GPU no disponible, usando CPU")
+        # torch solo se importa si se pidió GPU: en CPU el camino de servicio no lo necesita
+        if configuracion.USE_GPU:
+            import torch
+            if torch.cuda.is_available():
+                device = f"cuda:{configuracion.GPU_DEVICE}"
+                logger.info(f"Usando GPU: {torch.cuda.get_device_name(configuracion.GPU_DEVICE)}")
+                print(f"Usando GPU: {torch.cuda.get_device_name(configuracion.GPU_DEVICE)}")
+                return device
         
-        return device
+        logger.warning("GPU no disponible, usando CPU")
+        print("GPU no disponible, usando CPU")
+        return "cpu"
     
-    def cargar_yolo(self, ruta_modelo: Optional[Path] = None) -> YOLO:
-        """Carga el modelo YOLO para detección de personas"""
+    def cargar_yolo(self, ruta_modelo: Optional[Path] = None) -> Union[ModeloYoloOnnx, Any]:
+        """
+        Carga el modelo YOLO para detección de personas
+        
+        Un `YOLO_MODEL` terminado en .onnx se sirve con ONNX Runtime; si no
+        existe o falla al cargar, se recurre a `YOLO_MODEL_FALLBACK` con
+        ultralytics/torch.
+        """
+        if ruta_modelo is None:
+            ruta_modelo = configuracion.obtener_ruta_modelo(configuracion.YOLO_MODEL)
+        
+        if ruta_modelo.suffix.lower() == '.onnx':
+            try:
+                return self._cargar_yolo_onnx(ruta_modelo)
+            except Exception as e:
+                logger.warning(f"No se pudo cargar YOLO ONNX ({e}), usando fallback torch")
+                print(f"⚠️ No se pudo cargar YOLO ONNX ({e}), usando fallback torch")
+                ruta_modelo = configuracion.obtener_ruta_modelo(configuracion.YOLO_MODEL_FALLBACK)
+        
+        return self._cargar_yolo_torch(ruta_modelo)
+    
+    def _cargar_yolo_onnx(self, ruta_modelo: Path) -> ModeloYoloOnnx:
+        """Carga YOLO exportado a ONNX (sin torch)"""
+        if not ruta_modelo.exists():
+            raise FileNotFoundError(f"Modelo no encontrado: {ruta_modelo}")
+        
+        logger.info(f"Cargando modelo YOLO ONNX desde: {ruta_modelo}")
+        print(f"Cargando modelo YOLO ONNX desde: {ruta_modelo}")
+        
+        modelo = ModeloYoloOnnx(ruta_modelo)
+        
+        self.modelos['yolo'] = modelo
+        logger.info("Modelo YOLO ONNX cargado exitosamente")
+        print(f"Modelo YOLO ONNX cargado exitosamente ({modelo.ancho}x{modelo.alto})")
+        
+        return modelo
+    
+    def _cargar_yolo_torch(self, ruta_modelo: Path):
+        """Carga YOLO con ultralytics/torch (fallback)"""
         try:
-            if ruta_modelo is None:
-                ruta_modelo = configuracion.obtener_ruta_modelo(configuracion.YOLO_MODEL)
+            from ultralytics import YOLO
             
             logger.info(f"Cargando modelo YOLO desde: {ruta_modelo}")
             print(f"Cargando modelo YOLO desde: {ruta_modelo}")
@@ -63,48 +101,47 @@ class CargadorModelos:
     
     def cargar_timesformer(
         self, 
-        ruta_modelo: Optional[Path] = None
-    ) -> Dict[str, Any]:
-        """Carga el modelo TimesFormer ONNX"""
+        ruta_modelo: Optional[Path] = None,
+        precision: Optional[str] = None
+    ) -> MotorTimesFormer:
+        """Carga el modelo TimesFormer ONNX como motor compartido"""
         try:
+            precision = (precision or configuracion.TIMESFORMER_PRECISION).lower()
             if ruta_modelo is None:
-                ruta_modelo = configuracion.obtener_ruta_modelo(configuracion.TIMESFORMER_MODEL)
-            
-            logger.info(f"Cargando modelo TimesFormer desde: {ruta_modelo}")
-            print(f"Cargando modelo TimesFormer desde: {ruta_modelo}")
-            
-            # Configurar ONNX Runtime
-            opciones = ort.SessionOptions()
-            opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-            opciones.intra_op_num_threads = 4
+                ruta_modelo = configuracion.obtener_ruta_timesformer(precision)
             
-            # Seleccionar provider según disponibilidad de GPU
-            providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] \
-                if configuracion.USE_GPU else ['CPUExecutionProvider']
+            logger.info(f"Cargando modelo TimesFormer ({precision}) desde: {ruta_modelo}")
+            print(f"Cargando modelo TimesFormer ({precision}) desde: {ruta_modelo}")
             
-            # Cargar modelo ONNX
-            modelo = ort.InferenceSession(
-                str(ruta_modelo),
-                providers=providers,
-                sess_options=opciones
-            )
+            # Una única sesión ONNX para todas las cámaras y clientes
+            motor = MotorTimesFormer(ruta_modelo, precision=precision)
             
-            resultado = {
-                'modelo': modelo,
-                'tipo': 'onnx',
-                'config': configuracion.TIMESFORMER_CONFIG
-            }
-            
-            self.modelos['timesformer'] = resultado
+            self.modelos[self._clave_timesformer(precision)] = motor
             logger.info("✅ Modelo TimesFormer ONNX cargado exitosamente")
-            print("✅ Modelo TimesFormer ONNX cargado exitosamente")
+            print(f"✅ Modelo TimesFormer ONNX cargado exitosamente "
+                  f"(concurrencia máx: {motor.max_concurrencia}, hilos: {motor.hilos_intra_op})")
             
-            return resultado
+            return motor
             
         except Exception as e:
             logger.error(f"Error al cargar modelo TimesFormer: {e}")
             raise
     
+    def _clave_timesformer(self, precision: str) -> str:
+        """La precisión configurada ocupa la clave 'timesformer'; las demás, 'timesformer_<precision>'"""
+        if precision == configuracion.TIMESFORMER_PRECISION.lower():
+            return 'timesformer'
+        return f'timesformer_{precision}'
+    
+    def obtener_motor_timesformer(self, precision: Optional[str] = None) -> MotorTimesFormer:
+        """Obtiene el motor TimesFormer compartido, cargándolo si hace falta"""
+        precision = (precision or configuracion.TIMESFORMER_PRECISION).lower()
+        clave = self._clave_timesformer(precision)
+        with self._lock_timesformer:
+            if clave not in self.modelos:
+                self.cargar_timesformer(precision=precision)
+            return self.modelos[clave]
+    
     def cargar_todos_los_modelos(self):
         """Carga todos los modelos necesarios"""
         logger.info("Cargando todos los modelos...")
@@ -140,6 +177,7 @@ class CargadorModelos:
     def liberar_memoria(self):
         """Libera memoria de GPU"""
         if self.device.startswith('cuda'):
+            import torch
             torch.cuda.empty_cache()
             logger.info("Memoria GPU liberada")
             print("Memoria GPU liberada")
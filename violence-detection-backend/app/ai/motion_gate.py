@@ -0,0 +1,146 @@
+"""
+Compuerta de movimiento por cámara para evitar inferencia en escenas estáticas
+"""
+import cv2
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from app.config import configuracion
+
+
+class CompuertaMovimiento:
+    """
+    Decide si un frame tiene movimiento suficiente para ejecutar la detección
+
+    Trabaja sobre una versión reducida en escala de grises del frame y la
+    compara con un fondo de media móvil (`cv2.accumulateWeighted`). Si la
+    fracción de píxeles que cambian supera `area_minima` hay movimiento.
+
+    Tras detectar movimiento se siguen aceptando `frames_retencion` frames para
+    no cortar la ventana de TimesFormer a mitad de una acción, y cada
+    `max_frames_omitidos` frames se fuerza una evaluación para refrescar los
+    resultados reutilizados.
+
+    Las máscaras se definen por cámara en `MOTION_GATE_MASKS` como polígonos en
+    coordenadas normalizadas (0-1); las zonas cubiertas se ignoran (ventanas,
+    pantallas, relojes...).
+    """
+
+    def __init__(
+        self,
+        camara_id: Optional[int] = None,
+        ancho_analisis: Optional[int] = None,
+        umbral_pixel: Optional[int] = None,
+        area_minima: Optional[float] = None,
+        alpha_fondo: Optional[float] = None,
+        frames_retencion: Optional[int] = None,
+        max_frames_omitidos: Optional[int] = None
+    ):
+        self.habilitada = configuracion.MOTION_GATE_ENABLED
+        self.ancho_analisis = ancho_analisis or configuracion.MOTION_GATE_WIDTH
+        self.umbral_pixel = umbral_pixel or configuracion.MOTION_GATE_PIXEL_THRESHOLD
+        self.area_minima = area_minima if area_minima is not None else configuracion.MOTION_GATE_MIN_AREA
+        self.alpha_fondo = alpha_fondo if alpha_fondo is not None else configuracion.MOTION_GATE_BG_ALPHA
+        self.frames_retencion = (
+            frames_retencion if frames_retencion is not None else configuracion.MOTION_GATE_HOLD_FRAMES
+        )
+        self.max_frames_omitidos = max_frames_omitidos or configuracion.MOTION_GATE_MAX_SKIP
+
+        self.camara_id = camara_id
+        self.frames_evaluados = 0
+        self.frames_omitidos = 0
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Descarta el fondo aprendido (p. ej. al cambiar de cámara)"""
+        self._fondo: Optional[np.ndarray] = None
+        self._mascara: Optional[np.ndarray] = None
+        self._forma: Optional[Tuple[int, int]] = None
+        self._retencion_restante = 0
+        self._omitidos_seguidos = 0
+        self.ultima_area_movimiento = 0.0
+
+    def asignar_camara(self, camara_id: int):
+        """Asocia la compuerta a una cámara; cambia de máscara y fondo si es otra"""
+        if camara_id != self.camara_id:
+            self.camara_id = camara_id
+            self.reiniciar()
+
+    def _preparar(self, forma: Tuple[int, int]):
+        """Calcula el tamaño de análisis y la máscara de la cámara para esta resolución"""
+        alto, ancho = forma
+        escala = min(1.0, self.ancho_analisis / ancho)
+        ancho_reducido = max(1, int(round(ancho * escala)))
+        alto_reducido = max(1, int(round(alto * escala)))
+
+        mascara = np.full((alto_reducido, ancho_reducido), 255, dtype=np.uint8)
+        poligonos: List[List[List[float]]] = configuracion.MOTION_GATE_MASKS.get(str(self.camara_id), [])
+        for poligono in poligonos:
+            puntos = np.array(
+                [[x * ancho_reducido, y * alto_reducido] for x, y in poligono], dtype=np.int32
+            )
+            cv2.fillPoly(mascara, [puntos], 0)
+
+        self._forma = forma
+        self._tamano = (ancho_reducido, alto_reducido)
+        self._mascara = mascara
+        self._pixeles_validos = max(1, int(cv2.countNonZero(mascara)))
+        self._fondo = None
+
+    def _area_movimiento(self, frame: np.ndarray) -> float:
+        """Fracción (0-1) de píxeles no enmascarados que difieren del fondo"""
+        if self._forma != frame.shape[:2]:
+            self._preparar(frame.shape[:2])
+
+        gris = cv2.cvtColor(
+            cv2.resize(frame, self._tamano, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY
+        )
+        gris = cv2.GaussianBlur(gris, (5, 5), 0)
+
+        if self._fondo is None:
+            self._fondo = gris.astype(np.float32)
+            return 1.0  # Sin referencia todavía: tratar como movimiento
+
+        diferencia = cv2.absdiff(gris, cv2.convertScaleAbs(self._fondo))
+        _, cambios = cv2.threshold(diferencia, self.umbral_pixel, 255, cv2.THRESH_BINARY)
+        cambios = cv2.bitwise_and(cambios, self._mascara)
+
+        cv2.accumulateWeighted(gris, self._fondo, self.alpha_fondo)
+
+        return cv2.countNonZero(cambios) / self._pixeles_validos
+
+    def evaluar(self, frame: np.ndarray) -> bool:
+        """
+        Evalúa un frame BGR
+
+        Returns:
+            True si debe ejecutarse la detección, False si pueden reutilizarse
+            los últimos resultados
+        """
+        self.frames_evaluados += 1
+        if not self.habilitada:
+            return True
+
+        self.ultima_area_movimiento = self._area_movimiento(frame)
+
+        if self.ultima_area_movimiento >= self.area_minima:
+            self._retencion_restante = self.frames_retencion
+        elif self._retencion_restante > 0:
+            self._retencion_restante -= 1
+        elif self._omitidos_seguidos < self.max_frames_omitidos:
+            self._omitidos_seguidos += 1
+            self.frames_omitidos += 1
+            return False
+
+        self._omitidos_seguidos = 0
+        return True
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {
+            'habilitada': self.habilitada,
+            'frames_evaluados': self.frames_evaluados,
+            'frames_omitidos': self.frames_omitidos,
+            'ratio_omision': (
+                self.frames_omitidos / self.frames_evaluados if self.frames_evaluados else 0.0
+            ),
+            'ultima_area_movimiento': self.ultima_area_movimiento
+        }
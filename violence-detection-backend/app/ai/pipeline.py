@@ -1,7 +1,7 @@
 import cv2
 import numpy as np
 import asyncio
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union
 from datetime import datetime, timedelta
 from collections import deque
 import threading
@@ -11,8 +11,13 @@ import traceback
 import concurrent.futures
 from pathlib import Path
 
+from app.ai.frame_views import VistasFrame
 from app.ai.yolo_detector import DetectorPersonas
 from app.ai.violence_detector import DetectorViolencia
+from app.ai.inference_scheduler import planificador_personas
+from app.ai.score_tracker import SeguidorPuntuacionViolencia
+from app.ai.motion_gate import CompuertaMovimiento
+from app.ai.interaction_gate import CompuertaInteraccion
 from app.services.alarm_service import ServicioAlarma
 from app.services.notification_service import ServicioNotificaciones
 from app.services.incident_service import ServicioIncidentes
@@ -20,17 +25,22 @@ from app.models.incident import TipoIncidente, SeveridadIncidente, EstadoInciden
 from app.utils.video_utils import ProcesadorVideo
 from app.utils.logger import obtener_logger
 from app.config import configuracion
-from app.tasks.video_recorder import evidence_recorder
+from app.tasks.video_recorder import ViolenceEvidenceRecorder
+from app.tasks.preroll_buffer import BufferPreRoll
 from sqlalchemy.ext.asyncio import AsyncSession
 # AGREGAR AL INICIO DEL ARCHIVO (después de los imports existentes):
 from app.services.voice_alert_service import servicio_alertas_voz
 
 logger = obtener_logger(__name__)
 
+# Un único hilo para alimentar los buffers de evidencia: la compresión JPEG no
+# corre en el event loop, y cada grabador sigue recibiendo sus frames en orden
+ejecutor_evidencia = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="evidencia")
+
 class FrameBuffer:
-    """Buffer inteligente para frames con timestamps precisos"""
+    """Buffer inteligente para frames con timestamps precisos (comprimidos en JPEG)"""
     def __init__(self, max_duration_seconds=30):
-        self.frames = deque()
+        self.buffer = BufferPreRoll(max_segundos=max_duration_seconds)
         self.max_duration = max_duration_seconds
         # Pool de hilos para updates de DB
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="db_update")
@@ -40,19 +50,22 @@ class FrameBuffer:
         
     def add_frame(self, frame, timestamp, detecciones=None, violencia_info=None):
         """Agrega un frame con timestamp preciso y información de violencia"""
-        frame_data = {
-            'frame': frame.copy(),
+        # El JPEG ya es una copia: no hace falta frame.copy()
+        self.buffer.agregar(frame, {
             'timestamp': timestamp,
             'detecciones': detecciones or [],
             'violencia_info': violencia_info,
             'processed': False
-        }
-        self.frames.append(frame_data)
-        
-        # Limpiar frames antiguos
-        current_time = timestamp
-        while self.frames and (current_time - self.frames[0]['timestamp']).total_seconds() > self.max_duration:
-            self.frames.popleft()
+        })
+    
+    @property
+    def frames(self):
+        """Entradas del buffer; el frame de cada una se obtiene con decodificar()"""
+        return self.buffer.entradas
+    
+    @staticmethod
+    def decodificar(frame_data):
+        return BufferPreRoll.decodificar(frame_data)
     
     def get_frames_in_range(self, start_time, end_time):
         """Obtiene frames en un rango de tiempo específico"""
@@ -77,8 +90,6 @@ class ViolenceFrameBuffer:
         self.sequence_id = 0
         self.last_violence_state = False
         
-        # MEJORADO: Control de duplicación inteligente
-        self.frame_duplication_factor = 8  # Duplicar cada frame de violencia 8 veces
         self.violence_frame_counter = 0
         
     def start_violence_sequence(self, start_time):
@@ -93,15 +104,14 @@ class ViolenceFrameBuffer:
             'end_time': None,
             'frames': [],
             'max_probability': 0.0,
-            'total_frames': 0,
-            'duplicated_frames': 0  # NUEVO: Contador de frames duplicados
+            'total_frames': 0
         }
         self.last_violence_state = True
         print(f"🔴 NUEVA SECUENCIA DE VIOLENCIA INICIADA: #{self.sequence_id}")
         print(f"🚨 INICIO DE VIOLENCIA DETECTADA: {start_time}")
     
     def add_violence_frame(self, frame, timestamp, detecciones, violencia_info):
-        """MEJORADO: Agrega frame con MÁXIMA duplicación para video robusto"""
+        """Agrega un frame de violencia (una sola vez: la duración del video la dan los timestamps)"""
         if not violencia_info or not violencia_info.get('detectada'):
             return
         
@@ -111,53 +121,28 @@ class ViolenceFrameBuffer:
         # Crear overlay de violencia en el frame
         frame_with_overlay = self._add_violence_overlay(frame.copy(), violencia_info, detecciones)
         
-        # FRAME ORIGINAL con overlay
         violence_frame_data = {
             'frame': frame_with_overlay,
-            'original_frame': frame.copy(),
             'timestamp': timestamp,
             'detecciones': detecciones,
             'violencia_info': violencia_info,
             'probability': probability,
             'sequence_id': self.sequence_id if self.current_sequence else 0,
-            'is_violence': True,
-            'frame_type': 'original',
-            'duplicate_id': 0
+            'is_violence': True
         }
         
-        # Agregar frame original
         self.violence_frames.append(violence_frame_data)
         
-        # DUPLICACIÓN MASIVA para garantizar presencia en el video
-        for i in range(self.frame_duplication_factor):
-            duplicate_frame = {
-                'frame': frame_with_overlay.copy(),
-                'original_frame': frame.copy(),
-                'timestamp': timestamp + timedelta(microseconds=i*1000),  # Micro-offset para orden
-                'detecciones': detecciones,
-                'violencia_info': violencia_info,
-                'probability': probability,
-                'sequence_id': self.sequence_id if self.current_sequence else 0,
-                'is_violence': True,
-                'frame_type': 'duplicate',
-                'duplicate_id': i + 1,
-                'parent_frame': self.violence_frame_counter
-            }
-            self.violence_frames.append(duplicate_frame)
-        
         # Agregar a la secuencia actual
         if self.current_sequence:
             self.current_sequence['frames'].append(violence_frame_data)
             self.current_sequence['total_frames'] += 1
-            self.current_sequence['duplicated_frames'] += self.frame_duplication_factor
             self.current_sequence['end_time'] = timestamp
             if probability > self.current_sequence['max_probability']:
                 self.current_sequence['max_probability'] = probability
         
         # Log cada frame de violencia para verificación
-        total_frames_added = 1 + self.frame_duplication_factor
         print(f"🔥 Frame de VIOLENCIA capturado - Prob: {probability:.3f} - Frame #{self.violence_frame_counter}")
-        print(f"   ↳ {total_frames_added} frames agregados al buffer (1 original + {self.frame_duplication_factor} duplicados)")
     
     def end_violence_sequence(self, end_time):
         """Finaliza la secuencia actual de violencia - SOLO UNA VEZ"""
@@ -169,9 +154,7 @@ class ViolenceFrameBuffer:
         
         print(f"🔴 SECUENCIA #{self.current_sequence['id']} FINALIZADA:")
         print(f"   - Duración: {duration:.2f}s")
-        print(f"   - Frames originales: {self.current_sequence['total_frames']}")
-        print(f"   - Frames duplicados: {self.current_sequence['duplicated_frames']}")
-        print(f"   - Total en buffer: {self.current_sequence['total_frames'] + self.current_sequence['duplicated_frames']}")
+        print(f"   - Frames: {self.current_sequence['total_frames']}")
         print(f"   - Probabilidad máxima: {self.current_sequence['max_probability']:.3f}")
         
         self.violence_sequences.append(self.current_sequence)
@@ -179,18 +162,13 @@ class ViolenceFrameBuffer:
         self.last_violence_state = False
     
     def get_violence_frames_in_range(self, start_time, end_time):
-        """MEJORADO: Obtiene TODOS los frames de violencia (originales + duplicados)"""
+        """Obtiene los frames de violencia en el rango"""
         violence_frames = [
             f for f in self.violence_frames
             if start_time <= f['timestamp'] <= end_time and f.get('is_violence', False)
         ]
         
-        # Contar originales vs duplicados
-        original_count = len([f for f in violence_frames if f.get('frame_type') == 'original'])
-        duplicate_count = len([f for f in violence_frames if f.get('frame_type') == 'duplicate'])
-        
         print(f"🔍 Frames de violencia extraídos: {len(violence_frames)} total")
-        print(f"   ↳ {original_count} originales + {duplicate_count} duplicados")
         
         return violence_frames
     
@@ -281,7 +259,6 @@ class ViolenceFrameBuffer:
             'violence_sequences': len(self.violence_sequences),
             'current_sequence_active': self.current_sequence is not None,
             'current_sequence_frames': len(self.current_sequence['frames']) if self.current_sequence else 0,
-            'duplication_factor': self.frame_duplication_factor,
             'violence_frame_counter': self.violence_frame_counter
         }
 
@@ -336,6 +313,18 @@ class PipelineDeteccion:
         # Estadísticas
         self.frames_procesados = 0
         self.incidentes_detectados = 0
+        self.inferencias_violencia = 0
+        
+        # Ventana deslizante y suavizado temporal por cámara
+        self.seguidor_violencia = SeguidorPuntuacionViolencia()
+        self.frames_desde_inferencia = 0
+        
+        # Compuerta de movimiento: sin movimiento se reutilizan las últimas detecciones
+        self.compuerta_movimiento = CompuertaMovimiento()
+        self.ultimas_detecciones: List[Dict[str, Any]] = []
+        
+        # Compuerta de interacción: TimesFormer solo con personas cerca durante varios frames
+        self.compuerta_interaccion = CompuertaInteraccion()
         
         # Control de tiempo para evitar spam
         self.ultimo_incidente = 0
@@ -348,8 +337,9 @@ class PipelineDeteccion:
         self.frame_feed_interval = 1.0 / 25
         self.last_evidence_feed = 0
 
-        # Inicializar recorder de evidencia
-        evidence_recorder.start_processing()
+        # Grabador de evidencia propio: pre-roll, MP4 e incidente de esta cámara
+        self.evidence_recorder = ViolenceEvidenceRecorder()
+        self.evidence_recorder.start_processing()
 
         # **NUEVO: Control de estado para evitar múltiples finalizaciones**
         self.finalizacion_en_progreso = False
@@ -361,26 +351,48 @@ class PipelineDeteccion:
         
         # AGREGAR: Servicio de alertas de voz
         self.servicio_alertas_voz = servicio_alertas_voz
-        
-        evidence_recorder.set_camera_id(1)
 
-    async def procesar_frame(self, frame: np.ndarray, camara_id: int, ubicacion: str) -> Dict[str, Any]:
+    async def procesar_frame(
+        self,
+        frame: Union[np.ndarray, VistasFrame],
+        camara_id: int,
+        ubicacion: str,
+        timestamp: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Procesa un frame capturado
+        
+        `frame` puede ser un `VistasFrame` compartido (hub de captura): YOLO y
+        TimesFormer toman cada uno su vista sin deformar y las detecciones se
+        devuelven en coordenadas del frame original. `timestamp` es la hora de
+        captura (`time.time()` del hub); sin ella se usa la hora actual.
+        """
         try:
+            if camara_id != self.camara_id:
+                self.evidence_recorder.set_camera_id(camara_id)
             self.camara_id = camara_id
             self.ubicacion = ubicacion
             self.frames_procesados += 1
             
-            evidence_recorder.set_camera_id(camara_id)
-            
-            timestamp_actual = datetime.now()
-            frame_original = frame.copy()
-            
-            # Detección de personas con YOLO
-            detecciones = await asyncio.get_event_loop().run_in_executor(
-                None, 
-                self.detector_personas.detectar, 
-                frame_original
-            )
+            vistas = frame if isinstance(frame, VistasFrame) else VistasFrame(frame)
+            timestamp_actual = datetime.fromtimestamp(timestamp) if timestamp is not None else datetime.now()
+            # El original es compartido y de solo lectura: solo se copia para dibujar
+            frame_original = vistas.original
+            
+            # Sin movimiento significativo no se ejecuta la detección (salvo con una secuencia de violencia activa)
+            self.compuerta_movimiento.asignar_camara(camara_id)
+            hay_movimiento = self.secuencia_violencia_activa or self.compuerta_movimiento.evaluar(frame_original)
+            
+            if hay_movimiento:
+                # Detección de personas con YOLO (lote compartido entre cámaras) sobre su vista
+                imagen_detector, escala_detector = vistas.detector(self.detector_personas.tamano_entrada)
+                detecciones = VistasFrame.a_original(
+                    await planificador_personas.enviar((self.detector_personas, imagen_detector)),
+                    escala_detector
+                )
+                self.ultimas_detecciones = detecciones
+            else:
+                detecciones = self.ultimas_detecciones
             
             # Crear frame procesado para display
             frame_procesado = frame_original.copy()
@@ -406,33 +418,61 @@ class PipelineDeteccion:
             violencia_info = None
             violencia_detectada_ahora = False
 
-            # Solo procesar con TimesFormer si hay personas detectadas
-            if detecciones:
+            # Sin personas no hay interacción posible
+            if hay_movimiento and not detecciones:
+                self.compuerta_interaccion.evaluar(detecciones)
+            
+            # Solo procesar con TimesFormer si hay personas detectadas y la escena no está estática
+            if detecciones and hay_movimiento:
                 # *** CORRECCIÓN: Agregar frame SIEMPRE para mantener secuencia ***
-                self.detector_violencia.agregar_frame(frame_original.copy())
+                # (se preprocesa una sola vez al entrar al buffer del clip)
+                await asyncio.get_event_loop().run_in_executor(
+                    None,
+                    self.detector_violencia.agregar_frame,
+                    vistas.clasificador()
+                )
                 
-                # *** CORRECCIÓN: Procesar cada N frames PERO preservar contexto ***
-                if self.frames_procesados % configuracion.TIMESFORMER_CONFIG["num_frames"] == 0:
-                    # Detección de violencia
-                    deteccion = await asyncio.get_event_loop().run_in_executor(
-                        None,
-                        self.detector_violencia.detectar
-                    )
+                self.frames_desde_inferencia += 1
+                
+                # El clip sigue llenándose, pero solo se puntúa si hay una interacción plausible
+                interaccion = (
+                    self.compuerta_interaccion.evaluar(detecciones) or self.secuencia_violencia_activa
+                )
+                
+                # *** Ventana deslizante: inferir cada `stride` frames nuevos (menor stride si la puntuación sube) ***
+                ventana_lista = (
+                    self.detector_violencia.clip_listo() and
+                    self.frames_desde_inferencia >= self.seguidor_violencia.stride_actual()
+                )
+                if ventana_lista:
+                    # Cada ventana cuenta una sola vez, se puntúe o se omita
+                    self.frames_desde_inferencia = 0
+                    self.compuerta_interaccion.registrar_clip(puntuado=interaccion)
+                
+                if ventana_lista and interaccion:
+                    self.inferencias_violencia += 1
+                    
+                    # Detección de violencia (micro-lote compartido entre cámaras)
+                    deteccion = await self.detector_violencia.detectar_async()
                     
                     print(f"🔍 DETECCIÓN RAW: {deteccion}")
                     
-                    if deteccion:
-                        probabilidad_detectada = deteccion.get('probabilidad_violencia', deteccion.get('probabilidad', 0.0))
+                    if deteccion and deteccion.get('batch_completo', False):
+                        probabilidad_clip = float(deteccion.get('probabilidad_violencia', deteccion.get('probabilidad', 0.0)))
+                        
+                        # La alerta se decide sobre la evidencia suavizada, no sobre un único clip
+                        puntuacion, alerta_activa = self.seguidor_violencia.actualizar(probabilidad_clip)
                         
                         resultado.update({
-                            'violencia_detectada': deteccion.get('violencia_detectada', False),
-                            'probabilidad_violencia': float(probabilidad_detectada),
-                            'probabilidad': float(probabilidad_detectada),
+                            'violencia_detectada': alerta_activa,
+                            'probabilidad_violencia': float(puntuacion),
+                            'probabilidad': float(puntuacion),
+                            'probabilidad_clip': probabilidad_clip,
                             'frames_analizados': deteccion.get('frames_analizados', 8),  # *** NUEVO ***
-                            'batch_completo': deteccion.get('batch_completo', False)  # *** NUEVO ***
+                            'batch_completo': True  # *** NUEVO ***
                         })
                         
-                        print(f"🔍 RESULTADO ACTUALIZADO: probabilidad = {probabilidad_detectada}")
+                        print(f"🔍 RESULTADO ACTUALIZADO: clip = {probabilidad_clip:.3f}, suavizada = {puntuacion:.3f}")
                     
                     violencia_detectada_ahora = resultado['violencia_detectada']
 
@@ -548,17 +588,9 @@ class PipelineDeteccion:
                 
                 # *** VERIFICACIÓN ANTES DE LLAMAR add_frame ***
                 if frame_procesado is not None and detecciones is not None:
-                    self.buffer_evidencia.add_frame(
-                        frame_procesado, 
-                        timestamp_actual, 
-                        detecciones,
-                        violencia_info
-                    )
-                    
-                    evidence_recorder.add_frame(
-                        frame_original, 
-                        detecciones, 
-                        violencia_info
+                    await asyncio.get_running_loop().run_in_executor(
+                        ejecutor_evidencia, self._alimentar_evidencia,
+                        frame_procesado, frame_original, timestamp_actual, detecciones, violencia_info
                     )
                     self.last_evidence_feed = current_time
                 else:
@@ -573,7 +605,7 @@ class PipelineDeteccion:
             import traceback
             print(traceback.format_exc())
             return {
-                'frame_procesado': frame,
+                'frame_procesado': frame.original if isinstance(frame, VistasFrame) else frame,
                 'personas_detectadas': [],
                 'violencia_detectada': False,
                 'probabilidad_violencia': 0.0,
@@ -592,7 +624,7 @@ class PipelineDeteccion:
             #     recent_frames = list(self.buffer_evidencia.frames)[-frames_analizados:]
             
             # DESPUÉS (CORRECTO):
-            recent_frames = list(self.buffer_evidencia.frames)[-frames_analizados:]
+            recent_frames = self.buffer_evidencia.buffer.ultimas(frames_analizados)
             
             # Marcar todos estos frames como parte de la secuencia de violencia
             for frame_data in recent_frames:
@@ -610,8 +642,11 @@ class PipelineDeteccion:
                     }
                 
                 # Agregar también al buffer de violencia para preservar la secuencia
+                # (solo se decodifica el JPEG si el frame fue de violencia)
+                if not frame_data['violencia_info'].get('detectada'):
+                    continue
                 self.violence_buffer.add_violence_frame(
-                    frame_data['frame'],
+                    self.buffer_evidencia.decodificar(frame_data),
                     frame_data['timestamp'],
                     frame_data.get('detecciones', []),
                     frame_data['violencia_info']
@@ -641,6 +676,11 @@ class PipelineDeteccion:
         except Exception as e:
             logger.error(f"❌ Error emitiendo alerta de voz: {e}")
 
+    def _alimentar_evidencia(self, frame_procesado, frame_original, timestamp, detecciones, violencia_info):
+        """Hilo de evidencia: comprime el frame en el buffer del pipeline y en el grabador"""
+        self.buffer_evidencia.add_frame(frame_procesado, timestamp, detecciones, violencia_info)
+        self.evidence_recorder.add_frame(frame_original, detecciones, violencia_info, timestamp=timestamp)
+
     def _dibujar_detecciones(self, frame: np.ndarray, detecciones: List[Dict]) -> np.ndarray:
         """Dibuja las detecciones en el frame"""
         for deteccion in detecciones:
@@ -668,11 +708,10 @@ class PipelineDeteccion:
             print("📹 Finalizando grabación de evidencia...")
             
             # **CAMBIO CRÍTICO: Solo notificar al evidence_recorder, NO generar video aquí**
-            from app.tasks.video_recorder import evidence_recorder
             
             # Notificar al evidence_recorder que termine la grabación
             # El evidence_recorder se encargará de generar EL ÚNICO video
-            evidence_recorder._finish_recording()
+            self.evidence_recorder._finish_recording()
             
             print("✅ Grabación finalizada - evidence_recorder generará el video")
             
@@ -1060,8 +1099,7 @@ class PipelineDeteccion:
             )
             
             # **NUEVO: Pasar el ID del incidente al evidence_recorder**
-            from app.tasks.video_recorder import evidence_recorder
-            evidence_recorder.set_current_incident_id(incidente.id)
+            self.evidence_recorder.set_current_incident_id(incidente.id)
             
             print(f"🔗 ID del incidente {incidente.id} enviado al evidence_recorder")
             
@@ -1097,10 +1135,18 @@ class PipelineDeteccion:
             'violence_buffer_size': violence_stats['total_violence_frames'],
             'violence_sequences': violence_stats['violence_sequences'],
             'current_sequence_active': violence_stats['current_sequence_active'],
-            'duplication_factor': violence_stats['duplication_factor'],
-            'violence_frame_counter': violence_stats['violence_frame_counter']
+            'violence_frame_counter': violence_stats['violence_frame_counter'],
+            'inferencias_violencia': self.inferencias_violencia,
+            'puntuacion_violencia': self.seguidor_violencia.obtener_estadisticas(),
+            'compuerta_movimiento': self.compuerta_movimiento.obtener_estadisticas(),
+            'compuerta_interaccion': self.compuerta_interaccion.obtener_estadisticas()
         }
 
+    def detener(self):
+        """Libera el grabador de evidencia (cierra la grabación en curso y su hilo de guardado)"""
+        self.activo = False
+        self.evidence_recorder.stop_processing()
+
     # 7. MEJORA EN reiniciar() para limpiar el ID del incidente
     def reiniciar(self):
         """MEJORADO: Reset completo del estado incluyendo incidente_id"""
@@ -1116,6 +1162,11 @@ class PipelineDeteccion:
         
         # Reset de detectores
         self.detector_violencia.reiniciar()
+        self.seguidor_violencia.reiniciar()
+        self.frames_desde_inferencia = 0
+        self.compuerta_movimiento.reiniciar()
+        self.ultimas_detecciones = []
+        self.compuerta_interaccion.reiniciar()
         
         # **NUEVO: Limpiar ID del incidente**
         self.incidente_actual_id = None
@@ -1149,217 +1200,3 @@ class PipelineDeteccion:
                 import traceback
                 print(traceback.format_exc())
                 continue
-
-    def _expandir_frames_para_duracion(self, frames_originales: List[Dict], frames_objetivo: int) -> List[Dict]:
-        """MEJORADO: Expande frames para alcanzar duración objetivo - CON FILTRADO SEGURO"""
-        # **FILTRAR FRAMES NONE AL INICIO**
-        frames_originales = [f for f in frames_originales if f is not None and isinstance(f, dict)]
-        
-        if not frames_originales:
-            return []
-        
-        frames_expandidos = frames_originales.copy()
-        
-        # Si ya tenemos suficientes frames, devolver tal como están
-        if len(frames_expandidos) >= frames_objetivo:
-            return frames_expandidos[:frames_objetivo]
-        
-        print(f"📹 Expandiendo frames de {len(frames_originales)} a {frames_objetivo}")
-        
-        # Calcular cuántos frames necesitamos agregar
-        frames_faltantes = frames_objetivo - len(frames_expandidos)
-        
-        # Método 1: Interpolar frames entre frames existentes
-        if len(frames_originales) > 1:
-            # Agregar frames interpolados entre frames existentes
-            for i in range(min(frames_faltantes, len(frames_originales) - 1)):
-                idx = i % (len(frames_originales) - 1)
-                
-                # **VERIFICACIÓN QUE EL FRAME ES VÁLIDO**
-                if frames_originales[idx] is not None and isinstance(frames_originales[idx], dict):
-                    # Crear frame interpolado
-                    frame_interpolado = {
-                        'frame': frames_originales[idx]['frame'].copy(),
-                        'timestamp': frames_originales[idx]['timestamp'] + timedelta(microseconds=500 + i*100),
-                        'detecciones': frames_originales[idx].get('detecciones', []),
-                        'violencia_info': frames_originales[idx].get('violencia_info'),
-                        'interpolated': True,
-                        'source_frame': idx
-                    }
-                    frames_expandidos.append(frame_interpolado)
-        
-        # Método 2: Si aún faltan frames, duplicar frames de violencia
-        if len(frames_expandidos) < frames_objetivo:
-            frames_faltantes = frames_objetivo - len(frames_expandidos)
-            
-            # Priorizar frames con violencia para duplicar
-            frames_violencia = []
-            for f in frames_originales:
-                if f is not None and isinstance(f, dict):
-                    violencia_info = f.get('violencia_info')
-                    if violencia_info is not None and isinstance(violencia_info, dict):
-                        if violencia_info.get('detectada', False):
-                            frames_violencia.append(f)
-            
-            if frames_violencia:
-                print(f"📹 Ronda expansión 1: +{frames_faltantes} frames (total: {len(frames_expandidos) + frames_faltantes})")
-                
-                for i in range(frames_faltantes):
-                    idx = i % len(frames_violencia)
-                    frame_duplicado = {
-                        'frame': frames_violencia[idx]['frame'].copy(),
-                        'timestamp': frames_violencia[idx]['timestamp'] + timedelta(microseconds=1000 + i*50),
-                        'detecciones': frames_violencia[idx].get('detecciones', []),
-                        'violencia_info': frames_violencia[idx].get('violencia_info'),
-                        'duplicated': True,
-                        'source_frame': idx,
-                        'duplicate_round': 1
-                    }
-                    frames_expandidos.append(frame_duplicado)
-            else:
-                # Si no hay frames de violencia, duplicar cualquier frame disponible
-                for i in range(frames_faltantes):
-                    idx = i % len(frames_originales)
-                    if frames_originales[idx] is not None and isinstance(frames_originales[idx], dict):
-                        frame_duplicado = {
-                            'frame': frames_originales[idx]['frame'].copy(),
-                            'timestamp': frames_originales[idx]['timestamp'] + timedelta(microseconds=1000 + i*50),
-                            'detecciones': frames_originales[idx].get('detecciones', []),
-                            'violencia_info': frames_originales[idx].get('violencia_info'),
-                            'duplicated': True,
-                            'source_frame': idx,
-                            'duplicate_round': 1
-                        }
-                        frames_expandidos.append(frame_duplicado)
-        
-        # **FILTRADO FINAL: Asegurar que no hay frames None**
-        frames_expandidos = [f for f in frames_expandidos if f is not None and isinstance(f, dict)]
-        
-        return frames_expandidos[:frames_objetivo]
-
-    # **AGREGAR TAMBIÉN: Método para manejo de evidencia robusta**
-    def _combinar_frames_evidencia_robusta(self, frames_violencia: List[Dict], frames_contexto: List[Dict]) -> List[Dict]:
-        """NUEVO: Combina frames con máxima prioridad a violencia para evidencia robusta - CORREGIDO"""
-        
-        # **FILTRADO INICIAL ROBUSTO: Eliminar todos los frames None**
-        frames_violencia = [f for f in frames_violencia if f is not None]
-        frames_contexto = [f for f in frames_contexto if f is not None]
-        
-        # Si tenemos muy pocos frames de violencia, expandir masivamente
-        if len(frames_violencia) < 50:  # Menos de ~3 segundos a 15fps
-            print(f"⚠️ Agregando MASIVAMENTE más frames de violencia para garantizar contenido robusto...")
-            
-            # Múltiples rondas de duplicación de frames de violencia
-            frames_expandidos = frames_violencia.copy()
-            
-            for ronda in range(4):  # 4 rondas de duplicación
-                duplicaciones_esta_ronda = []
-                for i, frame in enumerate(frames_violencia[:10]):  # Solo primeros 10 frames
-                    # **VERIFICACIÓN ADICIONAL: Asegurar que frame no sea None**
-                    if frame is not None and isinstance(frame, dict):
-                        for j in range(13):  # 13 duplicados por frame original
-                            frame_duplicado = {
-                                'frame': frame['frame'].copy(),
-                                'timestamp': frame['timestamp'] + timedelta(microseconds=j*50 + ronda*1000),
-                                'detecciones': frame.get('detecciones', []),
-                                'violencia_info': frame.get('violencia_info'),
-                                'massive_duplicate': True,
-                                'duplicate_round': ronda + 1,
-                                'source_frame': i
-                            }
-                            duplicaciones_esta_ronda.append(frame_duplicado)
-                
-                frames_expandidos.extend(duplicaciones_esta_ronda)
-                print(f"📹 Ronda {ronda + 1}: {len(duplicaciones_esta_ronda)} frames adicionales de violencia")
-            
-            print(f"📹 TOTAL frames de violencia después de duplicación: {len(frames_expandidos)}")
-            frames_violencia = frames_expandidos
-        
-        # Combinar priorizando violencia
-        frames_combinados = []
-        
-        # Crear mapeo por timestamp
-        violencia_por_tiempo = {}
-        for frame in frames_violencia:
-            # **VERIFICACIÓN ROBUSTA: Asegurar que frame es válido**
-            if frame is not None and isinstance(frame, dict) and 'timestamp' in frame:
-                tiempo_key = frame['timestamp'].replace(microsecond=0)  # Agrupar por segundo
-                if tiempo_key not in violencia_por_tiempo:
-                    violencia_por_tiempo[tiempo_key] = []
-                violencia_por_tiempo[tiempo_key].append(frame)
-        
-        # Procesar todos los timestamps
-        todos_los_tiempos = set()
-        for frame in frames_violencia:
-            if frame is not None and isinstance(frame, dict) and 'timestamp' in frame:
-                todos_los_tiempos.add(frame['timestamp'].replace(microsecond=0))
-        
-        for frame in frames_contexto:
-            if frame is not None and isinstance(frame, dict) and 'timestamp' in frame:
-                todos_los_tiempos.add(frame['timestamp'].replace(microsecond=0))
-        
-        # Combinar dando prioridad absoluta a frames de violencia
-        for tiempo in sorted(todos_los_tiempos):
-            if tiempo in violencia_por_tiempo:
-                # Agregar TODOS los frames de violencia de este segundo
-                frames_combinados.extend(violencia_por_tiempo[tiempo])
-            else:
-                # Solo agregar contexto si no hay violencia en este segundo
-                frame_contexto = next(
-                    (f for f in frames_contexto 
-                    if f is not None and isinstance(f, dict) and 'timestamp' in f and f['timestamp'].replace(microsecond=0) == tiempo),
-                    None
-                )
-                if frame_contexto:
-                    frames_combinados.append(frame_contexto)
-        
-        # **FILTRADO FINAL ROBUSTO: Asegurar que no hay frames None**
-        frames_combinados = [f for f in frames_combinados if f is not None and isinstance(f, dict)]
-        
-        # Contar frames efectivos de violencia - CON VERIFICACIÓN SEGURA
-        violence_efectiva = 0
-        for f in frames_combinados:
-            if f is not None and isinstance(f, dict):
-                violencia_info = f.get('violencia_info')
-                if violencia_info is not None and isinstance(violencia_info, dict):
-                    if violencia_info.get('detectada', False):
-                        violence_efectiva += 1
-        
-        print(f"🔄 Frames combinados: {len(frames_combinados)} (Violencia efectiva: {violence_efectiva}, Contexto: {len(frames_contexto)})")
-        
-        return frames_combinados
-
-    # **TAMBIÉN AGREGAR: Control de expansión de frames**  
-    def _generar_frames_evidencia_completos(self, frames_base: List[Dict], duracion_minima: float = 5.0) -> List[Dict]:
-        """Genera un conjunto completo de frames para evidencia con duración mínima"""
-        
-        if not frames_base:
-            return []
-        
-        frames_objetivo = int(duracion_minima * self.target_fps_evidencia)
-        
-        print(f"📹 TOTAL frames para evidencia: {len(frames_base)}")
-        
-        # Si tenemos suficientes frames, usar tal como están
-        if len(frames_base) >= frames_objetivo:
-            return frames_base[:frames_objetivo]
-        
-        # Expandir usando el método existente
-        frames_expandidos = self._expandir_frames_para_duracion(frames_base, frames_objetivo)
-        
-        # Calcular duración estimada
-        duracion_estimada = len(frames_expandidos) / self.target_fps_evidencia
-        
-        print(f"📹 Duración estimada del clip: {duracion_estimada:.2f} segundos")
-        
-        # Contar frames de violencia en el resultado final
-        violence_count = len([f for f in frames_expandidos 
-                            if f.get('violencia_info', {}).get('detectada', False)])
-        
-        print(f"📝 Evidencia ROBUSTA enviada a cola:")
-        print(f"   - {len(frames_expandidos)} frames")
-        print(f"   - {violence_count} con violencia")
-        print(f"   - Duración estimada: {duracion_estimada:.2f}s")
-        print(f"   - Duplicaciones totales: {len(frames_expandidos) - len(frames_base)}")
-        
-        return frames_expandidos
\ No newline at end of file
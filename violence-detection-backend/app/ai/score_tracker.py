@@ -0,0 +1,107 @@
+"""
+Seguimiento temporal de la puntuación de violencia por cámara
+"""
+from typing import Dict, Any, Optional, Tuple
+from app.config import configuracion
+
+
+class SeguidorPuntuacionViolencia:
+    """
+    Suaviza la probabilidad de violencia entre clips y decide el stride
+
+    Modos:
+        - "ema": media móvil exponencial con umbrales de histéresis
+        - "histeresis": probabilidad cruda con umbrales de histéresis y
+          un mínimo de clips consecutivos para activar
+
+    La alerta se activa cuando la puntuación alcanza `umbral_activacion` y solo
+    se desactiva cuando baja de `umbral_desactivacion`. Con puntuaciones bajas
+    se infiere cada `stride_bajo` frames y, al subir, cada `stride_alto`.
+    """
+
+    def __init__(
+        self,
+        modo: Optional[str] = None,
+        alpha: Optional[float] = None,
+        umbral_activacion: Optional[float] = None,
+        umbral_desactivacion: Optional[float] = None,
+        clips_activacion: Optional[int] = None,
+        stride_bajo: Optional[int] = None,
+        stride_alto: Optional[int] = None,
+        umbral_stride_alto: Optional[float] = None
+    ):
+        self.modo = (modo or configuracion.VIOLENCE_SMOOTHING_MODE).lower()
+        if self.modo not in ("ema", "histeresis"):
+            raise ValueError(f"Modo de suavizado no soportado: {self.modo}")
+
+        self.alpha = alpha if alpha is not None else configuracion.VIOLENCE_EMA_ALPHA
+        self.umbral_activacion = (
+            umbral_activacion if umbral_activacion is not None else configuracion.VIOLENCE_THRESHOLD
+        )
+        self.umbral_desactivacion = (
+            umbral_desactivacion if umbral_desactivacion is not None
+            else configuracion.VIOLENCE_THRESHOLD_OFF
+        )
+        self.clips_activacion = clips_activacion or configuracion.VIOLENCE_MIN_CLIPS_ACTIVACION
+        self.stride_bajo = stride_bajo or configuracion.TIMESFORMER_STRIDE_BAJO
+        self.stride_alto = stride_alto or configuracion.TIMESFORMER_STRIDE_ALTO
+        self.umbral_stride_alto = (
+            umbral_stride_alto if umbral_stride_alto is not None
+            else configuracion.TIMESFORMER_STRIDE_UMBRAL
+        )
+
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Vuelve al estado inicial (sin evidencia de violencia)"""
+        self.puntuacion = 0.0
+        self.activo = False
+        self.clips_consecutivos = 0
+        self.clips_evaluados = 0
+        self.activaciones = 0
+
+    def actualizar(self, probabilidad: float) -> Tuple[float, bool]:
+        """
+        Incorpora la probabilidad de un nuevo clip
+
+        Returns:
+            Tupla de (puntuación suavizada, alerta activa)
+        """
+        self.clips_evaluados += 1
+
+        if self.modo == "ema":
+            if self.clips_evaluados == 1:
+                self.puntuacion = probabilidad
+            else:
+                self.puntuacion = self.alpha * probabilidad + (1 - self.alpha) * self.puntuacion
+        else:
+            self.puntuacion = probabilidad
+
+        if self.puntuacion >= self.umbral_activacion:
+            self.clips_consecutivos += 1
+        else:
+            self.clips_consecutivos = 0
+
+        if not self.activo and self.clips_consecutivos >= self.clips_activacion:
+            self.activo = True
+            self.activaciones += 1
+        elif self.activo and self.puntuacion < self.umbral_desactivacion:
+            self.activo = False
+
+        return self.puntuacion, self.activo
+
+    def stride_actual(self) -> int:
+        """Frames nuevos que deben llegar antes de la próxima inferencia"""
+        if self.activo or self.puntuacion >= self.umbral_stride_alto:
+            return self.stride_alto
+        return self.stride_bajo
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {
+            'modo': self.modo,
+            'puntuacion': self.puntuacion,
+            'activo': self.activo,
+            'clips_evaluados': self.clips_evaluados,
+            'activaciones': self.activaciones,
+            'stride_actual': self.stride_actual()
+        }
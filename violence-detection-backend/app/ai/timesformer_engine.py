@@ -0,0 +1,106 @@
+"""
+Motor de inferencia TimesFormer compartido por todas las cámaras
+"""
+import threading
+import time
+import onnxruntime as ort
+import numpy as np
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from app.config import configuracion
+from app.utils.logger import obtener_logger
+
+logger = obtener_logger(__name__)
+
+
+class MotorTimesFormer:
+    """Sesión ONNX única de TimesFormer con concurrencia acotada"""
+
+    def __init__(
+        self,
+        ruta_modelo: Path,
+        precision: str = "fp16",
+        max_concurrencia: Optional[int] = None,
+        hilos_intra_op: Optional[int] = None
+    ):
+        self.ruta_modelo = ruta_modelo
+        self.precision = precision
+        self.max_concurrencia = max_concurrencia or configuracion.TIMESFORMER_MAX_CONCURRENT
+        self.hilos_intra_op = hilos_intra_op or configuracion.TIMESFORMER_INTRA_OP_THREADS
+
+        # Limita cuántas inferencias corren a la vez sobre la misma sesión
+        self._semaforo = threading.BoundedSemaphore(self.max_concurrencia)
+        self._lock_stats = threading.Lock()
+
+        self.inferencias_realizadas = 0
+        self.tiempo_total_inferencia = 0.0
+        self.inferencias_en_curso = 0
+
+        self.sesion = self._crear_sesion()
+        entrada = self.sesion.get_inputs()[0]
+        self.nombre_entrada = entrada.name
+        self.tipo_entrada = np.float16 if entrada.type == 'tensor(float16)' else np.float32
+        # Si el modelo se exportó con batch fijo, no se pueden apilar clips
+        dimension_lote = entrada.shape[0] if entrada.shape else None
+        self.lote_maximo = dimension_lote if isinstance(dimension_lote, int) and dimension_lote > 0 else None
+
+    def _crear_sesion(self) -> ort.InferenceSession:
+        """Crea la sesión de ONNX Runtime"""
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opciones.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opciones.intra_op_num_threads = self.hilos_intra_op
+        opciones.inter_op_num_threads = 1
+
+        # Forzar FP16 solo para el modelo exportado en media precisión
+        if self.precision == "fp16":
+            opciones.add_session_config_entry('session.gpu.fp16_enable', '1')
+
+        providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] \
+            if configuracion.USE_GPU else ['CPUExecutionProvider']
+
+        return ort.InferenceSession(
+            str(self.ruta_modelo),
+            providers=providers,
+            sess_options=opciones
+        )
+
+    def inferir(self, input_tensor: np.ndarray) -> List[np.ndarray]:
+        """
+        Ejecuta la inferencia sobre un tensor [B, C, T, H, W]
+
+        Bloquea si ya hay `max_concurrencia` inferencias en curso.
+        """
+        if input_tensor.dtype != self.tipo_entrada:
+            input_tensor = input_tensor.astype(self.tipo_entrada)
+
+        with self._semaforo:
+            with self._lock_stats:
+                self.inferencias_en_curso += 1
+            inicio = time.perf_counter()
+            try:
+                return self.sesion.run(None, {self.nombre_entrada: input_tensor})
+            finally:
+                duracion = time.perf_counter() - inicio
+                with self._lock_stats:
+                    self.inferencias_en_curso -= 1
+                    self.inferencias_realizadas += 1
+                    self.tiempo_total_inferencia += duracion
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        """Obtiene estadísticas del motor"""
+        with self._lock_stats:
+            promedio = (
+                self.tiempo_total_inferencia / self.inferencias_realizadas
+                if self.inferencias_realizadas else 0.0
+            )
+            return {
+                'modelo': str(self.ruta_modelo),
+                'precision': self.precision,
+                'max_concurrencia': self.max_concurrencia,
+                'hilos_intra_op': self.hilos_intra_op,
+                'lote_maximo_modelo': self.lote_maximo,
+                'inferencias_realizadas': self.inferencias_realizadas,
+                'inferencias_en_curso': self.inferencias_en_curso,
+                'latencia_promedio_ms': promedio * 1000
+            }
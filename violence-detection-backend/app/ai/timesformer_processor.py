@@ -1,6 +1,6 @@
 import cv2
 import numpy as np
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from app.config import configuracion
 
 class TimesFormerProcessor:
@@ -8,13 +8,26 @@ class TimesFormerProcessor:
     
     def __init__(self):
         self.config = configuracion.TIMESFORMER_CONFIG
-        self.frame_cache = {}  # Caché para frames preprocesados
-        self.cache_hits = 0
-        self.cache_misses = 0
+        self.target_size = self.config["input_size"]
+        
+        # (x/255 - mean)/std == x*escala + desplazamiento, precalculado por canal (RGB)
+        mean = np.asarray(self.config["mean"], dtype=np.float32)
+        std = np.asarray(self.config["std"], dtype=np.float32)
+        self.escala = (1.0 / (255.0 * std)).astype(np.float32)
+        self.desplazamiento = (-mean / std).astype(np.float32)
+        # Mismos coeficientes en orden BGR, para trabajar sobre el frame de la cámara sin cvtColor
+        self._escala_bgr = self.escala[::-1].copy()
+        self._desplazamiento_bgr = self.desplazamiento[::-1].copy()
+        
+        # Geometría del letterbox y buffers reutilizados, por resolución de entrada
+        self._forma_entrada = None
+        self._geometria = None
+        self._redimensionado = None
+        self._temporal = None
         
     def resize_and_pad(self, frame: np.ndarray) -> Tuple[np.ndarray, Tuple[float, float]]:
         """Redimensiona y añade padding manteniendo el aspect ratio"""
-        target_size = self.config["input_size"]
+        target_size = self.target_size
         height, width = frame.shape[:2]
         
         scale = min(target_size/width, target_size/height)
@@ -31,12 +44,62 @@ class TimesFormerProcessor:
         return padded, (scale, scale)
     
     def normalize_frame(self, frame: np.ndarray) -> np.ndarray:
-        """Normaliza un frame usando mean y std"""
-        frame = frame.astype(np.float32) / 255.0
-        mean = np.array(self.config["mean"])
-        std = np.array(self.config["std"])
-        frame = (frame - mean) / std
-        return frame
+        """Normaliza un frame RGB usando mean y std"""
+        return frame.astype(np.float32) * self.escala + self.desplazamiento
+    
+    def _preparar_geometria(self, forma: Tuple[int, ...]):
+        """Calcula el letterbox y reserva buffers para una resolución de entrada"""
+        if forma == self._forma_entrada:
+            return
+        
+        height, width = forma[:2]
+        target_size = self.target_size
+        scale = min(target_size/width, target_size/height)
+        new_w, new_h = int(width * scale), int(height * scale)
+        pad_h = (target_size - new_h) // 2
+        pad_w = (target_size - new_w) // 2
+        
+        self._forma_entrada = forma
+        self._geometria = (new_w, new_h, pad_h, pad_w)
+        self._redimensionado = np.empty((new_h, new_w, 3), dtype=np.uint8)
+        self._temporal = np.empty((new_h, new_w, 3), dtype=np.float32)
+    
+    def preprocess_into(self, frame: np.ndarray, destino: np.ndarray):
+        """
+        Letterbox + BGR→RGB + normalización en una sola pasada
+        
+        Escribe el frame preprocesado directamente en `destino`, una vista
+        [C, H, W] (normalmente FP16) del tensor de entrada del modelo.
+        """
+        self._preparar_geometria(frame.shape)
+        new_w, new_h, pad_h, pad_w = self._geometria
+        
+        # La vista del clasificador (VistasFrame) ya llega a su tamaño final
+        if frame.shape[:2] == (new_h, new_w):
+            redimensionado = frame
+        else:
+            cv2.resize(frame, (new_w, new_h), dst=self._redimensionado, interpolation=cv2.INTER_AREA)
+            redimensionado = self._redimensionado
+        np.multiply(redimensionado, self._escala_bgr, out=self._temporal)
+        self._temporal += self._desplazamiento_bgr
+        
+        # Borde del letterbox: un píxel negro normalizado es el desplazamiento del canal
+        if pad_h or pad_w:
+            for canal in range(destino.shape[0]):
+                valor = self.desplazamiento[canal]
+                destino[canal, :pad_h] = valor
+                destino[canal, pad_h + new_h:] = valor
+                destino[canal, :, :pad_w] = valor
+                destino[canal, :, pad_w + new_w:] = valor
+        
+        # HWC (BGR) → CHW (RGB) con conversión a FP16 en la misma asignación
+        destino[:, pad_h:pad_h + new_h, pad_w:pad_w + new_w] = self._temporal.transpose(2, 0, 1)[::-1]
+    
+    def preprocess_frame(self, frame: np.ndarray) -> np.ndarray:
+        """Preprocesa un único frame BGR y devuelve [C, H, W] en FP16"""
+        destino = np.empty((3, self.target_size, self.target_size), dtype=np.float16)
+        self.preprocess_into(frame, destino)
+        return destino
     
     def preprocess_frames(self, frames: List[np.ndarray]) -> np.ndarray:
         """Preprocesa una lista de frames para TimesFormer"""
@@ -44,34 +107,61 @@ class TimesFormerProcessor:
             print(f"Error: Se requieren {self.config['num_frames']} frames, recibidos {len(frames)}")
             raise ValueError(f"Se requieren {self.config['num_frames']} frames")
         
-        processed_frames = []
-        for frame in frames:  # Removed enumerate here
-            try:
-                # Convertir frame a array de bytes para hash
-                frame_bytes = frame.tobytes()
-                frame_hash = hash(frame_bytes)
-                
-                if frame_hash in self.frame_cache:
-                    processed_frames.append(self.frame_cache[frame_hash])
-                    self.cache_hits += 1
-                else:
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    frame_padded, _ = self.resize_and_pad(frame_rgb)
-                    frame_normalized = self.normalize_frame(frame_padded)
-                    processed_frames.append(frame_normalized)
-                    self.frame_cache[frame_hash] = frame_normalized
-                    self.cache_misses += 1
-                    
-                    # Limitar tamaño de caché
-                    if len(self.frame_cache) > 100:
-                        self.frame_cache.pop(next(iter(self.frame_cache)))
-                        
-            except Exception as e:
-                print(f"Error procesando frame: {str(e)}")
-                raise
+        # [B, C, T, H, W] escrito directamente, sin stack/transpose/astype intermedios
+        batch = np.empty(
+            (1, 3, len(frames), self.target_size, self.target_size),
+            dtype=np.float16
+        )
+        for t, frame in enumerate(frames):
+            self.preprocess_into(frame, batch[0, :, t])
+        
+        return batch
+
 
-        batch = np.stack(processed_frames, axis=0)  # [T, H, W, C]
-        batch = batch.transpose(3, 0, 1, 2)  # [C, T, H, W]
-        batch = np.expand_dims(batch, axis=0)  # [B, C, T, H, W]
+class BufferClipTimesFormer:
+    """
+    Buffer circular de frames ya preprocesados en FP16 con forma [C, T, H, W]
+    
+    Cada frame se preprocesa una sola vez al agregarse y se escribe en su
+    ranura; obtener el clip solo reordena las ranuras ya llenas.
+    """
+    
+    def __init__(self, processor: Optional[TimesFormerProcessor] = None):
+        self.processor = processor or TimesFormerProcessor()
+        config = self.processor.config
+        self.num_frames = config["num_frames"]
+        tamano = config["input_size"]
         
-        return batch.astype(np.float16)
\ No newline at end of file
+        self.clip = np.zeros(
+            (config["num_channels"], self.num_frames, tamano, tamano),
+            dtype=np.float16
+        )
+        self.siguiente = 0  # Ranura donde se escribirá el próximo frame
+        self.llenos = 0
+    
+    def __len__(self) -> int:
+        return self.llenos
+    
+    def completo(self) -> bool:
+        return self.llenos >= self.num_frames
+    
+    def agregar(self, frame: np.ndarray):
+        """Preprocesa el frame y lo escribe en la siguiente ranura"""
+        self.processor.preprocess_into(frame, self.clip[:, self.siguiente])
+        self.siguiente = (self.siguiente + 1) % self.num_frames
+        self.llenos = min(self.llenos + 1, self.num_frames)
+    
+    def obtener_tensor(self) -> np.ndarray:
+        """Devuelve el clip en orden temporal como tensor [1, C, T, H, W]"""
+        if not self.completo():
+            raise ValueError(f"Se requieren {self.num_frames} frames, hay {self.llenos}")
+        
+        # El frame más antiguo está en la ranura `siguiente`
+        if self.siguiente == 0:
+            return self.clip[np.newaxis].copy()
+        orden = (np.arange(self.num_frames) + self.siguiente) % self.num_frames
+        return self.clip[:, orden][np.newaxis]
+    
+    def limpiar(self):
+        self.siguiente = 0
+        self.llenos = 0
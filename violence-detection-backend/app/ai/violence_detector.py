@@ -1,46 +1,39 @@
-import onnxruntime as ort
+import asyncio
 import numpy as np
-from typing import Dict, Any
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
 from app.config import configuracion
-from app.ai.timesformer_processor import TimesFormerProcessor
+from app.ai.model_loader import cargador_modelos
+from app.ai.timesformer_engine import MotorTimesFormer
+from app.ai.inference_scheduler import PlanificadorInferencia, obtener_planificador_timesformer
+from app.ai.timesformer_processor import TimesFormerProcessor, BufferClipTimesFormer
 from app.utils.logger import obtener_logger
 
 logger = obtener_logger(__name__)
 
 class DetectorViolencia:
-    def __init__(self):
+    """Detector de violencia por cámara: solo mantiene su buffer de clips"""
+    
+    def __init__(self, motor: Optional[MotorTimesFormer] = None, precision: Optional[str] = None):
+        self.motor = motor
+        self.precision = (precision or configuracion.TIMESFORMER_PRECISION).lower()
         self.processor = TimesFormerProcessor()
         self.config = configuracion.TIMESFORMER_CONFIG
         self.threshold = configuracion.VIOLENCE_THRESHOLD
-        self.buffer_frames = []
+        # Clip preprocesado (FP16) y referencias a los frames originales del mismo clip
+        self.buffer_clip = BufferClipTimesFormer(self.processor)
+        self.buffer_frames = deque(maxlen=self.config["num_frames"])
         self.violencia_detectada = False
         self.probabilidad_violencia = 0.0
         self.setup_model()
     
     def setup_model(self):
+        """Obtiene el motor TimesFormer compartido (no abre una sesión propia)"""
         try:
-            # Configurar ONNX Runtime
-            options = ort.SessionOptions()
-            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-            options.intra_op_num_threads = 4
-            
-            # Forzar FP16
-            options.add_session_config_entry('session.gpu.fp16_enable', '1')
-            
-            providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] \
-                if configuracion.USE_GPU else ['CPUExecutionProvider']
-            
-            model_path = configuracion.obtener_ruta_modelo(configuracion.TIMESFORMER_MODEL)
-            self.model = ort.InferenceSession(
-                str(model_path), 
-                providers=providers,
-                sess_options=options
-            )
-            
-            print("✅ Modelo TimesFormer ONNX (FP16) cargado exitosamente")
-            
+            if self.motor is None:
+                self.motor = cargador_modelos.obtener_motor_timesformer(self.precision)
         except Exception as e:
-            print(f"❌ Error cargando modelo ONNX: {str(e)}")
+            print(f"❌ Error obteniendo motor TimesFormer: {str(e)}")
             raise
     
     def _softmax(self, x: np.ndarray) -> np.ndarray:
@@ -49,82 +42,116 @@ class DetectorViolencia:
         return e_x / e_x.sum()
     
     def agregar_frame(self, frame: np.ndarray):
-        """Agrega un frame al buffer circular"""
-        self.buffer_frames.append(frame.copy())
-        if len(self.buffer_frames) > self.config["num_frames"]:
-            self.buffer_frames.pop(0)
+        """Agrega un frame al buffer circular, preprocesándolo una sola vez"""
+        self.buffer_clip.agregar(frame)
+        self.buffer_frames.append(frame)
+    
+    def clip_listo(self) -> bool:
+        """Indica si el buffer tiene los frames necesarios para un clip"""
+        return self.buffer_clip.completo()
+    
+    def _resultado_buffer_incompleto(self) -> Dict[str, Any]:
+        print(f"Buffer incompleto: {len(self.buffer_frames)}/{self.config['num_frames']} frames")
+        return {
+            'violencia_detectada': False,
+            'probabilidad': 0.0,
+            'mensaje': f'Buffer incompleto ({len(self.buffer_frames)}/{self.config["num_frames"]} frames)'
+        }
+    
+    def _resultado_error(self, e: Exception) -> Dict[str, Any]:
+        print(f"Error en detección de violencia: {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+        return {
+            'violencia_detectada': False,
+            'probabilidad': 0.0,
+            'mensaje': f'Error: {str(e)}',
+            'frames_analizados': 0,
+            'frames_en_secuencia': [],
+            'batch_completo': False
+        }
+    
+    def _preparar_clip(self) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """Toma el clip actual del buffer y devuelve (tensor [1, C, T, H, W], frames usados)"""
+        frames = list(self.buffer_frames)
+        print(f"Procesando {len(frames)} frames para detección")
+        
+        # Los frames ya están preprocesados en FP16: solo se reordenan las ranuras
+        input_tensor = self.buffer_clip.obtener_tensor()
+        
+        print(f"Shape del tensor de entrada: {input_tensor.shape}")
+        return input_tensor, frames
+    
+    def _interpretar_logits(self, logits: np.ndarray, frames: List[np.ndarray]) -> Dict[str, Any]:
+        """Convierte los logits de un clip en el resultado de detección"""
+        # Calcular probabilidades
+        probs = self._softmax(logits.astype(np.float32))
+        
+        # Obtener predicción
+        prob_violencia = float(probs[1])
+        es_violencia = prob_violencia >= self.threshold
+        
+        print(f"Probabilidad de violencia: {prob_violencia:.3f}")
+        if es_violencia:
+            print("¡ALERTA! Violencia detectada")
+        
+        self.violencia_detectada = es_violencia
+        self.probabilidad_violencia = prob_violencia
+        
+        # *** NUEVA INFORMACIÓN: Marcar todos los frames analizados ***
+        return {
+            'violencia_detectada': es_violencia,
+            'probabilidad': prob_violencia,
+            'probabilidad_violencia': prob_violencia,  # Campo adicional para consistencia
+            'clase': self.config["labels"][1] if es_violencia else self.config["labels"][0],
+            'mensaje': 'ALERTA: Violencia detectada' if es_violencia else 'No se detectó violencia',
+            'frames_analizados': len(frames),  # *** NUEVO ***
+            'frames_en_secuencia': frames if es_violencia else [],  # *** NUEVO ***
+            'batch_completo': True  # *** NUEVO ***
+        }
     
     def detectar(self) -> Dict[str, Any]:
-        """Realiza la detección de violencia en los frames del buffer - CORREGIDO"""
+        """Realiza la detección de violencia en los frames del buffer (inferencia directa, lote 1)"""
         try:
-            if len(self.buffer_frames) < self.config["num_frames"]:
-                print(f"Buffer incompleto: {len(self.buffer_frames)}/{self.config['num_frames']} frames")
-                return {
-                    'violencia_detectada': False,
-                    'probabilidad': 0.0,
-                    'mensaje': f'Buffer incompleto ({len(self.buffer_frames)}/{self.config["num_frames"]} frames)'
-                }
+            if not self.clip_listo():
+                return self._resultado_buffer_incompleto()
             
-            print(f"Procesando {len(self.buffer_frames)} frames para detección")
+            input_tensor, frames = self._preparar_clip()
             
-            # Preprocesar frames en FP16
-            input_tensor = self.processor.preprocess_frames(self.buffer_frames)
-            if input_tensor is None:
-                print("Error: input_tensor es None")
-                return {'violencia_detectada': False, 'probabilidad': 0.0}
+            # Realizar inferencia en el motor compartido
+            outputs = self.motor.inferir(input_tensor)
             
-            print(f"Shape del tensor de entrada: {input_tensor.shape}")
-            
-            # Realizar inferencia
-            outputs = self.model.run(
-                None, 
-                {self.model.get_inputs()[0].name: input_tensor}
-            )
-            
-            # Calcular probabilidades
-            logits = outputs[0][0].astype(np.float32)
-            probs = self._softmax(logits)
-            
-            # Obtener predicción
-            prob_violencia = float(probs[1])
-            es_violencia = prob_violencia >= self.threshold
-            
-            print(f"Probabilidad de violencia: {prob_violencia:.3f}")
-            if es_violencia:
-                print("¡ALERTA! Violencia detectada")
+            return self._interpretar_logits(outputs[0][0], frames)
+                
+        except Exception as e:
+            return self._resultado_error(e)
+    
+    async def detectar_async(self, planificador: Optional[PlanificadorInferencia] = None) -> Dict[str, Any]:
+        """
+        Realiza la detección enviando el clip al planificador de micro-lotes
+        
+        El clip se agrupa con los de otras cámaras que estén listos en el
+        mismo instante y se ejecuta en una sola inferencia.
+        """
+        try:
+            if not self.clip_listo():
+                return self._resultado_buffer_incompleto()
             
-            self.violencia_detectada = es_violencia
-            self.probabilidad_violencia = prob_violencia
+            planificador = planificador or obtener_planificador_timesformer(self.precision)
             
-            # *** NUEVA INFORMACIÓN: Marcar todos los frames analizados ***
-            resultado = {
-                'violencia_detectada': es_violencia,
-                'probabilidad': prob_violencia,
-                'probabilidad_violencia': prob_violencia,  # Campo adicional para consistencia
-                'clase': self.config["labels"][1] if es_violencia else self.config["labels"][0],
-                'mensaje': 'ALERTA: Violencia detectada' if es_violencia else 'No se detectó violencia',
-                'frames_analizados': len(self.buffer_frames),  # *** NUEVO ***
-                'frames_en_secuencia': self.buffer_frames.copy() if es_violencia else [],  # *** NUEVO ***
-                'batch_completo': True  # *** NUEVO ***
-            }
+            input_tensor, frames = self._preparar_clip()
+            logits = await planificador.enviar(input_tensor)
             
-            return resultado
-                
+            return self._interpretar_logits(logits, frames)
+        
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"Error en detección de violencia: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
-            return {
-                'violencia_detectada': False,
-                'probabilidad': 0.0,
-                'mensaje': f'Error: {str(e)}',
-                'frames_analizados': 0,
-                'frames_en_secuencia': [],
-                'batch_completo': False
-            }
+            return self._resultado_error(e)
     
     def reiniciar(self):
         """Reinicia el estado del detector"""
+        self.buffer_clip.limpiar()
         self.buffer_frames.clear()
         self.violencia_detectada = False
         self.probabilidad_violencia = 0.0
@@ -3,8 +3,8 @@ Detector de personas usando YOLOv11
 """
 import cv2
 import numpy as np
-from typing import List, Dict, Any, Tuple
-from ultralytics import YOLO
+from typing import List, Dict, Any, Tuple, Union
+from app.ai.yolo_onnx import ModeloYoloOnnx
 from app.config import configuracion
 from app.utils.logger import obtener_logger
 
@@ -12,11 +12,19 @@ logger = obtener_logger(__name__)
 
 
 class DetectorPersonas:
-    """Detector de personas basado en YOLOv11"""
+    """Detector de personas basado en YOLOv11 (ONNX Runtime o ultralytics/torch)"""
     
-    def __init__(self, modelo: YOLO):
+    def __init__(self, modelo: Union[ModeloYoloOnnx, Any]):
         self.modelo = modelo
+        self.es_onnx = isinstance(modelo, ModeloYoloOnnx)
         self.confianza_minima = configuracion.YOLO_CONF_THRESHOLD
+    
+    @property
+    def tamano_entrada(self) -> Tuple[int, int]:
+        """(ancho, alto) de entrada del modelo; ultralytics usa YOLO_INPUT_SIZE"""
+        if self.es_onnx:
+            return self.modelo.ancho, self.modelo.alto
+        return configuracion.YOLO_INPUT_SIZE, configuracion.YOLO_INPUT_SIZE
         
     def detectar(self, frame: np.ndarray) -> List[Dict[str, Any]]:
         """
@@ -29,45 +37,81 @@ class DetectorPersonas:
             Lista de detecciones con formato:
             [{'bbox': [x, y, w, h], 'confianza': float, 'clase': 'persona'}]
         """
+        return self.detectar_lote([frame])[0]
+    
+    def detectar_lote(self, frames: List[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        """
+        Detecta personas en varios frames (de distintas cámaras) en una sola pasada
+        
+        Args:
+            frames: Lista de frames de video
+            
+        Returns:
+            Una lista de detecciones por frame, en el mismo orden de entrada
+        """
+        if not frames:
+            return []
+        
         try:
-            # Realizar inferencia
+            if self.es_onnx:
+                # Decodificación y NMS en NumPy: [N, 6] = x1, y1, x2, y2, conf, clase
+                predicciones = self.modelo.predecir(
+                    list(frames),
+                    confianza_minima=self.confianza_minima,
+                    clases=[0]  # Solo clase persona
+                )
+                return [
+                    self._formatear_detecciones(p[:, :4], p[:, 4])
+                    for p in predicciones
+                ]
+            
+            # Realizar inferencia sobre todo el lote
             resultados = self.modelo(
-                frame,
+                list(frames),
                 conf=self.confianza_minima,
                 classes=[0],  # Solo clase persona
                 verbose=False
             )
             
-            detecciones = []
-            
-            for resultado in resultados:
-                if resultado.boxes is not None:
-                    for box in resultado.boxes:
-                        # Obtener coordenadas
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        
-                        # Convertir a formato [x, y, w, h]
-                        bbox = [
-                            float(x1),
-                            float(y1),
-                            float(x2 - x1),
-                            float(y2 - y1)
-                        ]
-                        
-                        deteccion = {
-                            'bbox': bbox,
-                            'confianza': float(box.conf[0]),
-                            'clase': 'persona'
-                        }
-                        
-                        detecciones.append(deteccion)
-            
-            return detecciones
+            return [self._extraer_detecciones(resultado) for resultado in resultados]
             
         except Exception as e:
             logger.error(f"Error en detección YOLO: {e}")
             print(f"Error en detección YOLO: {e}")
+            return [[] for _ in frames]
+    
+    @staticmethod
+    def _extraer_detecciones(resultado) -> List[Dict[str, Any]]:
+        """Extrae cajas, confianzas y clases de un resultado con operaciones vectorizadas"""
+        boxes = resultado.boxes
+        if boxes is None or len(boxes) == 0:
+            return []
+        
+        # Una sola transferencia a CPU por tensor en lugar de una por caja
+        xyxy = boxes.xyxy.cpu().numpy()
+        confianzas = boxes.conf.cpu().numpy()
+        
+        return DetectorPersonas._formatear_detecciones(xyxy, confianzas)
+    
+    @staticmethod
+    def _formatear_detecciones(xyxy: np.ndarray, confianzas: np.ndarray) -> List[Dict[str, Any]]:
+        """Convierte arrays xyxy/confianza al formato de detección del pipeline"""
+        if len(xyxy) == 0:
             return []
+        
+        # Convertir a formato [x, y, w, h]
+        xywh = xyxy.astype(np.float32, copy=True)
+        xywh[:, 2:] -= xywh[:, :2]
+        confianzas = confianzas.astype(np.float32)
+        
+        return [
+            {
+                'bbox': bbox,
+                'confianza': confianza,
+                'clase': 'persona'
+            }
+            for bbox, confianza in zip(xywh.tolist(), confianzas.tolist())
+        ]
     
     def detectar_con_procesamiento(
         self, 
@@ -0,0 +1,182 @@
+"""
+Backend ONNX Runtime para YOLO (detección de personas sin torch)
+"""
+import cv2
+import numpy as np
+import onnxruntime as ort
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+from app.config import configuracion
+from app.utils.logger import obtener_logger
+
+logger = obtener_logger(__name__)
+
+
+def nms(cajas: np.ndarray, puntuaciones: np.ndarray, umbral_iou: float) -> np.ndarray:
+    """
+    Supresión de no-máximos en NumPy
+
+    Args:
+        cajas: [N, 4] en formato xyxy
+        puntuaciones: [N]
+        umbral_iou: IoU a partir del cual se descarta la caja de menor puntuación
+
+    Returns:
+        Índices de las cajas conservadas, ordenados por puntuación descendente
+    """
+    if len(cajas) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    x1, y1, x2, y2 = cajas.T
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    orden = puntuaciones.argsort()[::-1]
+    conservadas = []
+
+    while orden.size > 0:
+        i = orden[0]
+        conservadas.append(i)
+        resto = orden[1:]
+
+        ancho = np.clip(np.minimum(x2[i], x2[resto]) - np.maximum(x1[i], x1[resto]), 0, None)
+        alto = np.clip(np.minimum(y2[i], y2[resto]) - np.maximum(y1[i], y1[resto]), 0, None)
+        interseccion = ancho * alto
+        iou = interseccion / (areas[i] + areas[resto] - interseccion + 1e-7)
+
+        orden = resto[iou <= umbral_iou]
+
+    return np.asarray(conservadas, dtype=np.int64)
+
+
+class ModeloYoloOnnx:
+    """
+    Modelo YOLO exportado a ONNX (formato ultralytics, salida [B, 4 + clases, anclas])
+
+    Letterbox, decodificación de cajas y NMS se hacen en NumPy.
+    """
+
+    def __init__(self, ruta_modelo: Path, hilos_intra_op: Optional[int] = None):
+        self.ruta_modelo = ruta_modelo
+
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opciones.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opciones.intra_op_num_threads = hilos_intra_op or configuracion.YOLO_ONNX_INTRA_OP_THREADS
+        opciones.inter_op_num_threads = 1
+
+        providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] \
+            if configuracion.USE_GPU else ['CPUExecutionProvider']
+
+        self.sesion = ort.InferenceSession(str(ruta_modelo), providers=providers, sess_options=opciones)
+
+        entrada = self.sesion.get_inputs()[0]
+        self.nombre_entrada = entrada.name
+        self.tipo_entrada = np.float16 if entrada.type == 'tensor(float16)' else np.float32
+
+        # Tamaño de entrada fijo del export; si es dinámico se usa el configurado
+        _, _, alto, ancho = entrada.shape
+        self.alto = alto if isinstance(alto, int) else configuracion.YOLO_INPUT_SIZE
+        self.ancho = ancho if isinstance(ancho, int) else configuracion.YOLO_INPUT_SIZE
+
+        dimension_lote = entrada.shape[0]
+        self.lote_maximo = dimension_lote if isinstance(dimension_lote, int) and dimension_lote > 0 else None
+
+    def _letterbox(self, frame: np.ndarray, destino: np.ndarray) -> Tuple[float, int, int]:
+        """Redimensiona con padding gris y escribe [C, H, W] RGB normalizado en `destino`"""
+        alto, ancho = frame.shape[:2]
+        escala = min(self.ancho / ancho, self.alto / alto)
+        nuevo_ancho, nuevo_alto = int(round(ancho * escala)), int(round(alto * escala))
+        pad_x = (self.ancho - nuevo_ancho) // 2
+        pad_y = (self.alto - nuevo_alto) // 2
+
+        # Con la vista del detector (VistasFrame) el frame ya cabe y solo falta el padding
+        if (nuevo_ancho, nuevo_alto) == (ancho, alto):
+            redimensionado = frame
+        else:
+            redimensionado = cv2.resize(frame, (nuevo_ancho, nuevo_alto), interpolation=cv2.INTER_LINEAR)
+
+        destino[...] = 114 / 255.0
+        # BGR → RGB invirtiendo el eje de canales al transponer
+        destino[:, pad_y:pad_y + nuevo_alto, pad_x:pad_x + nuevo_ancho] = \
+            redimensionado.transpose(2, 0, 1)[::-1] * (1 / 255.0)
+
+        return escala, pad_x, pad_y
+
+    def _decodificar(
+        self,
+        salida: np.ndarray,
+        escala: float,
+        pad_x: int,
+        pad_y: int,
+        forma_original: Tuple[int, int],
+        confianza_minima: float,
+        clases: Optional[Sequence[int]],
+        umbral_iou: float
+    ) -> np.ndarray:
+        """Convierte la salida [4 + clases, anclas] de un frame en [N, 6] (x1, y1, x2, y2, conf, clase)"""
+        predicciones = salida.T.astype(np.float32)  # [anclas, 4 + clases]
+        puntuaciones_clase = predicciones[:, 4:]
+
+        if clases is not None:
+            mascara_clases = np.zeros(puntuaciones_clase.shape[1], dtype=bool)
+            mascara_clases[list(clases)] = True
+            puntuaciones_clase = np.where(mascara_clases, puntuaciones_clase, 0.0)
+
+        clase = puntuaciones_clase.argmax(axis=1)
+        confianza = puntuaciones_clase[np.arange(len(clase)), clase]
+
+        validas = confianza >= confianza_minima
+        if not validas.any():
+            return np.empty((0, 6), dtype=np.float32)
+
+        cxcywh = predicciones[validas, :4]
+        confianza = confianza[validas]
+        clase = clase[validas]
+
+        cajas = np.empty_like(cxcywh)
+        cajas[:, :2] = cxcywh[:, :2] - cxcywh[:, 2:] / 2
+        cajas[:, 2:] = cxcywh[:, :2] + cxcywh[:, 2:] / 2
+
+        # NMS por clase desplazando las cajas de cada clase a una región distinta
+        desplazamiento = clase[:, None].astype(np.float32) * (max(self.ancho, self.alto) + 1)
+        conservadas = nms(cajas + desplazamiento, confianza, umbral_iou)[:configuracion.YOLO_MAX_DETECTIONS]
+
+        cajas = cajas[conservadas]
+        cajas[:, [0, 2]] = (cajas[:, [0, 2]] - pad_x) / escala
+        cajas[:, [1, 3]] = (cajas[:, [1, 3]] - pad_y) / escala
+        alto, ancho = forma_original
+        cajas[:, [0, 2]] = np.clip(cajas[:, [0, 2]], 0, ancho)
+        cajas[:, [1, 3]] = np.clip(cajas[:, [1, 3]], 0, alto)
+
+        return np.column_stack([cajas, confianza[conservadas], clase[conservadas]]).astype(np.float32)
+
+    def predecir(
+        self,
+        frames: List[np.ndarray],
+        confianza_minima: float,
+        clases: Optional[Sequence[int]] = None,
+        umbral_iou: Optional[float] = None
+    ) -> List[np.ndarray]:
+        """
+        Ejecuta la detección sobre una lista de frames BGR
+
+        Returns:
+            Un array [N, 6] (x1, y1, x2, y2, conf, clase) por frame
+        """
+        umbral_iou = umbral_iou if umbral_iou is not None else configuracion.YOLO_IOU_THRESHOLD
+        lote = self.lote_maximo or len(frames)
+        resultados = []
+
+        for inicio in range(0, len(frames), lote):
+            grupo = frames[inicio:inicio + lote]
+            entrada = np.empty((len(grupo), 3, self.alto, self.ancho), dtype=np.float32)
+            geometrias = [self._letterbox(frame, entrada[i]) for i, frame in enumerate(grupo)]
+
+            salida = self.sesion.run(None, {self.nombre_entrada: entrada.astype(self.tipo_entrada, copy=False)})[0]
+
+            for i, (frame, (escala, pad_x, pad_y)) in enumerate(zip(grupo, geometrias)):
+                resultados.append(self._decodificar(
+                    salida[i], escala, pad_x, pad_y, frame.shape[:2],
+                    confianza_minima, clases, umbral_iou
+                ))
+
+        return resultados
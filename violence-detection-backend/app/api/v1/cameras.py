@@ -2,15 +2,22 @@
 Endpoints de gestión de cámaras
 """
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket
+from fastapi import APIRouter, Depends, HTTPException, Request, status, WebSocket, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import obtener_db
 from app.core.dependencies import DependenciasComunes, requiere_admin
+from app.core.security import obtener_usuario_actual, obtener_usuario_reproductor, crear_token_reproduccion
+from app.config import configuracion
 from app.schemas.camera import Camara, CamaraCrear, CamaraActualizar
 from app.services.camera_service import ServicioCamaras
+from app.services.camera_registry import registro_camaras
+from app.services.capture_sources import crear_fuente
+from app.services.mjpeg_relay import relay_mjpeg
 from app.models.camera import EstadoCamara  # Importar el Enum EstadoCamara
 from app.api.websocket.rtc_signaling import websocket_endpoint as rtc_endpoint
 from app.api.websocket.stream_handler import manejador_streaming
+from app.services.detection_supervisor import supervisor_deteccion
 from app.utils.logger import obtener_logger
 import uuid
 
@@ -112,6 +119,12 @@ async def activar_camara(
         camara.nombre
     )
     
+    # Detección continua mientras la cámara esté activa
+    try:
+        await supervisor_deteccion.iniciar_trabajador(camara)
+    except Exception as e:
+        logger.error(f"No se pudo iniciar la detección de la cámara {camara_id}: {e}")
+    
     return {"mensaje": "Cámara activada", "camara": camara}
 
 
@@ -138,6 +151,8 @@ async def desactivar_camara(
         camara.nombre
     )
     
+    await supervisor_deteccion.detener_trabajador(camara_id)
+    
     return {"mensaje": "Cámara desactivada", "camara": camara}
 
 
@@ -151,19 +166,119 @@ async def websocket_stream(
     await rtc_endpoint(websocket, cliente_id, camara_id)
 
 
+async def _origen_mjpeg(camara_id: int, anotado: bool) -> dict:
+    """Fuente de la cámara (del registro) y, si se pide la vista anotada, su trabajador"""
+    camara = await registro_camaras.obtener(camara_id)
+    if camara is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cámara no encontrada"
+        )
+    
+    trabajador = supervisor_deteccion.obtener_trabajador(camara_id) if anotado else None
+    if anotado and trabajador is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="La cámara no tiene detección activa: no hay vista anotada"
+        )
+    return {
+        "trabajador": trabajador,
+        "fuente": crear_fuente(camara.url_conexion, camara.tipo_camara),
+        "fps": camara.fps
+    }
+
+
+@router.post("/{camara_id}/mjpeg/token")
+@router.post("/{camara_id}/snapshot/token")
+async def crear_token_medio(
+    camara_id: int,
+    request: Request,
+    usuario = Depends(obtener_usuario_actual)
+):
+    """Token de reproducción para usar /mjpeg o /snapshot en <img src> (?token=)"""
+    recurso = request.url.path.removesuffix("/token")
+    return {
+        "token": crear_token_reproduccion(usuario, recurso),
+        "expira_en": configuracion.MEDIA_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+
+@router.get("/{camara_id}/mjpeg")
+async def stream_mjpeg(
+    camara_id: int,
+    anotado: bool = False,
+    _usuario = Depends(obtener_usuario_reproductor)
+):
+    """
+    Stream MJPEG (multipart/x-mixed-replace) para monitores y vistas previas
+    
+    Todos los clientes de una cámara comparten la misma codificación JPEG.
+    Sin cabecera Authorization se acepta en ?token= un token de
+    POST /{camara_id}/mjpeg/token. Con `anotado=true` la cámara debe tener
+    su trabajador de detección activo (409 si no).
+    """
+    difusor = await relay_mjpeg.suscribir(camara_id, **await _origen_mjpeg(camara_id, anotado))
+    
+    async def generar():
+        try:
+            async for jpeg in difusor.iterar():
+                yield (
+                    b"--frame\r\n"
+                    b"Content-Type: image/jpeg\r\n"
+                    b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n" +
+                    jpeg + b"\r\n"
+                )
+        finally:
+            relay_mjpeg.desuscribir(difusor)
+    
+    return StreamingResponse(
+        generar(),
+        media_type="multipart/x-mixed-replace; boundary=frame",
+        headers={"Cache-Control": "no-cache, no-store"}
+    )
+
+
+@router.get("/{camara_id}/snapshot")
+async def obtener_snapshot(
+    camara_id: int,
+    anotado: bool = False,
+    _usuario = Depends(obtener_usuario_reproductor)
+):
+    """Frame actual de la cámara en JPEG (token en ?token= desde POST /{camara_id}/snapshot/token)"""
+    jpeg = await relay_mjpeg.capturar_snapshot(camara_id, **await _origen_mjpeg(camara_id, anotado))
+    if jpeg is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="La cámara no entregó ningún frame"
+        )
+    
+    return Response(content=jpeg, media_type="image/jpeg", headers={"Cache-Control": "no-cache"})
+
+
 @router.get("/{camara_id}/estadisticas")
 async def obtener_estadisticas_camara(
     camara_id: int,
     deps: DependenciasComunes = Depends()
 ):
     """Obtiene estadísticas de procesamiento de una cámara"""
-    # TODO: Implementar obtención de estadísticas desde el pipeline
+    trabajador = supervisor_deteccion.obtener_trabajador(camara_id)
+    if trabajador is None:
+        return {
+            "camara_id": camara_id,
+            "frames_procesados": 0,
+            "incidentes_detectados": 0,
+            "personas_rastreadas": 0,
+            "estado_pipeline": "inactivo"
+        }
+    
+    estadisticas = trabajador.obtener_estadisticas()
     return {
         "camara_id": camara_id,
-        "frames_procesados": 0,
-        "incidentes_detectados": 0,
-        "personas_rastreadas": 0,
-        "estado_pipeline": "inactivo"
+        "frames_procesados": estadisticas['pipeline']['frames_procesados'],
+        "incidentes_detectados": estadisticas['pipeline']['incidentes_detectados'],
+        "personas_rastreadas": len(trabajador.pipeline.ultimas_detecciones),
+        "estado_pipeline": "activo",
+        "detalle": estadisticas
     }
 
 
@@ -188,6 +303,8 @@ async def eliminar_camara(
     try:
         await deps.db.delete(camara)
         await deps.db.commit()
+        registro_camaras.invalidar(camara_id)
+        await supervisor_deteccion.detener_trabajador(camara_id)
         
         logger.info(f"Cámara {camara_id} eliminada")
         print(f"Cámara {camara_id} eliminada")
@@ -4,31 +4,153 @@
 """
 Endpoints para servir archivos de evidencia
 """
+import asyncio
+import base64
 import os
+from datetime import datetime, timezone
 from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import obtener_db
+from app.core.database import obtener_db, SesionAsincrona
 from app.core.dependencies import DependenciasComunes
+from app.core.security import (
+    obtener_usuario_actual, obtener_usuario_reproductor, crear_token_reproduccion
+)
+from app.models.incident import Incidente
 from app.services.incident_service import ServicioIncidentes
+from app.services.evidence_store import almacen_evidencias, iterar_archivo
 from app.config import configuracion
+from app.utils.http_range import respuesta_con_rangos
+from app.utils.video_base64_utils import tamano_base64_decodificado, caracteres_base64_para_rango
 from app.utils.logger import obtener_logger
 
 logger = obtener_logger(__name__)
 router = APIRouter(prefix="/files", tags=["archivos"])
 
+# Media type por extensión de archivo de video
+MEDIA_TYPES_VIDEO = {
+    '.mp4': 'video/mp4',
+    '.avi': 'video/avi',
+    '.mov': 'video/quicktime',
+    '.mkv': 'video/x-matroska'
+}
+
+
+async def _iterar_base64_legado(incidente_id: int, inicio: int, fin: int):
+    """
+    Bytes [inicio, fin] de un video Base64 legado guardado en la base de datos
+
+    Solo se leen (con substr) y decodifican los caracteres del rango, en
+    bloques de BASE64_CHUNK_SIZE alineados a grupos de 4: la memoria no
+    depende del tamaño del video.
+    """
+    desde, hasta, descartar = caracteres_base64_para_rango(inicio, fin)
+    tamano_bloque = max(4, configuracion.BASE64_CHUNK_SIZE // 4 * 4)
+    restantes = fin - inicio + 1
+
+    for posicion in range(desde, hasta, tamano_bloque):
+        # Una sesión por bloque: un reproductor en pausa no retiene una conexión del pool
+        async with SesionAsincrona() as sesion:
+            resultado = await sesion.execute(
+                select(func.substr(Incidente.video_base64, posicion + 1, min(tamano_bloque, hasta - posicion)))
+                .where(Incidente.id == incidente_id)
+            )
+            texto = resultado.scalar() or ""
+
+        datos = base64.b64decode(texto)
+        if descartar:
+            datos = datos[descartar:]
+            descartar = 0
+        datos = datos[:restantes]
+        restantes -= len(datos)
+
+        if datos:
+            yield datos
+        if restantes <= 0 or not texto:
+            break
+
+
+async def obtener_origen_video(servicio: ServicioIncidentes, incidente) -> Optional[Dict[str, Any]]:
+    """
+    Tamaño, validadores HTTP y lector por rangos del video de un incidente
+
+    Orden: almacén de evidencias, archivo legado (video_evidencia_path) y
+    Base64 legado en la base de datos. None si el incidente no tiene video.
+    """
+    if incidente.video_storage_key:
+        clave = incidente.video_storage_key
+        metadatos = await asyncio.to_thread(almacen_evidencias.metadatos, clave)
+        if metadatos is None:
+            logger.error(f"Evidencia {clave} no encontrada en el almacén")
+            return None
+        return {
+            'origen': 'almacen',
+            'tamano': metadatos['tamano'],
+            'modificado': metadatos['modificado'],
+            # La clave es el hash del contenido: ETag fuerte y caché inmutable
+            'etag': f'"{Path(clave).stem}"',
+            'extension': Path(clave).suffix.lower(),
+            'cache': "private, max-age=31536000, immutable",
+            'abrir': lambda inicio, fin: almacen_evidencias.iterar(clave, inicio, fin)
+        }
+
+    if incidente.video_evidencia_path:
+        video_path = configuracion.VIDEO_EVIDENCE_PATH / incidente.video_evidencia_path
+        if video_path.is_file():
+            # Verificar que es un archivo de video válido
+            if video_path.suffix.lower() not in MEDIA_TYPES_VIDEO:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Formato de archivo no válido"
+                )
+            stat = video_path.stat()
+            return {
+                'origen': 'archivo',
+                'tamano': stat.st_size,
+                'modificado': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+                'etag': f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+                'extension': video_path.suffix.lower(),
+                'cache': "private, max-age=3600",
+                'abrir': lambda inicio, fin: iterar_archivo(video_path, inicio, fin)
+            }
+        logger.error(f"Video no encontrado en: {video_path}")
+
+    longitud, final = await servicio.obtener_resumen_base64(incidente.id)
+    if longitud:
+        modificado = incidente.fecha_actualizacion or incidente.fecha_creacion
+        version = int(modificado.timestamp()) if modificado else 0
+        return {
+            'origen': 'base64',
+            'tamano': tamano_base64_decodificado(longitud, final),
+            'modificado': modificado,
+            'etag': f'"b64-{incidente.id}-{longitud:x}-{version:x}"',
+            'extension': '.mp4',
+            'cache': "private, max-age=3600",
+            'abrir': lambda inicio, fin: _iterar_base64_legado(incidente.id, inicio, fin)
+        }
+
+    return None
+
 
 @router.get("/videos/{incidente_id}")
 async def obtener_video_evidencia(
     incidente_id: int,
-    deps: DependenciasComunes = Depends()
+    request: Request,
+    db: AsyncSession = Depends(obtener_db),
+    _usuario: dict = Depends(obtener_usuario_reproductor)
 ):
     """
     Sirve el video de evidencia de un incidente específico
+
+    Admite Range (206 Partial Content), ETag/If-None-Match, Last-Modified e
+    If-Range, así el navegador empieza a reproducir y salta a cualquier
+    punto sin descargar el video entero. Para usar la URL directamente en
+    <video src> se pasa en ?token= un token de POST /videos/{id}/token.
     """
     try:
-        servicio = ServicioIncidentes(deps.db)
+        servicio = ServicioIncidentes(db)
         incidente = await servicio.obtener_incidente(incidente_id)
         
         if not incidente:
@@ -37,49 +159,24 @@ async def obtener_video_evidencia(
                 detail="Incidente no encontrado"
             )
         
-        if not incidente.video_evidencia_path:
+        origen = await obtener_origen_video(servicio, incidente)
+        if origen is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No hay video disponible para este incidente"
             )
         
-        # Construir la ruta completa del archivo
-        video_path = configuracion.VIDEO_EVIDENCE_PATH / incidente.video_evidencia_path
-        
-        if not video_path.exists():
-            logger.error(f"Video no encontrado en: {video_path}")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Archivo de video no encontrado en el servidor"
-            )
-        
-        # Verificar que es un archivo de video válido
-        valid_extensions = ['.mp4', '.avi', '.mov', '.mkv']
-        if video_path.suffix.lower() not in valid_extensions:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Formato de archivo no válido"
-            )
-        
-        # Determinar el media type
-        media_type_map = {
-            '.mp4': 'video/mp4',
-            '.avi': 'video/avi', 
-            '.mov': 'video/quicktime',
-            '.mkv': 'video/x-matroska'
-        }
-        
-        media_type = media_type_map.get(video_path.suffix.lower(), 'video/mp4')
-        
-        # Retornar el archivo como respuesta
-        return FileResponse(
-            path=str(video_path),
-            media_type=media_type,
-            filename=f"evidencia_incidente_{incidente_id}{video_path.suffix}",
+        nombre = f"evidencia_incidente_{incidente_id}{origen['extension']}"
+        return respuesta_con_rangos(
+            request,
+            tamano=origen['tamano'],
+            etag=origen['etag'],
+            modificado=origen['modificado'],
+            abrir_rango=origen['abrir'],
+            media_type=MEDIA_TYPES_VIDEO.get(origen['extension'], 'video/mp4'),
             headers={
-                "Content-Disposition": f"inline; filename=evidencia_incidente_{incidente_id}{video_path.suffix}",
-                "Cache-Control": "max-age=3600",
-                "Accept-Ranges": "bytes"
+                "Content-Disposition": f"inline; filename={nombre}",
+                "Cache-Control": origen['cache']
             }
         )
         
@@ -93,6 +190,25 @@ async def obtener_video_evidencia(
         )
 
 
+@router.post("/videos/{incidente_id}/token")
+async def crear_token_video(
+    incidente_id: int,
+    request: Request,
+    usuario: dict = Depends(obtener_usuario_actual)
+):
+    """
+    Emite un token de reproducción válido solo para /videos/{incidente_id}
+
+    Caduca en MEDIA_TOKEN_EXPIRE_MINUTES; el navegador lo manda en ?token=
+    y las peticiones por rangos posteriores reutilizan la misma URL.
+    """
+    recurso = request.url.path.removesuffix("/token")
+    return {
+        "token": crear_token_reproduccion(usuario, recurso),
+        "expira_en": configuracion.MEDIA_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+
 @router.get("/videos/{incidente_id}/info")
 async def obtener_info_video(
     incidente_id: int,
@@ -111,7 +227,44 @@ async def obtener_info_video(
                 detail="Incidente no encontrado"
             )
         
+        if incidente.video_storage_key:
+            metadatos = await asyncio.to_thread(almacen_evidencias.metadatos, incidente.video_storage_key)
+            if metadatos is None:
+                return {
+                    "has_video": False,
+                    "message": "Video no encontrado en el almacén",
+                    "video_storage_key": incidente.video_storage_key
+                }
+            
+            return {
+                "has_video": True,
+                "video_url": f"/api/v1/files/videos/{incidente_id}",
+                "video_storage_key": incidente.video_storage_key,
+                "storage_backend": almacen_evidencias.nombre,
+                "file_size_mb": round(metadatos['tamano'] / (1024 * 1024), 2),
+                "file_extension": Path(incidente.video_storage_key).suffix,
+                "created_at": incidente.fecha_creacion.isoformat() if incidente.fecha_creacion else None,
+                "incident_duration": incidente.duracion_segundos,
+                "video_duration": float(incidente.video_duration or 0),
+                "metadata": incidente.metadata_json
+            }
+        
         if not incidente.video_evidencia_path:
+            # Base64 legado: se sirve decodificado por /files/videos/{id}
+            longitud, final = await servicio.obtener_resumen_base64(incidente_id)
+            if longitud:
+                return {
+                    "has_video": True,
+                    "video_url": f"/api/v1/files/videos/{incidente_id}",
+                    "video_format": "base64",
+                    "file_size_mb": round(tamano_base64_decodificado(longitud, final) / (1024 * 1024), 2),
+                    "file_extension": ".mp4",
+                    "created_at": incidente.fecha_creacion.isoformat() if incidente.fecha_creacion else None,
+                    "incident_duration": incidente.duracion_segundos,
+                    "video_duration": float(incidente.video_duration or 0),
+                    "metadata": incidente.metadata_json
+                }
+            
             return {
                 "has_video": False,
                 "message": "No hay video disponible para este incidente"
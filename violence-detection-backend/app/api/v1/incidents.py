@@ -165,11 +165,18 @@ async def obtener_estadisticas(
 @router.get("/{incidente_id}", response_model=IncidenteConVideoBase64)
 async def obtener_incidente_con_video(
     incidente_id: int,
+    incluir_base64: bool = Query(False, description="Incluir el video Base64 legado en la respuesta"),
     deps: DependenciasComunes = Depends()
 ):
-    """*** ACTUALIZADO: Obtiene un incidente específico CON VIDEO BASE64 ***"""
+    """
+    *** ACTUALIZADO: Obtiene un incidente específico ***
+
+    El video se reproduce desde `video_stream_url` (/files/videos/{id}, con
+    Range/206) para cualquier origen; el Base64 legado solo viaja en el
+    JSON si se pide con `incluir_base64`.
+    """
     servicio = ServicioIncidentes(deps.db)
-    incidente = await servicio.obtener_incidente(incidente_id)
+    incidente = await servicio.obtener_incidente(incidente_id, con_video_base64=incluir_base64)
     
     if not incidente:
         raise HTTPException(
@@ -177,19 +184,24 @@ async def obtener_incidente_con_video(
             detail="Incidente no encontrado"
         )
     
-    print(f"📹 Sirviendo incidente {incidente_id} con Base64")
+    from app.api.v1.files import obtener_origen_video
+    origen = await obtener_origen_video(servicio, incidente)
+    
+    if not incluir_base64:
+        # Columna diferida sin cargar: se fija a None sin consultarla ni marcarla como modificada
+        from sqlalchemy.orm.attributes import set_committed_value
+        set_committed_value(incidente, 'video_base64', None)
+    
+    respuesta = IncidenteConVideoBase64.model_validate(incidente)
     
-    # Log para debug del Base64
-    if incidente.video_base64:
-        base64_size = len(incidente.video_base64)
-        print(f"🎥 Base64 disponible: {base64_size} caracteres")
-        print(f"🎥 Codec: {incidente.video_codec}")
-        print(f"🎥 Duración: {incidente.video_duration}s")
-        print(f"🎥 Resolución: {incidente.video_resolution}")
+    if origen:
+        respuesta.video_stream_url = f"/api/v1/files/videos/{incidente_id}"
+        print(f"🎥 Video de incidente {incidente_id}: {origen['origen']}, "
+              f"{origen['tamano'] / (1024 * 1024):.2f} MB, codec {incidente.video_codec}")
     else:
-        print(f"⚠️ No hay video Base64 para incidente {incidente_id}")
+        print(f"⚠️ No hay video para incidente {incidente_id}")
     
-    return incidente
+    return respuesta
 
 
 @router.post("/", response_model=Incidente)
@@ -289,7 +301,7 @@ async def obtener_info_video_incidente(
     incidente_id: int,
     deps: DependenciasComunes = Depends()
 ):
-    """*** ACTUALIZADO: Obtiene información del video Base64 ***"""
+    """*** ACTUALIZADO: Obtiene información del video (almacén de evidencias o Base64 legado) ***"""
     servicio = ServicioIncidentes(deps.db)
     incidente = await servicio.obtener_incidente(incidente_id)
     
@@ -299,34 +311,55 @@ async def obtener_info_video_incidente(
             detail="Incidente no encontrado"
         )
     
-    if not incidente.video_base64:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No hay video disponible para este incidente"
-        )
-    
-    return {
+    info = {
         "has_video": True,
-        "video_format": "base64",
         "video_codec": incidente.video_codec or "mp4v",
         "video_duration": float(incidente.video_duration or 0),
         "video_fps": incidente.video_fps or 15,
         "video_resolution": incidente.video_resolution or "640x480",
         "video_file_size": incidente.video_file_size or 0,
-        "base64_length": len(incidente.video_base64),
-        "base64_size_mb": len(incidente.video_base64) / (1024 * 1024),
         "metadata": incidente.metadata_json
     }
+    
+    if incidente.video_storage_key:
+        return {
+            **info,
+            "video_format": "almacen",
+            "video_storage_key": incidente.video_storage_key,
+            "video_url": f"/api/v1/files/videos/{incidente_id}"
+        }
+    
+    # Base64 legado: solo se consulta su longitud, sin traer el texto
+    base64_length, _ = await servicio.obtener_resumen_base64(incidente_id)
+    
+    if not base64_length:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No hay video disponible para este incidente"
+        )
+    
+    return {
+        **info,
+        "video_format": "base64",
+        "video_url": f"/api/v1/files/videos/{incidente_id}",
+        "base64_length": base64_length,
+        "base64_size_mb": base64_length / (1024 * 1024)
+    }
 
 
-@router.get("/{incidente_id}/video/base64")
+@router.get("/{incidente_id}/video/base64", deprecated=True)
 async def obtener_video_base64(
     incidente_id: int,
     deps: DependenciasComunes = Depends()
 ):
-    """*** NUEVO: Endpoint específico para obtener solo el Base64 del video ***"""
+    """
+    Base64 completo del video legado en un JSON
+
+    Obsoleto: /api/v1/files/videos/{id} sirve el mismo video por rangos sin
+    decodificarlo entero en el navegador.
+    """
     servicio = ServicioIncidentes(deps.db)
-    incidente = await servicio.obtener_incidente(incidente_id)
+    incidente = await servicio.obtener_incidente(incidente_id, con_video_base64=True)
     
     if not incidente:
         raise HTTPException(
@@ -369,8 +402,10 @@ async def eliminar_incidente(
         )
     
     try:
+        clave_video = incidente.video_storage_key
         await deps.db.delete(incidente)
         await deps.db.commit()
+        await servicio.liberar_evidencia(clave_video)
         
         logger.info(f"Incidente {incidente_id} eliminado por usuario {deps.usuario_actual['id']}")
         print(f"Incidente {incidente_id} eliminado por usuario {deps.usuario_actual['id']}")
@@ -496,10 +531,17 @@ async def actualizar_incidente_interno(
         # Respuesta exitosa
         print(f"✅ [INTERNO BASE64] Incidente {incidente_id} actualizado completamente")
         
+        if 'video_storage_key' in update_data:
+            video_format = "almacen"
+        elif 'video_base64' in update_data:
+            video_format = "base64"
+        else:
+            video_format = "metadata_only"
+        
         return {
-            "message": "Incidente actualizado correctamente con Base64",
+            "message": "Incidente actualizado correctamente",
             "incidente_id": incidente_id,
-            "video_format": "base64" if 'video_base64' in update_data else "metadata_only",
+            "video_format": video_format,
             "video_size_mb": len(update_data.get('video_base64', '')) / (1024 * 1024) if 'video_base64' in update_data else 0,
             "campos_actualizados": list(update_data.keys())
         }
@@ -195,7 +195,7 @@ class ManejadorWebRTC:
         if camara_id in self.salas:
             logger.info(f"Broadcasting a sala {camara_id} con mensaje: {mensaje}")
             print(f"Broadcasting a sala {camara_id} con mensaje: {mensaje}")
-            for cliente_id in self.salas[camara_id]:
+            for cliente_id in list(self.salas[camara_id]):
                 if cliente_id != excluir:
                     await self.enviar_a_cliente(cliente_id, mensaje)
         else:
@@ -2,40 +2,52 @@ import cv2
 import asyncio
 from typing import Optional, Dict, Any
 import av
-from app.ai.model_loader import cargador_modelos
-from app.ai.pipeline import PipelineDeteccion
 from app.config import configuracion
 from app.utils.logger import obtener_logger
 from app.api.websocket.common import ManejadorWebRTC, manejador_webrtc
-from aiortc import RTCPeerConnection, RTCSessionDescription, VideoStreamTrack, RTCConfiguration, RTCIceServer
-from app.ai.yolo_detector import DetectorPersonas
-from app.ai.violence_detector import DetectorViolencia
-from app.services.alarm_service import ServicioAlarma
-from app.services.notification_service import ServicioNotificaciones
-from app.services.incident_service import ServicioIncidentes
+from aiortc import (
+    RTCPeerConnection, RTCSessionDescription, VideoStreamTrack, RTCConfiguration, RTCIceServer,
+    MediaStreamTrack, RTCRtpSender
+)
+from aiortc.mediastreams import MediaStreamError
+from app.services.camera_hub import camera_hub, RanuraFrame
+from app.services.stream_relay import relay_streaming
+from app.services.quality_controller import ControladorCalidad
+from app.services.capture_sources import crear_fuente
+from app.services.detection_supervisor import supervisor_deteccion
 import numpy as np
 import socket
-from asyncio import Queue
 import time
-import threading
-from datetime import datetime
 
 logger = obtener_logger(__name__)
 
+def _perfil_inicial() -> Optional[str]:
+    """Perfil más alto de STREAM_QUALITY_PROFILES si la calidad adaptativa está activa"""
+    if configuracion.ADAPTIVE_QUALITY_ENABLED and configuracion.STREAM_QUALITY_PROFILES:
+        return next(iter(configuracion.STREAM_QUALITY_PROFILES))
+    return None
+
+
 class VideoTrackProcesado(VideoStreamTrack):
-    def __init__(self, source, pipeline, manejador_webrtc, cliente_id, camara_id, deteccion_activada=False):
+    """
+    Track de visualización WebRTC de una cámara
+
+    Sin detección muestra los frames crudos del hub de captura; con detección
+    se adjunta a la salida anotada del trabajador de la cámara, que es
+    compartido por todos los espectadores.
+    """
+
+    def __init__(self, source, cliente_id, camara_id, deteccion_activada=False, fps=None):
         super().__init__()
         self.source = source
-        self.pipeline = pipeline
-        self.manejador_webrtc = manejador_webrtc
+        self.fps_camara = fps
         self.cliente_id = cliente_id
         self.camara_id = camara_id
         self.deteccion_activada = deteccion_activada
-        self.frame_count = 0
         
-        # Colas separadas para streaming y procesamiento MEJORADAS
-        self.stream_queue = asyncio.Queue(maxsize=5)  # Cola para streaming (más pequeña)
-        self.processing_queue = asyncio.Queue(maxsize=50)  # Cola más grande para procesamiento
+        # Ranura de último frame para streaming (sin colas que acumulen latencia)
+        self.stream_slot = RanuraFrame()
+        self.ultima_secuencia_stream = 0
         
         # Control de tiempo
         self.last_frame_time = time.time()
@@ -46,340 +58,82 @@ class VideoTrackProcesado(VideoStreamTrack):
         self.stream_width = configuracion.DISPLAY_WIDTH
         self.stream_height = configuracion.DISPLAY_HEIGHT
         
-        self.cap = None
-        self.capture_thread = None
-        self.processing_task = None
+        self.captura = None
+        self.trabajador = None
         self.running = True
         
-        # NUEVO: Estado de violencia para captura intensiva
-        self.violence_mode = False
-        self.last_violence_detection = 0
+        # Perfil de calidad inicial (el controlador adaptativo lo ajusta después)
+        self.perfil = _perfil_inicial()
         
         self._start()
         
-        # Iniciar procesamiento si está activado
-        if deteccion_activada:
-            self.start_processing()
-        
     def _start(self):
-        """Inicializa la captura de video con DirectShow"""
-        print(f"Iniciando cámara {self.source} con DirectShow...")
-        self.cap = cv2.VideoCapture(self.source, cv2.CAP_DSHOW)
-        if not self.cap.isOpened():
-            raise RuntimeError(f"No se pudo abrir la cámara {self.source} con DirectShow")
-        
-        # Configurar cámara con resolución fija
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.stream_width)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.stream_height)
-        self.cap.set(cv2.CAP_PROP_FPS, self.target_fps)
-        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimizar buffer
+        """Se suscribe a la captura compartida de la cámara (una por cámara física)"""
+        self.captura = camera_hub.suscribir(
+            self.camara_id, self._recibir_frame, fuente=self.source, fps=self.fps_camara
+        )
         
-        print(f"Cámara {self.source} configurada: {self.stream_width}x{self.stream_height}@{self.target_fps}FPS")
+        # El streaming sigue el ritmo real de la captura compartida
+        self.target_fps = self.captura.fps
+        self.frame_interval = 1.0 / self.target_fps
         
-        # Iniciar hilo de captura
-        self.capture_thread = threading.Thread(target=self._capture_frames, daemon=True)
-        self.capture_thread.start()
+        if self.perfil:
+            self.aplicar_perfil(self.perfil)
+
+    def aplicar_perfil(self, perfil: str):
+        """Resolución y FPS de visualización según STREAM_QUALITY_PROFILES"""
+        datos_perfil = configuracion.STREAM_QUALITY_PROFILES[perfil]
+        self.perfil = perfil
+        self.stream_width = datos_perfil["width"]
+        self.stream_height = datos_perfil["height"]
+        self.target_fps = min(self.captura.fps, datos_perfil["fps"]) if self.captura else datos_perfil["fps"]
+        self.frame_interval = 1.0 / self.target_fps
 
-    def _capture_frames(self):
-        """Hilo dedicado para captura de frames OPTIMIZADO PARA VIOLENCIA"""
-        last_capture_time = time.time()
-        
-        # CAPTURA ADAPTATIVA SEGÚN MODO DE VIOLENCIA
-        base_capture_interval = 1.0 / 30  # 30 FPS base
-        violence_capture_interval = 1.0 / 40  # 40 FPS durante violencia
-        
-        while self.running and self.cap and self.cap.isOpened():
-            current_time = time.time()
-            
-            # AJUSTAR FRECUENCIA SEGÚN MODO DE VIOLENCIA
-            if self.violence_mode:
-                capture_interval = violence_capture_interval
-            else:
-                capture_interval = base_capture_interval
-            
-            if current_time - last_capture_time < capture_interval:
-                time.sleep(0.001)
-                continue
-                
-            ret, frame = self.cap.read()
-            if not ret:
-                time.sleep(0.01)
-                continue
-            
-            # Asegurar dimensiones consistentes
-            if frame.shape[:2] != (self.stream_height, self.stream_width):
-                frame = cv2.resize(frame, (self.stream_width, self.stream_height))
-            
-            frame_data = {
-                'frame': frame.copy(),
-                'timestamp': current_time,
-                'frame_id': self.frame_count,
-                'violence_mode': self.violence_mode
-            }
-            
-            # PRIORIDAD MÁXIMA PARA FRAMES DURANTE VIOLENCIA
-            if self.deteccion_activada:
-                try:
-                    # Durante violencia: forzar agregar frames
-                    if self.violence_mode:
-                        # Limpiar cola si está llena y agregar frame importante
-                        if self.processing_queue.full():
-                            try:
-                                self.processing_queue.get_nowait()
-                            except:
-                                pass
-                        self.processing_queue.put_nowait(frame_data)
-                    else:
-                        # Modo normal
-                        self.processing_queue.put_nowait(frame_data)
-                except asyncio.QueueFull:
-                    # Solo en modo normal, descartar frames si la cola está llena
-                    if not self.violence_mode:
-                        try:
-                            self.processing_queue.get_nowait()
-                            self.processing_queue.put_nowait(frame_data)
-                        except:
-                            pass
-            
-            # Cola de streaming (menor prioridad)
-            try:
-                self.stream_queue.put_nowait(frame_data)
-            except asyncio.QueueFull:
-                try:
-                    self.stream_queue.get_nowait()
-                    self.stream_queue.put_nowait(frame_data)
-                except:
-                    pass
-            
-            self.frame_count += 1
-            last_capture_time = current_time
-    
-    # *** NUEVO MÉTODO PARA OBTENER UBICACIÓN DE LA CÁMARA ***
-    async def _obtener_ubicacion_camara(self, camara_id: int) -> str:
-        """Obtiene la ubicación de la cámara desde la base de datos"""
-        try:
-            from app.core.database import SesionAsincrona
-            from app.models.camera import Camara
-            from sqlalchemy import select
-            
-            async with SesionAsincrona() as session:
-                resultado = await session.execute(
-                    select(Camara.ubicacion).where(Camara.id == camara_id)
-                )
-                ubicacion = resultado.scalar()
-                
-                return ubicacion or f"Cámara {camara_id}"
-                
-        except Exception as e:
-            print(f"Error obteniendo ubicación de cámara {camara_id}: {e}")
-            return f"Cámara {camara_id}"
+    def obtener_descartados(self) -> int:
+        return self.stream_slot.descartados
 
-    async def process_frames(self):
-        """CORREGIDO: Procesamiento que preserva TODA la secuencia de violencia"""
-        try:
-            print(f"Iniciando procesamiento MEJORADO de frames para cliente {self.cliente_id}")
-            last_process_time = time.time()
-            frames_sin_violencia = 0
-            limpieza_programada = False
-            
-            # *** NUEVO: Control de secuencia activa ***
-            secuencia_violencia_activa = False
-            frames_secuencia_procesados = 0
-            
-            while self.deteccion_activada and self.running:
-                try:
-                    frame_data = await asyncio.wait_for(
-                        self.processing_queue.get(), 
-                        timeout=0.1
-                    )
-                    
-                    frame = frame_data['frame']
-                    frame_id = frame_data['frame_id']
-                    current_time = time.time()
-                    
-                    # *** CORRECCIÓN: Procesamiento adaptativo MEJORADO ***
-                    should_process = False
-                    
-                    if self.violence_mode or secuencia_violencia_activa:
-                        should_process = (frame_id % 1 == 0)  # *** CADA frame durante violencia ***
-                    else:
-                        should_process = (frame_id % configuracion.PROCESS_EVERY_N_FRAMES == 0)
-                    
-                    if should_process and (current_time - last_process_time >= 0.05):  # *** REDUCIDO tiempo mínimo ***
-                        try:
-                            frame_proc = await asyncio.get_event_loop().run_in_executor(
-                                None, 
-                                lambda: cv2.resize(
-                                    frame.copy(), 
-                                    (configuracion.YOLO_RESOLUTION_WIDTH, configuracion.YOLO_RESOLUTION_HEIGHT)
-                                )
-                            )
-                            
-                            print(f"Procesando frame {frame_id} para cliente {self.cliente_id}")
-                            
-                            ubicacion_camara = await self._obtener_ubicacion_camara(self.camara_id)
-                            
-                            # *** PROCESAR FRAME CON PIPELINE CORREGIDO ***
-                            resultado = await self.pipeline.procesar_frame(
-                                frame_proc,
-                                camara_id=self.camara_id,
-                                ubicacion=ubicacion_camara
-                            )
-                            
-                            if resultado and resultado.get("violencia_detectada"):
-                                print(f"✅ Violencia detectada para cliente {self.cliente_id}")
-                                
-                                # *** ACTIVAR MODO VIOLENCIA Y SECUENCIA ***
-                                self.violence_mode = True
-                                secuencia_violencia_activa = True
-                                self.last_violence_detection = current_time
-                                frames_sin_violencia = 0
-                                frames_secuencia_procesados = 0
-                                limpieza_programada = False
-                                
-                                probabilidad_real = (
-                                    resultado.get("probabilidad_violencia") or
-                                    resultado.get("probabilidad") or 
-                                    0.0
-                                )
-                                
-                                personas_detectadas = len(resultado.get("personas_detectadas", []))
-                                
-                                # *** MENSAJE CORREGIDO con información de secuencia ***
-                                mensaje_notificacion = {
-                                    "tipo": "deteccion_violencia",
-                                    "probabilidad": float(probabilidad_real),
-                                    "probability": float(probabilidad_real),
-                                    "probabilidad_violencia": float(probabilidad_real),
-                                    "mensaje": f"¡ALERTA! Violencia detectada - {probabilidad_real:.1%}",
-                                    "personas_detectadas": int(personas_detectadas),
-                                    "peopleCount": int(personas_detectadas),
-                                    "ubicacion": str(ubicacion_camara),
-                                    "location": str(ubicacion_camara),
-                                    "timestamp": datetime.now().isoformat(),
-                                    "camara_id": self.camara_id,
-                                    "violencia_detectada": True,
-                                    "frames_analizados": resultado.get("frames_analizados", 8),  # *** NUEVO ***
-                                    "secuencia_activa": True  # *** NUEVO ***
-                                }
-                                
-                                print(f"📤 ENVIANDO MENSAJE CORREGIDO: {mensaje_notificacion}")
-                                
-                                await self.manejador_webrtc.enviar_a_cliente(
-                                    self.cliente_id,
-                                    mensaje_notificacion
-                                )
-                                
-                            else:
-                                # *** CORRECCIÓN: Manejo de frames de secuencia sin violencia confirmada ***
-                                frames_sin_violencia += 1
-                                frames_secuencia_procesados += 1
-                                
-                                # *** ENVIAR ACTUALIZACIÓN DE SECUENCIA EN ANÁLISIS ***
-                                if secuencia_violencia_activa and frames_secuencia_procesados < 15:  # Mantener secuencia por más tiempo
-                                    mensaje_secuencia = {
-                                        "tipo": "secuencia_analisis",
-                                        "probabilidad": resultado.get("probabilidad_violencia", 0.0),
-                                        "probability": resultado.get("probabilidad_violencia", 0.0),
-                                        "mensaje": f"Analizando secuencia... ({frames_secuencia_procesados}/15)",
-                                        "personas_detectadas": len(resultado.get("personas_detectadas", [])),
-                                        "ubicacion": str(ubicacion_camara),
-                                        "timestamp": datetime.now().isoformat(),
-                                        "camara_id": self.camara_id,
-                                        "violencia_detectada": False,
-                                        "secuencia_activa": True,
-                                        "frames_procesados": frames_secuencia_procesados
-                                    }
-                                    
-                                    await self.manejador_webrtc.enviar_a_cliente(
-                                        self.cliente_id,
-                                        mensaje_secuencia
-                                    )
-                                
-                                # *** FINALIZAR SECUENCIA después de más frames ***
-                                if secuencia_violencia_activa and frames_secuencia_procesados >= 15:
-                                    secuencia_violencia_activa = False
-                                    print(f"🔄 Secuencia de análisis finalizada para cliente {self.cliente_id}")
-                                
-                                # *** PROGRAMAR LIMPIEZA después de suficiente tiempo ***
-                                if self.violence_mode and frames_sin_violencia > 25 and not limpieza_programada:  # *** AUMENTADO: ~2 segundos ***
-                                    print(f"⏰ Programando limpieza de alerta para cliente {self.cliente_id}")
-                                    asyncio.create_task(self._limpiar_alerta_violencia(6))  # *** AUMENTADO: 6 segundos ***
-                                    limpieza_programada = True
-                                
-                                # *** DESACTIVAR MODO VIOLENCIA después de más tiempo ***
-                                if self.violence_mode and frames_sin_violencia > 60:  # *** AUMENTADO: ~4 segundos ***
-                                    self.violence_mode = False
-                                    print(f"🔄 Modo violencia desactivado para cliente {self.cliente_id}")
-                            
-                            last_process_time = current_time
-                            
-                        except Exception as e:
-                            print(f"❌ Error procesando frame {frame_id}: {e}")
-                            import traceback
-                            print(traceback.format_exc())
-                    
-                    # *** PAUSA ADAPTATIVA CORREGIDA ***
-                    if self.violence_mode or secuencia_violencia_activa:
-                        await asyncio.sleep(0.001)  # Procesamiento muy rápido durante análisis
-                    else:
-                        await asyncio.sleep(0.008)  # Procesamiento normal
-                    
-                except asyncio.TimeoutError:
-                    continue
-                except Exception as e:
-                    print(f"❌ Error en process_frames: {e}")
-                    break
-                    
-        except Exception as e:
-            print(f"❌ Error en process_frames: {e}")
-            import traceback
-            print(traceback.format_exc())
-        finally:
-            print(f"Tarea de procesamiento MEJORADO finalizada para cliente {self.cliente_id}")
-
-    # *** NUEVO MÉTODO PARA OBTENER UBICACIÓN DE LA CÁMARA ***
-    async def _obtener_ubicacion_camara(self, camara_id: int) -> str:
-        """Obtiene la ubicación de la cámara desde la base de datos"""
-        try:
-            from app.core.database import SesionAsincrona
-            from app.models.camera import Camara
-            from sqlalchemy import select
-            
-            async with SesionAsincrona() as session:
-                resultado = await session.execute(
-                    select(Camara.ubicacion).where(Camara.id == camara_id)
-                )
-                ubicacion = resultado.scalar()
-                
-                return ubicacion or f"Cámara {camara_id}"
-                
-        except Exception as e:
-            print(f"Error obteniendo ubicación de cámara {camara_id}: {e}")
-            return f"Cámara {camara_id}"
+    def fps_objetivo(self) -> float:
+        return self.target_fps
+
+    def _recibir_frame(self, frame_data):
+        """Frames crudos del hilo de captura (solo mientras no se muestra la salida anotada)"""
+        if self.trabajador is None:
+            self.stream_slot.publicar(frame_data)
     
-    def start_processing(self):
-        """Inicia la tarea de procesamiento en segundo plano"""
-        if not self.processing_task or self.processing_task.done():
-            self.deteccion_activada = True
-            self.processing_task = asyncio.create_task(self.process_frames())
-            print("Tarea de procesamiento iniciada")
-            
-    def stop_processing(self):
-        """Detiene la tarea de procesamiento"""
+    def adjuntar_deteccion(self, trabajador):
+        """Muestra la salida anotada del trabajador de detección de la cámara"""
+        if self.trabajador is trabajador:
+            return
+        self.desadjuntar_deteccion()
+        self.trabajador = trabajador
+        self.deteccion_activada = True
+        trabajador.agregar_espectador(self.stream_slot)
+        print(f"Cliente {self.cliente_id} adjunto a la detección de la cámara {self.camara_id}")
+    
+    def desadjuntar_deteccion(self):
+        """Vuelve a mostrar los frames crudos de la cámara"""
         self.deteccion_activada = False
-        self.violence_mode = False
-        if self.processing_task:
-            self.processing_task.cancel()
-        print("Tarea de procesamiento detenida")
+        if self.trabajador is not None:
+            self.trabajador.quitar_espectador(self.stream_slot)
+            self.trabajador = None
+            print(f"Cliente {self.cliente_id} desadjunto de la detección de la cámara {self.camara_id}")
+    
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        """Frames publicados y descartados (no leídos a tiempo) del streaming"""
+        return {
+            'cliente_id': self.cliente_id,
+            'camara_id': self.camara_id,
+            'deteccion_activada': self.deteccion_activada,
+            'perfil': self.perfil,
+            'streaming': self.stream_slot.obtener_estadisticas()
+        }
     
     async def recv(self):
         """Recibe frames para streaming WebRTC"""
         try:
             pts, time_base = await self.next_timestamp()
 
-            if not self.running or not self.cap or not self.cap.isOpened():
+            if not self.running or not self.captura or not self.captura.activa:
                 return None
 
             # Control de timing para FPS consistente
@@ -389,21 +143,23 @@ class VideoTrackProcesado(VideoStreamTrack):
             if time_since_last < self.frame_interval:
                 await asyncio.sleep(self.frame_interval - time_since_last)
 
-            # Obtener frame de la cola de streaming
-            try:
-                frame_data = await asyncio.wait_for(
-                    self.stream_queue.get(), 
-                    timeout=self.frame_interval * 2
-                )
-                frame = frame_data['frame']
-            except asyncio.TimeoutError:
-                # Si no hay frame, usar frame negro
+            # Obtener el frame más reciente de la ranura de streaming
+            nuevo = await self.stream_slot.esperar(
+                self.ultima_secuencia_stream,
+                timeout=self.frame_interval * 2
+            )
+            if nuevo is not None:
+                self.ultima_secuencia_stream, frame_data = nuevo
+            else:
+                # Sin frame nuevo: repetir el último o, si aún no hay ninguno, usar frame negro
                 print("Timeout obteniendo frame para streaming")
-                frame = np.zeros((self.stream_height, self.stream_width, 3), dtype=np.uint8)
+                _, frame_data = self.stream_slot.obtener_ultimo()
 
-            # Asegurar dimensiones consistentes
-            if frame.shape[:2] != (self.stream_height, self.stream_width):
-                frame = cv2.resize(frame, (self.stream_width, self.stream_height))
+            if frame_data is not None:
+                # Vista de visualización compartida (sin deformar) entre espectadores del mismo tamaño
+                frame = frame_data['vistas'].visualizacion(self.stream_width, self.stream_height)
+            else:
+                frame = np.zeros((self.stream_height, self.stream_width, 3), dtype=np.uint8)
 
             # Convertir a RGB para WebRTC
             frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -420,63 +176,129 @@ class VideoTrackProcesado(VideoStreamTrack):
             print(f"Error en recv: {e}")
             return None
     
-    async def _limpiar_alerta_violencia(self, delay_seconds: int = 5):
-        """Limpia la alerta de violencia después de un delay"""
-        await asyncio.sleep(delay_seconds)
+    def stop(self):
+        """Detiene el track y libera su suscripción a la cámara"""
+        if not self.running:
+            return
+        self.running = False
+        self.desadjuntar_deteccion()
         
-        # Verificar si aún no hay violencia después del delay
-        current_time = time.time()
-        if not self.violence_mode or (current_time - self.last_violence_detection) > delay_seconds:
+        # La cámara solo se libera si este era su último suscriptor
+        if self.captura:
+            camera_hub.desuscribir(self.camara_id, self._recibir_frame)
+            self.captura = None
+            
+        print("Suscripción de captura liberada")
+
+
+class VideoTrackRelay(MediaStreamTrack):
+    """
+    Track WebRTC que reenvía paquetes H.264 ya codificados por el relay de la cámara
+
+    aiortc empaqueta directamente los `av.Packet` que devuelve `recv` sin
+    volver a codificar, así que todos los espectadores de una cámara
+    comparten la misma conversión de color y la misma codificación.
+    """
+
+    kind = "video"
+
+    def __init__(self, source, cliente_id, camara_id, deteccion_activada=False, fps=None):
+        super().__init__()
+        self.source = source
+        self.fps_camara = fps
+        self.cliente_id = cliente_id
+        self.camara_id = camara_id
+        self.deteccion_activada = deteccion_activada
+
+        self.trabajador = None
+        self.perfil = _perfil_inicial()
+        self.running = True
+        self._descartados_previos = 0
+        self._suscribir()
+
+    def _suscribir(self):
+        self.relay, self.suscripcion = relay_streaming.suscribir(
+            self.camara_id,
+            trabajador=self.trabajador,
+            fuente=self.source,
+            fps=self.fps_camara,
+            perfil=self.perfil
+        )
+
+    def _cambiar_relay(self, trabajador, perfil):
+        """Pasa a otra variante (cruda/anotada, perfil); el nuevo relay arranca en un keyframe"""
+        relay_anterior, suscripcion_anterior = self.relay, self.suscripcion
+        self._descartados_previos += suscripcion_anterior.descartados
+        self.trabajador = trabajador
+        self.perfil = perfil
+        self._suscribir()
+        relay_streaming.desuscribir(relay_anterior, suscripcion_anterior)
+
+    def aplicar_perfil(self, perfil: str):
+        """Cambia al relay de la cámara codificado con el perfil indicado"""
+        if perfil != self.perfil:
+            self._cambiar_relay(self.trabajador, perfil)
+
+    def obtener_descartados(self) -> int:
+        return self._descartados_previos + self.suscripcion.descartados
+
+    def fps_objetivo(self) -> float:
+        return self.relay.fps
+
+    def adjuntar_deteccion(self, trabajador):
+        """Muestra la salida anotada del trabajador de detección de la cámara"""
+        if self.trabajador is trabajador:
+            return
+        self.deteccion_activada = True
+        self._cambiar_relay(trabajador, self.perfil)
+        print(f"Cliente {self.cliente_id} adjunto a la detección de la cámara {self.camara_id}")
+
+    def desadjuntar_deteccion(self):
+        """Vuelve a mostrar los frames crudos de la cámara"""
+        self.deteccion_activada = False
+        if self.trabajador is not None:
+            self._cambiar_relay(None, self.perfil)
+            print(f"Cliente {self.cliente_id} desadjunto de la detección de la cámara {self.camara_id}")
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {
+            'cliente_id': self.cliente_id,
+            'camara_id': self.camara_id,
+            'deteccion_activada': self.deteccion_activada,
+            'perfil': self.perfil,
+            'paquetes_descartados': self.obtener_descartados(),
+            'relay': self.relay.obtener_estadisticas()
+        }
+
+    async def recv(self):
+        """Entrega el siguiente paquete codificado de la cámara"""
+        while self.running:
+            suscripcion = self.suscripcion
             try:
-                # Enviar mensaje de limpieza de violencia
-                mensaje_limpieza = {
-                    "tipo": "deteccion_violencia_fin",
-                    "violencia_detectada": False,
-                    "probabilidad": 0.0,
-                    "probability": 0.0,
-                    "probabilidad_violencia": 0.0,
-                    "mensaje": "Alerta de violencia finalizada",
-                    "personas_detectadas": 0,
-                    "peopleCount": 0,
-                    "ubicacion": await self._obtener_ubicacion_camara(self.camara_id),
-                    "location": await self._obtener_ubicacion_camara(self.camara_id),
-                    "timestamp": datetime.now().isoformat(),
-                    "camara_id": self.camara_id,
-                    "limpiar_alerta": True
-                }
-                
-                print(f"🧹 Limpiando alerta de violencia para cliente {self.cliente_id}")
-                await self.manejador_webrtc.enviar_a_cliente(
-                    self.cliente_id,
-                    mensaje_limpieza
-                )
-                
-            except Exception as e:
-                print(f"❌ Error limpiando alerta de violencia: {e}")
+                # Timeout corto para notar un cambio de relay (detección activada/desactivada)
+                return await asyncio.wait_for(suscripcion.cola.get(), timeout=0.5)
+            except asyncio.TimeoutError:
+                if self.relay.retirado:
+                    # El trabajador de detección se detuvo: volver a los frames crudos
+                    self.desadjuntar_deteccion()
+                continue
+        raise MediaStreamError
 
     def stop(self):
-        """Detiene todos los procesos"""
+        """Detiene el track y libera su suscripción al relay"""
+        if not self.running:
+            return
         self.running = False
-        self.violence_mode = False
-        self.stop_processing()
-        
-        # Esperar a que termine el hilo de captura
-        if self.capture_thread and self.capture_thread.is_alive():
-            self.capture_thread.join(timeout=2)
-        
-        if self.cap:
-            self.cap.release()
-            self.cap = None
-            
-        print("Recursos de captura liberados")
+        super().stop()
+        relay_streaming.desuscribir(self.relay, self.suscripcion)
+        print(f"Cliente {self.cliente_id} desuscrito del relay de la cámara {self.camara_id}")
 
 
 class ManejadorStreaming:
     def __init__(self):
         self.conexiones_peer: Dict[str, RTCPeerConnection] = {}
-        self.pipelines: Dict[str, PipelineDeteccion] = {}
         self.deteccion_activada: Dict[str, bool] = {}
-        self.servicio_alarma = ServicioAlarma()
+        self.controladores_calidad: Dict[str, ControladorCalidad] = {}
 
     def get_valid_ip_addresses(self):
         """Obtiene direcciones IP válidas, excluyendo 169.254.x.x"""
@@ -507,18 +329,34 @@ class ManejadorStreaming:
             self.conexiones_peer[cliente_id] = pc
             self.deteccion_activada[cliente_id] = deteccion_activada
 
-            if cliente_id not in self.pipelines:
-                self.pipelines[cliente_id] = await self.crear_pipeline(cliente_id)
+            camara = await self._obtener_camara(camara_id)
 
-            video_track = VideoTrackProcesado(
-                source=configuracion.CAMERA_INDEX,
-                pipeline=self.pipelines[cliente_id],
-                manejador_webrtc=manejador_webrtc,
+            # Fuente según url_conexion/tipo_camara (USB, RTSP/HTTP, archivo o sintética)
+            fuente = (
+                crear_fuente(camara.url_conexion, camara.tipo_camara) if camara
+                else crear_fuente(None)
+            )
+
+            # Con relay se comparte una codificación H.264 por cámara entre todos los espectadores
+            clase_track = VideoTrackRelay if configuracion.STREAM_RELAY_ENABLED else VideoTrackProcesado
+            video_track = clase_track(
+                source=fuente,
                 cliente_id=cliente_id,
                 camara_id=camara_id,
-                deteccion_activada=deteccion_activada
+                fps=camara.fps if camara else None
             )
-            pc.addTrack(video_track)
+            sender = pc.addTrack(video_track)
+
+            if configuracion.STREAM_RELAY_ENABLED:
+                self._preferir_h264(pc, sender)
+
+            if configuracion.ADAPTIVE_QUALITY_ENABLED:
+                controlador = ControladorCalidad(video_track, sender)
+                controlador.iniciar()
+                self.controladores_calidad[cliente_id] = controlador
+
+            if deteccion_activada:
+                await self._adjuntar_deteccion(video_track)
 
             @pc.on("connectionstatechange")
             async def on_connectionstatechange():
@@ -533,6 +371,21 @@ class ManejadorStreaming:
             await self.cerrar_conexion(cliente_id)
             raise
 
+    def _preferir_h264(self, pc: RTCPeerConnection, sender):
+        """Los paquetes del relay son H.264: se negocia solo ese códec"""
+        codecs = [
+            codec for codec in RTCRtpSender.getCapabilities("video").codecs
+            if codec.mimeType in ("video/H264", "video/rtx")
+        ]
+        for transceiver in pc.getTransceivers():
+            if transceiver.sender == sender:
+                transceiver.setCodecPreferences(codecs)
+
+    async def _obtener_camara(self, camara_id: int):
+        """Obtiene la cámara del registro en memoria (sin consultar la base de datos)"""
+        from app.services.camera_registry import registro_camaras
+        return await registro_camaras.obtener(camara_id)
+
     async def manejar_offer(
         self,
         cliente_id: str,
@@ -574,6 +427,10 @@ class ManejadorStreaming:
 
     async def cerrar_conexion(self, cliente_id: str):
         try:
+            controlador = self.controladores_calidad.pop(cliente_id, None)
+            if controlador:
+                controlador.detener()
+            
             if cliente_id in self.conexiones_peer:
                 pc = self.conexiones_peer[cliente_id]
                 
@@ -585,10 +442,6 @@ class ManejadorStreaming:
                 await pc.close()
                 del self.conexiones_peer[cliente_id]
             
-            if cliente_id in self.pipelines:
-                self.pipelines[cliente_id].reiniciar()
-                del self.pipelines[cliente_id]
-            
             if cliente_id in self.deteccion_activada:
                 del self.deteccion_activada[cliente_id]
             
@@ -597,31 +450,20 @@ class ManejadorStreaming:
         except Exception as e:
             print(f"Error al cerrar conexión: {e}")
 
-    async def crear_pipeline(self, cliente_id: str) -> PipelineDeteccion:
-        try:
-            from app.core.database import SesionAsincrona
-            db = SesionAsincrona()
-            
-            detector_personas = DetectorPersonas(cargador_modelos.obtener_modelo('yolo'))
-            detector_violencia = DetectorViolencia()
-            servicio_incidentes = ServicioIncidentes(db)
-            servicio_notificaciones = ServicioNotificaciones(db)
-
-            pipeline = PipelineDeteccion(
-                detector_personas=detector_personas,
-                detector_violencia=detector_violencia,
-                servicio_alarma=self.servicio_alarma,
-                servicio_notificaciones=servicio_notificaciones,
-                servicio_incidentes=servicio_incidentes,
-                session=db
-            )
-
-            print(f"Pipeline creado para cliente {cliente_id}")
-            return pipeline
-
-        except Exception as e:
-            print(f"Error creando pipeline: {e}")
-            raise
+    def _obtener_track(self, cliente_id: str):
+        if cliente_id in self.conexiones_peer:
+            for sender in self.conexiones_peer[cliente_id].getSenders():
+                if isinstance(sender.track, (VideoTrackProcesado, VideoTrackRelay)):
+                    return sender.track
+        return None
+
+    async def _adjuntar_deteccion(self, track):
+        """Adjunta el track al trabajador de la cámara (solo cámaras ACTIVA tienen detección)"""
+        trabajador = await supervisor_deteccion.asegurar_trabajador(track.camara_id)
+        if trabajador is None:
+            print(f"⚠️ Cámara {track.camara_id} no encontrada o no activa, se muestra sin detección")
+            return
+        track.adjuntar_deteccion(trabajador)
 
     async def activar_deteccion(self, cliente_id: str, camara_id: int):
         try:
@@ -629,13 +471,9 @@ class ManejadorStreaming:
                 self.deteccion_activada[cliente_id] = True
                 print(f"Detección activada para cliente {cliente_id}")
 
-                if cliente_id in self.pipelines:
-                    self.pipelines[cliente_id].reiniciar()
-                
-                if cliente_id in self.conexiones_peer:
-                    for sender in self.conexiones_peer[cliente_id].getSenders():
-                        if isinstance(sender.track, VideoTrackProcesado):
-                            sender.track.start_processing()
+                track = self._obtener_track(cliente_id)
+                if track:
+                    await self._adjuntar_deteccion(track)
 
         except Exception as e:
             print(f"Error al activar detección: {e}")
@@ -646,13 +484,10 @@ class ManejadorStreaming:
                 self.deteccion_activada[cliente_id] = False
                 print(f"Detección desactivada para cliente {cliente_id}")
                 
-                if cliente_id in self.pipelines:
-                    self.pipelines[cliente_id].reiniciar()
-                
-                if cliente_id in self.conexiones_peer:
-                    for sender in self.conexiones_peer[cliente_id].getSenders():
-                        if isinstance(sender.track, VideoTrackProcesado):
-                            sender.track.stop_processing()
+                # El trabajador de la cámara sigue detectando; solo cambia lo que ve este cliente
+                track = self._obtener_track(cliente_id)
+                if track:
+                    track.desadjuntar_deteccion()
 
         except Exception as e:
             print(f"Error al desactivar detección: {e}")
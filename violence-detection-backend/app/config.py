@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
@@ -20,6 +20,8 @@ class Configuracion(BaseSettings):
     ALGORITHM: str = "HS256"
     # Cambiar la duración del token a 1 hora
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    # Tokens de reproducción (?token= en <video src>/<img src>): cortos y ligados a un recurso
+    MEDIA_TOKEN_EXPIRE_MINUTES: int = 5
     
     # Para mayor seguridad, agregar estas configuraciones
     TOKEN_REFRESH_EXPIRE_HOURS: int = 24
@@ -30,6 +32,12 @@ class Configuracion(BaseSettings):
     CAMERA_WIDTH: int = 640
     CAMERA_HEIGHT: int = 480
     CAMERA_FPS: int = 15  # FPS estable para captura
+    
+    # Fuentes de captura de red (RTSP/HTTP vía PyAV/FFmpeg)
+    RTSP_TRANSPORT: str = "tcp"
+    CAPTURE_NETWORK_TIMEOUT_S: float = 5.0
+    CAPTURE_RECONNECT_INITIAL_S: float = 1.0  # Espera inicial antes de reconectar
+    CAPTURE_RECONNECT_MAX_S: float = 30.0  # Espera máxima (backoff exponencial)
     DISPLAY_WIDTH: int = 640
     DISPLAY_HEIGHT: int = 480
     BUFFER_FRAMES: int = 8
@@ -43,9 +51,18 @@ class Configuracion(BaseSettings):
     UPLOAD_PATH: Path = BASE_DIR / "uploads"
     VIDEO_EVIDENCE_PATH: Path = BASE_DIR / "evidencias"
     
-    YOLO_MODEL: str = "yolo/exported_v3/best.pt"
+    YOLO_MODEL: str = "yolo/exported_v3/best.onnx"  # .onnx → ONNX Runtime; .pt → ultralytics/torch
+    YOLO_MODEL_FALLBACK: str = "yolo/exported_v3/best.pt"  # Usado si el modelo ONNX no está disponible
     TIMESFORMER_MODEL: str = "timesformer/exported_models2/timesformer_violence_detector_half.onnx"
     
+    # Precisión del modelo TimesFormer: fp16, fp32, int8 (en CPU int8/fp32 suelen ser más rápidos que fp16)
+    TIMESFORMER_PRECISION: str = "fp16"
+    TIMESFORMER_MODELS_POR_PRECISION: Dict[str, str] = {
+        "fp16": "timesformer/exported_models2/timesformer_violence_detector_half.onnx",
+        "fp32": "timesformer/exported_models2/timesformer_violence_detector_float.onnx",
+        "int8": "timesformer/exported_models2/timesformer_violence_detector_int8.onnx"
+    }
+    
     # Configuración TimesFormer optimizada
     TIMESFORMER_CONFIG: Dict[str, Any] = {
         "input_size": 224,
@@ -58,6 +75,11 @@ class Configuracion(BaseSettings):
         "labels": ["no_violencia", "violencia"]
     }
     
+    # Motor TimesFormer compartido entre todas las cámaras
+    TIMESFORMER_MAX_CONCURRENT: int = 2  # Inferencias simultáneas sobre la sesión única
+    TIMESFORMER_INTRA_OP_THREADS: int = 4  # Hilos de ONNX Runtime por inferencia
+    TIMESFORMER_BATCH_MAX_WAIT_MS: float = 15.0  # Espera máxima para completar un lote entre cámaras
+    
     # Resoluciones optimizadas
     DEFAULT_RESOLUTION: tuple = (640, 480)
     PROCESSING_RESOLUTION: tuple = (640, 640)
@@ -65,11 +87,26 @@ class Configuracion(BaseSettings):
     
     # Umbrales de confianza
     YOLO_CONF_THRESHOLD: float = 0.60
+    YOLO_IOU_THRESHOLD: float = 0.45  # NMS del backend ONNX
+    YOLO_MAX_DETECTIONS: int = 100
     VIOLENCE_THRESHOLD: float = 0.58
     
-    # Resolución YOLO optimizada para velocidad
-    YOLO_RESOLUTION_WIDTH: int = 416
-    YOLO_RESOLUTION_HEIGHT: int = 416
+    # Ventana deslizante y suavizado temporal de la puntuación de violencia
+    TIMESFORMER_STRIDE_BAJO: int = 8  # Frames nuevos entre inferencias con puntuación baja
+    TIMESFORMER_STRIDE_ALTO: int = 2  # Frames nuevos entre inferencias con puntuación alta
+    TIMESFORMER_STRIDE_UMBRAL: float = 0.3  # Puntuación a partir de la cual se usa el stride alto
+    VIOLENCE_SMOOTHING_MODE: str = "ema"  # ema, histeresis
+    VIOLENCE_EMA_ALPHA: float = 0.5  # Peso del clip más reciente en la EMA
+    VIOLENCE_THRESHOLD_OFF: float = 0.45  # Umbral para desactivar la alerta (histéresis)
+    VIOLENCE_MIN_CLIPS_ACTIVACION: int = 1  # Clips consecutivos sobre el umbral para activar
+    
+    # Lotes YOLO compartidos entre cámaras
+    YOLO_MAX_BATCH_SIZE: int = 8  # Frames máximos por pasada
+    YOLO_BATCH_MAX_WAIT_MS: float = 10.0  # Espera máxima para completar un lote
+    
+    # Backend ONNX de YOLO
+    YOLO_INPUT_SIZE: int = 640  # Usado solo si el export tiene tamaño de entrada dinámico
+    YOLO_ONNX_INTRA_OP_THREADS: int = 2
     
     # ========== CONFIGURACIÓN DE VIDEO EVIDENCIA ==========
     
@@ -90,11 +127,17 @@ class Configuracion(BaseSettings):
     
     VIDEO_CRF: int = 23  # Constant Rate Factor (0-51, menor = mejor calidad)
     
+    # Codificador incremental de evidencias (H.264 en proceso mientras ocurre el incidente)
+    EVIDENCE_ENCODER_PRESET: str = "veryfast"  # Preset x264: la codificación va al ritmo de la captura
+    EVIDENCE_SLOW_MOTION_FACTOR: float = 1.0  # >1 estira los tramos de violencia (2.0 = mitad de velocidad)
+    
     # Buffer inteligente para evidencia (AMPLIADO)
     EVIDENCE_BUFFER_SIZE_SECONDS: int = 30  # Buffer más grande (45 segundos)
     EVIDENCE_FRAME_INTERPOLATION: bool = False  # Desactivar para usar frames reales
     EVIDENCE_TIMESTAMP_OVERLAY: bool = True
     EVIDENCE_CAPTURE_FPS: int = 30  # FPS de captura más alto
+    EVIDENCE_PREROLL_JPEG_QUALITY: int = 85  # Los frames del pre-roll se guardan en JPEG
+    EVIDENCE_PREROLL_MEMORY_FRACTION: float = 0.25  # Parte de MAX_MEMORY_USAGE_MB para el pre-roll de todas las cámaras
     EVIDENCE_SMOOTH_TRANSITIONS: bool = True
     EVIDENCE_TEMPORAL_SMOOTHING: bool = True
     
@@ -173,6 +216,25 @@ class Configuracion(BaseSettings):
     
     # Optimización de procesamiento
     PROCESS_EVERY_N_FRAMES: int = 4  # Procesar cada N frames para eficiencia
+    DETECTION_WORKERS_ENABLED: bool = True  # Detección continua por cámara ACTIVA al arrancar
+    
+    # Compuerta de movimiento (omite YOLO/TimesFormer en escenas estáticas)
+    MOTION_GATE_ENABLED: bool = True
+    MOTION_GATE_WIDTH: int = 160  # Ancho del frame reducido para el análisis
+    MOTION_GATE_PIXEL_THRESHOLD: int = 25  # Diferencia de gris para considerar un píxel cambiado
+    MOTION_GATE_MIN_AREA: float = 0.005  # Fracción de píxeles cambiados que cuenta como movimiento
+    MOTION_GATE_BG_ALPHA: float = 0.05  # Velocidad de adaptación del fondo
+    MOTION_GATE_HOLD_FRAMES: int = 15  # Frames que se siguen procesando tras el último movimiento
+    MOTION_GATE_MAX_SKIP: int = 75  # Forzar una detección tras N frames omitidos seguidos
+    MOTION_GATE_MASKS: Dict[str, List[List[List[float]]]] = {}  # camara_id → polígonos normalizados a ignorar
+    
+    # Compuerta de interacción (TimesFormer solo con personas cercanas)
+    INTERACTION_GATE_ENABLED: bool = True
+    INTERACTION_MIN_PERSONS: int = 2
+    INTERACTION_MAX_DISTANCE: float = 1.5  # Distancia entre centros / altura media de las cajas
+    INTERACTION_MIN_IOU: float = 0.05  # Alternativa: solapamiento mínimo entre cajas
+    INTERACTION_MIN_FRAMES: int = 3  # Frames consecutivos con interacción para abrir la compuerta
+    INTERACTION_HOLD_FRAMES: int = 10  # Frames que sigue abierta tras perder la interacción
     MAX_CONCURRENT_PROCESSES: int = 2
     
     # Configuración GPU
@@ -207,6 +269,16 @@ class Configuracion(BaseSettings):
     EVIDENCE_MAX_SIZE_GB: float = 5.0  # Tamaño máximo de directorio de evidencias
     EVIDENCE_BACKUP_ENABLED: bool = True  # Backup automático de evidencias críticas
     EVIDENCE_COMPRESSION_ENABLED: bool = True  # Comprimir evidencias antiguas
+
+    # Almacén de videos de evidencia (direccionado por SHA-256, fuera de la base de datos)
+    EVIDENCE_STORE_BACKEND: str = "local"  # local, s3
+    EVIDENCE_STORE_PATH: Path = VIDEO_EVIDENCE_PATH / "store"
+    EVIDENCE_S3_BUCKET: str = "evidencias"
+    EVIDENCE_S3_PREFIX: str = ""
+    EVIDENCE_S3_ENDPOINT_URL: Optional[str] = None  # p.ej. http://localhost:9000 para MinIO
+    EVIDENCE_S3_REGION: Optional[str] = None
+    EVIDENCE_S3_ACCESS_KEY: Optional[str] = None
+    EVIDENCE_S3_SECRET_KEY: Optional[str] = None
     
     # Configuración de thumbnails
     THUMBNAIL_ENABLED: bool = True
@@ -225,7 +297,8 @@ class Configuracion(BaseSettings):
         "cpu_usage": {"high": 80.0, "medium": 60.0, "low": 40.0},
         "memory_usage": {"high": 80.0, "medium": 60.0, "low": 40.0},
         "frame_drop_rate": {"high": 5.0, "medium": 2.0, "low": 1.0},
-        "bandwidth": {"high": 2000, "medium": 1000, "low": 500}  # kbps
+        "bandwidth": {"high": 2000, "medium": 1000, "low": 500},  # kbps
+        "inference_backlog": {"high": 8.0, "medium": 4.0, "low": 1.0}  # Peticiones en cola de inferencia
     }
     
     # Buffer específico para secuencias de violencia (frames dedicados)
@@ -282,6 +355,18 @@ class Configuracion(BaseSettings):
         "dtype": "int16"         # Tipo de datos de audio
     }
     
+    # Relay de streaming: una codificación H.264 por cámara para todos los espectadores
+    STREAM_RELAY_ENABLED: bool = True
+    STREAM_RELAY_BITRATE: int = 1_500_000  # bps
+    STREAM_RELAY_GOP_SECONDS: float = 2.0  # Intervalo máximo entre keyframes
+    STREAM_RELAY_QUEUE_SIZE: int = 30  # Paquetes pendientes por espectador antes de resincronizar
+    
+    # Stream MJPEG y snapshots por HTTP (un JPEG por frame compartido entre clientes)
+    MJPEG_FPS: int = 10
+    MJPEG_QUALITY: int = 80
+    MJPEG_SNAPSHOT_TIMEOUT_S: float = 5.0
+    MJPEG_IDLE_GRACE_S: float = 15.0  # Vida de un difusor sin clientes (snapshots seguidos no reabren la cámara)
+    
     # Configuraciones de calidad de stream
     STREAM_QUALITY_PROFILES: Dict[str, Dict[str, Any]] = {
         "Alta": {
@@ -337,6 +422,16 @@ class Configuracion(BaseSettings):
     def obtener_ruta_modelo(self, nombre_modelo: str) -> Path:
         return self.MODELOS_PATH / nombre_modelo
     
+    def obtener_ruta_timesformer(self, precision: Optional[str] = None) -> Path:
+        """Ruta del modelo TimesFormer para la precisión indicada (o la configurada)"""
+        precision = (precision or self.TIMESFORMER_PRECISION).lower()
+        if precision not in self.TIMESFORMER_MODELS_POR_PRECISION:
+            raise ValueError(f"Precisión TimesFormer no soportada: {precision}")
+        # TIMESFORMER_MODEL sigue mandando para fp16 por compatibilidad con .env existentes
+        if precision == "fp16":
+            return self.obtener_ruta_modelo(self.TIMESFORMER_MODEL)
+        return self.obtener_ruta_modelo(self.TIMESFORMER_MODELS_POR_PRECISION[precision])
+    
     def crear_directorios(self):
         """Crea los directorios necesarios de forma segura"""
         directorios = [
@@ -5,6 +5,7 @@ from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import text
 from app.config import configuracion
 from app.utils.logger import obtener_logger
 import asyncio
@@ -36,6 +37,12 @@ SesionAsincrona = async_sessionmaker(
 # Base para los modelos
 Base = declarative_base()
 
+# Columnas añadidas a tablas ya creadas en instalaciones anteriores (idempotente)
+COLUMNAS_AGREGADAS = [
+    "ALTER TABLE incidentes ADD COLUMN IF NOT EXISTS video_storage_key VARCHAR(128)",
+    "CREATE INDEX IF NOT EXISTS ix_incidentes_video_storage_key ON incidentes (video_storage_key)"
+]
+
 
 async def obtener_db() -> AsyncGenerator[AsyncSession, None]:
     """
@@ -75,6 +82,9 @@ async def inicializar_db():
     try:
         async with motor.begin() as conexion:
             await conexion.run_sync(Base.metadata.create_all)
+            # create_all no agrega columnas a tablas existentes
+            for sentencia in COLUMNAS_AGREGADAS:
+                await conexion.execute(text(sentencia))
             logger.info("Base de datos inicializada exitosamente")
             print("Base de datos inicializada exitosamente")
     except SQLAlchemyError as e:
@@ -5,7 +5,7 @@ from datetime import datetime, timedelta
 from typing import Optional, Union
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import configuracion
@@ -17,6 +17,12 @@ contexto_pwd = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # Esquema OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
 
+# Igual, pero sin rechazar la petición si falta la cabecera Authorization
+oauth2_scheme_opcional = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login", auto_error=False)
+
+# Alcance de los tokens de reproducción: solo valen en la query de su recurso
+ALCANCE_REPRODUCCION = "reproduccion"
+
 
 def verificar_password(password_plano: str, password_hash: str) -> bool:
     """Verifica si la contraseña coincide con el hash"""
@@ -47,17 +53,41 @@ def crear_token_acceso(data: dict, expires_delta: Optional[timedelta] = None) ->
     return encoded_jwt
 
 
-async def obtener_usuario_actual(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(obtener_db)
-) -> dict:
-    """Obtiene el usuario actual desde el token"""
+def crear_token_reproduccion(usuario: dict, recurso: str) -> str:
+    """
+    Token corto para poner en ?token= de una URL de medios
+
+    Solo autoriza `recurso` (la ruta exacta, p. ej. /api/v1/files/videos/5)
+    y caduca en MEDIA_TOKEN_EXPIRE_MINUTES: si se filtra en logs, historial
+    o Referer no sirve como sesión.
+    """
+    return crear_token_acceso(
+        {
+            "sub": str(usuario["id"]),
+            "email": usuario.get("email"),
+            "alcance": ALCANCE_REPRODUCCION,
+            "recurso": recurso
+        },
+        expires_delta=timedelta(minutes=configuracion.MEDIA_TOKEN_EXPIRE_MINUTES)
+    )
+
+
+def decodificar_usuario_token(token: Optional[str], recurso: Optional[str] = None) -> dict:
+    """
+    Valida un token JWT y devuelve el usuario que contiene
+
+    Sin `recurso` solo se aceptan tokens de sesión; con `recurso` solo un
+    token de reproducción emitido para esa misma ruta.
+    """
     credenciales_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    if not token:
+        raise credenciales_exception
+    
     try:
         payload = jwt.decode(
             token, 
@@ -68,6 +98,13 @@ async def obtener_usuario_actual(
         
         if usuario_id is None:
             raise credenciales_exception
+        
+        if recurso is None and payload.get("alcance") is not None:
+            raise credenciales_exception
+        if recurso is not None and (
+            payload.get("alcance") != ALCANCE_REPRODUCCION or payload.get("recurso") != recurso
+        ):
+            raise credenciales_exception
             
     except JWTError:
         raise credenciales_exception
@@ -77,6 +114,32 @@ async def obtener_usuario_actual(
     return {"id": usuario_id, "email": payload.get("email")}
 
 
+async def obtener_usuario_actual(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(obtener_db)
+) -> dict:
+    """Obtiene el usuario actual desde el token"""
+    return decodificar_usuario_token(token)
+
+
+async def obtener_usuario_reproductor(
+    request: Request,
+    token_cabecera: Optional[str] = Depends(oauth2_scheme_opcional),
+    token: Optional[str] = Query(
+        None, description="Token de reproducción de esta ruta (para <video src>/<img src>, que no envían cabeceras)"
+    )
+) -> dict:
+    """
+    Usuario actual desde la cabecera Authorization o, si falta, desde ?token=
+
+    En la query solo se acepta un token de reproducción emitido para la ruta
+    pedida, nunca el token de sesión.
+    """
+    if token_cabecera:
+        return decodificar_usuario_token(token_cabecera)
+    return decodificar_usuario_token(token, recurso=request.url.path)
+
+
 def verificar_rol(rol_requerido: str):
     """Decorador para verificar roles de usuario"""
     async def verificador_rol(
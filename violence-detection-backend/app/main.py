@@ -71,6 +71,15 @@ async def lifespan(app: FastAPI):
             logger.error(f"❌ Error inicializando alertas de voz: {e}")
             print(f"❌ Error inicializando alertas de voz: {e}")
     
+        # Trabajadores de detección: uno por cámara activa, haya o no espectadores
+        if configuracion.DETECTION_WORKERS_ENABLED:
+            try:
+                from app.services.detection_supervisor import supervisor_deteccion
+                await supervisor_deteccion.iniciar()
+            except Exception as e:
+                logger.error(f"❌ Error iniciando trabajadores de detección: {e}")
+                print(f"❌ Error iniciando trabajadores de detección: {e}")
+        
         # Iniciar tareas en background
         # asyncio.create_task(procesar_notificaciones())
         
@@ -92,6 +101,10 @@ async def lifespan(app: FastAPI):
         for cliente_id in list(manejador_streaming.conexiones_peer.keys()):
             await manejador_streaming.cerrar_conexion(cliente_id)
         
+        # Detener trabajadores de detección antes de cancelar el resto de tareas
+        from app.services.detection_supervisor import supervisor_deteccion
+        await supervisor_deteccion.detener()
+        
         # 2. Cancelar tareas pendientes
         tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
         if tasks:
@@ -107,6 +120,16 @@ async def lifespan(app: FastAPI):
                 logger.warning("Timeout esperando que las tareas terminen")
         
         # 3. Liberar recursos en orden
+        from app.services.stream_relay import relay_streaming
+        relay_streaming.detener_todos()
+        from app.services.mjpeg_relay import relay_mjpeg
+        relay_mjpeg.detener_todos()
+        
+        from app.services.camera_hub import camera_hub
+        camera_hub.detener_todas()
+        
+        from app.ai.inference_scheduler import detener_planificadores
+        detener_planificadores()
         cargador_modelos.liberar_memoria()
         
         # 4. Cerrar base de datos explícitamente
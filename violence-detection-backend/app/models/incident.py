@@ -1,10 +1,10 @@
 """
 Modelo de Incidente - CORREGIDO para Base64 sin índices problemáticos
 """
-from sqlalchemy import Column, Integer, String, DateTime, Text, DECIMAL, ARRAY, JSON, ForeignKey, Enum, Index
+from sqlalchemy import Column, Integer, String, DateTime, Text, DECIMAL, ARRAY, JSON, ForeignKey, Enum, Index, text
 from sqlalchemy.sql import func
 import enum
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from app.core.database import Base
 
 
@@ -48,8 +48,12 @@ class Incidente(Base):
     numero_personas_involucradas = Column(Integer, default=0)
     ids_personas_detectadas = Column(ARRAY(String), nullable=True)
     
+    # *** VIDEO EN EL ALMACÉN DE EVIDENCIAS (clave SHA-256, ver app/services/evidence_store.py) ***
+    video_storage_key = Column(String(128), nullable=True, index=True)
+    
     # *** CAMPOS BASE64 CORREGIDOS (SIN ÍNDICES) ***
-    video_base64 = Column(Text, nullable=True)  # SIN ÍNDICE - No indexar
+    # Legado: diferido para que los listados no arrastren los MB del video
+    video_base64 = deferred(Column(Text, nullable=True))  # SIN ÍNDICE - No indexar
     video_file_size = Column(Integer, default=0, index=True)  # Índice OK
     video_duration = Column(DECIMAL(5, 2), default=0.0, index=True)  # Índice OK
     video_codec = Column(String(20), default='mp4v', index=True)  # Índice OK
@@ -77,22 +81,27 @@ class Incidente(Base):
     # *** ÍNDICES OPTIMIZADOS DEFINIDOS EXPLÍCITAMENTE ***
     __table_args__ = (
         # Índice compuesto para búsquedas de video
-        Index('idx_incident_video_search', 'id', postgresql_where=video_base64.isnot(None)),
+        Index('idx_incident_video_search', 'id', postgresql_where=text('video_base64 IS NOT NULL')),
         
         # Índice para metadatos de video
         Index('idx_incident_video_meta', 'video_duration', 'video_file_size'),
         
         # Índice temporal para incidentes con video
         Index('idx_incident_video_date', 'fecha_creacion', 
-              postgresql_where=video_base64.isnot(None)),
+              postgresql_where=text('video_base64 IS NOT NULL')),
     )
     
     def __repr__(self):
         return f"<Incidente {self.id} - {self.tipo_incidente}>"
     
+    @property
+    def has_video_almacen(self) -> bool:
+        """Verifica si el video está en el almacén de evidencias"""
+        return bool(self.video_storage_key)
+    
     @property
     def has_video_base64(self) -> bool:
-        """Verifica si el incidente tiene video Base64"""
+        """Verifica si el incidente tiene video Base64 (requiere cargar la columna con undefer)"""
         return self.video_base64 is not None and len(self.video_base64) > 0
     
     @property
@@ -54,8 +54,8 @@ class Incidente(IncidenteBase):
     numero_personas_involucradas: int
     ids_personas_detectadas: Optional[List[str]]
     
-    # *** CAMPOS BASE64 ***
-    video_base64: Optional[str]
+    # *** VIDEO (el Base64 solo se sirve en el detalle, no en listados) ***
+    video_storage_key: Optional[str] = None
     video_file_size: Optional[int]
     video_duration: Optional[Decimal]
     video_codec: Optional[str]
@@ -90,6 +90,8 @@ class IncidenteConVideoBase64(BaseModel):
     descripcion: Optional[str]
     probabilidad_violencia: Optional[Decimal]
     numero_personas_involucradas: int
+    video_storage_key: Optional[str] = None
+    video_stream_url: Optional[str] = None  # Reproducción por rangos (Range/206)
     video_base64: Optional[str]
     video_file_size: Optional[int]
     video_duration: Optional[Decimal]
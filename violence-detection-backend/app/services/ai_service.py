@@ -60,7 +60,7 @@ class ServicioIA:
             cargador_modelos.obtener_modelo('yolo')
         )
         tracker_personas = TrackerPersonas()
-        detector_violencia = DetectorViolencia()  # Ya no necesita modelo como parámetro
+        detector_violencia = DetectorViolencia(cargador_modelos.obtener_motor_timesformer())  # Motor compartido
         
         
         # Crear pipeline
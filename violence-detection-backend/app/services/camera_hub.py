@@ -0,0 +1,383 @@
+"""
+Hub de captura compartida: un único hilo de captura por cámara física
+"""
+import cv2
+import time
+import asyncio
+import threading
+import numpy as np
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from app.ai.frame_views import VistasFrame
+from app.config import configuracion
+from app.services.capture_sources import FuenteCaptura, FuenteUSB
+from app.utils.logger import obtener_logger
+
+logger = obtener_logger(__name__)
+
+# Un suscriptor recibe cada frame_data publicado desde el hilo de captura
+Suscriptor = Callable[[Dict[str, Any]], None]
+
+
+class RanuraFrame:
+    """
+    Último valor publicado por un hilo productor, esperable desde asyncio
+
+    El hilo de captura sobrescribe el valor bajo un lock y despierta al
+    consumidor con `loop.call_soon_threadsafe`; el consumidor siempre recibe
+    el frame más reciente y los que nunca llegó a leer se cuentan como
+    descartados. Cada ranura tiene un único consumidor.
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self._loop = loop or asyncio.get_running_loop()
+        self._lock = threading.Lock()
+        self._evento = asyncio.Event()  # Solo se toca desde el loop
+
+        self._valor: Any = None
+        self._secuencia = 0
+        self._leido = True
+
+        # Estadísticas
+        self.publicados = 0
+        self.descartados = 0
+
+    def publicar(self, valor: Any):
+        """Reemplaza el valor actual (seguro desde cualquier hilo)"""
+        with self._lock:
+            if not self._leido:
+                self.descartados += 1
+            self._valor = valor
+            self._secuencia += 1
+            self._leido = False
+            self.publicados += 1
+
+        try:
+            self._loop.call_soon_threadsafe(self._evento.set)
+        except RuntimeError:
+            pass  # Loop cerrado durante el apagado
+
+    def obtener_ultimo(self) -> Tuple[int, Any]:
+        """Devuelve (secuencia, valor) sin esperar"""
+        with self._lock:
+            self._leido = True
+            return self._secuencia, self._valor
+
+    def _tomar_si_nuevo(self, ultima_secuencia: int) -> Optional[Tuple[int, Any]]:
+        with self._lock:
+            if self._secuencia > ultima_secuencia:
+                self._leido = True
+                return self._secuencia, self._valor
+        return None
+
+    async def esperar(
+        self,
+        ultima_secuencia: int = 0,
+        timeout: Optional[float] = None
+    ) -> Optional[Tuple[int, Any]]:
+        """
+        Espera un valor con secuencia mayor que `ultima_secuencia`
+
+        Returns:
+            (secuencia, valor), o None si vence el timeout
+        """
+        while True:
+            nuevo = self._tomar_si_nuevo(ultima_secuencia)
+            if nuevo is not None:
+                return nuevo
+
+            self._evento.clear()
+            # Volver a comprobar tras limpiar para no perder una publicación intermedia
+            nuevo = self._tomar_si_nuevo(ultima_secuencia)
+            if nuevo is not None:
+                return nuevo
+
+            try:
+                await asyncio.wait_for(self._evento.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'secuencia': self._secuencia,
+                'publicados': self.publicados,
+                'descartados': self.descartados,
+                'ratio_descartados': self.descartados / self.publicados if self.publicados else 0.0
+            }
+
+
+class CapturaCamara:
+    """
+    Captura de una cámara física publicada a varios suscriptores
+
+    Los suscriptores (tracks de visualización, pipeline de detección,
+    grabador de evidencias...) se registran con un callback que se invoca en
+    el hilo de captura; deben ser rápidos y no bloquear.
+    """
+
+    def __init__(
+        self,
+        camara_id: int,
+        fuente: FuenteCaptura,
+        ancho: Optional[int] = None,
+        alto: Optional[int] = None,
+        fps: Optional[int] = None
+    ):
+        self.camara_id = camara_id
+        self.fuente = fuente
+        self.ancho = ancho or configuracion.DISPLAY_WIDTH
+        self.alto = alto or configuracion.DISPLAY_HEIGHT
+        self.fps = fps or configuracion.CAMERA_FPS
+
+        self.hilo_captura: Optional[threading.Thread] = None
+        self.running = False
+        self.modo_violencia = False
+        self._evento_detener = threading.Event()
+
+        self._suscriptores: List[Suscriptor] = []
+        self._lock = threading.Lock()
+
+        # Estadísticas
+        self.frame_count = 0
+        self.inicio = None
+        self._intervalos = deque(maxlen=120)
+
+    @property
+    def activa(self) -> bool:
+        return self.running and self.fuente.abierta
+
+    def iniciar(self):
+        """Abre la fuente y arranca el hilo de captura"""
+        print(f"Iniciando cámara {self.camara_id} desde {self.fuente.descripcion()}...")
+        self.fuente.abrir(self.ancho, self.alto, self.fps)
+
+        # Una fuente con ritmo propio (video a tiempo real) impone su FPS
+        if self.fuente.fps_nativo:
+            self.fps = self.fuente.fps_nativo
+
+        print(f"Cámara {self.camara_id} configurada: {self.ancho}x{self.alto}@{self.fps:.0f}FPS")
+
+        self.running = True
+        self._evento_detener.clear()
+        self.inicio = time.time()
+        self.hilo_captura = threading.Thread(
+            target=self._capturar_frames,
+            name=f"captura_camara_{self.camara_id}",
+            daemon=True
+        )
+        self.hilo_captura.start()
+
+    def detener(self):
+        """Detiene el hilo de captura y libera el dispositivo"""
+        self.running = False
+        self._evento_detener.set()
+
+        if self.hilo_captura and self.hilo_captura.is_alive():
+            self.hilo_captura.join(timeout=2)
+
+        self.fuente.cerrar()
+
+        print(f"Captura de cámara {self.camara_id} liberada")
+
+    def agregar_suscriptor(self, suscriptor: Suscriptor) -> int:
+        with self._lock:
+            self._suscriptores.append(suscriptor)
+            return len(self._suscriptores)
+
+    def quitar_suscriptor(self, suscriptor: Suscriptor) -> int:
+        """Quita un suscriptor y devuelve cuántos quedan"""
+        with self._lock:
+            if suscriptor in self._suscriptores:
+                self._suscriptores.remove(suscriptor)
+            return len(self._suscriptores)
+
+    def _publicar(self, frame_data: Dict[str, Any]):
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+
+        for suscriptor in suscriptores:
+            try:
+                suscriptor(frame_data)
+            except Exception as e:
+                logger.error(f"Error entregando frame de cámara {self.camara_id}: {e}")
+
+    def _capturar_frames(self):
+        """
+        Hilo dedicado para captura de frames con ritmo por plazos
+
+        Se duerme hasta el siguiente plazo (sin espera activa) y la lectura
+        del dispositivo bloquea hasta el próximo frame. Los plazos avanzan en
+        múltiplos exactos del intervalo para no acumular deriva; si la captura
+        se retrasa más de un intervalo, se resincroniza en lugar de ráfagas.
+        """
+        intervalo = 1.0 / self.fps
+        siguiente_plazo = time.monotonic()
+        ultimo_frame = None
+
+        while self.running and self.fuente.abierta:
+            espera = siguiente_plazo - time.monotonic()
+            if self.fuente.requiere_ritmo and espera > 0 and self._evento_detener.wait(espera):
+                break
+
+            ret, frame = self.fuente.leer()
+            instante = time.monotonic()
+            if not ret:
+                # Dispositivo sin frame: esperar un intervalo antes de reintentar,
+                # también en fuentes sin ritmo, para no girar en vacío
+                siguiente_plazo = instante + intervalo
+                if self._evento_detener.wait(intervalo):
+                    break
+                continue
+
+            siguiente_plazo += intervalo
+            if instante - siguiente_plazo > intervalo:
+                siguiente_plazo = instante + intervalo
+
+            if ultimo_frame is not None:
+                self._intervalos.append(instante - ultimo_frame)
+            ultimo_frame = instante
+
+            # Asegurar dimensiones consistentes
+            if frame.shape[:2] != (self.alto, self.ancho):
+                frame = cv2.resize(frame, (self.ancho, self.alto))
+
+            # Un único frame compartido por todos los suscriptores (solo lectura),
+            # con sus vistas redimensionadas calculadas bajo demanda una sola vez
+            self._publicar({
+                'frame': frame,
+                'vistas': VistasFrame(frame),
+                'timestamp': time.time(),
+                'frame_id': self.frame_count,
+                'violence_mode': self.modo_violencia
+            })
+
+            self.frame_count += 1
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        transcurrido = time.time() - self.inicio if self.inicio else 0.0
+        with self._lock:
+            suscriptores = len(self._suscriptores)
+
+        # FPS y jitter medidos sobre los últimos intervalos entre frames
+        intervalos = np.array(self._intervalos, dtype=np.float64)
+        fps_medido = float(1.0 / intervalos.mean()) if len(intervalos) else 0.0
+        jitter_ms = float(intervalos.std() * 1000) if len(intervalos) else 0.0
+
+        return {
+            'camara_id': self.camara_id,
+            'fuente': self.fuente.descripcion(),
+            'activa': self.activa,
+            'suscriptores': suscriptores,
+            'frames_capturados': self.frame_count,
+            'fps_objetivo': self.fps,
+            'fps_medido': fps_medido,
+            'jitter_ms': jitter_ms,
+            'fps_promedio': self.frame_count / transcurrido if transcurrido > 0 else 0.0
+        }
+
+
+class CameraHub:
+    """
+    Registro de capturas compartidas indexado por camara_id
+
+    La primera suscripción a una cámara abre el dispositivo y la última en
+    irse lo libera, de modo que el coste de captura es por cámara y no por
+    espectador. Mientras una captura se cierra, una suscripción nueva a la
+    misma cámara espera a que termine antes de volver a abrir el dispositivo.
+    """
+
+    def __init__(self):
+        self._capturas: Dict[int, CapturaCamara] = {}
+        self._cerrando: Dict[int, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def suscribir(
+        self,
+        camara_id: int,
+        suscriptor: Suscriptor,
+        fuente: Optional[FuenteCaptura] = None,
+        fps: Optional[int] = None
+    ) -> CapturaCamara:
+        """
+        Registra un suscriptor, abriendo la cámara si es el primero
+
+        `fuente` y `fps` (de `Camara.url_conexion`/`tipo_camara` y `Camara.fps`)
+        solo se usan al abrir la cámara; los siguientes suscriptores comparten
+        la captura existente.
+        """
+        while True:
+            with self._lock:
+                cierre = self._cerrando.get(camara_id)
+                if cierre is None:
+                    captura = self._capturas.get(camara_id)
+                    if captura is None:
+                        captura = CapturaCamara(
+                            camara_id,
+                            fuente if fuente is not None else FuenteUSB(configuracion.CAMERA_INDEX),
+                            fps=fps
+                        )
+                        captura.iniciar()
+                        self._capturas[camara_id] = captura
+
+                    total = captura.agregar_suscriptor(suscriptor)
+                    break
+
+            # La captura anterior aún libera el dispositivo: esperar y reintentar
+            cierre.wait()
+
+        logger.info(f"Cámara {camara_id}: {total} suscriptores")
+        print(f"📷 Cámara {camara_id}: suscriptor agregado ({total} activos)")
+        return captura
+
+    def desuscribir(self, camara_id: int, suscriptor: Suscriptor):
+        """Quita un suscriptor y libera la cámara si era el último"""
+        with self._lock:
+            captura = self._capturas.get(camara_id)
+            if captura is None:
+                return
+
+            restantes = captura.quitar_suscriptor(suscriptor)
+            if restantes == 0:
+                del self._capturas[camara_id]
+                self._cerrando[camara_id] = threading.Event()
+
+        print(f"📷 Cámara {camara_id}: suscriptor eliminado ({restantes} activos)")
+        if restantes == 0:
+            self._cerrar(camara_id, captura)
+
+    def _cerrar(self, camara_id: int, captura: CapturaCamara):
+        """Libera la captura y despierta a las suscripciones que esperaban"""
+        try:
+            captura.detener()
+        finally:
+            with self._lock:
+                cierre = self._cerrando.pop(camara_id)
+            cierre.set()
+
+    def obtener_captura(self, camara_id: int) -> Optional[CapturaCamara]:
+        with self._lock:
+            return self._capturas.get(camara_id)
+
+    def detener_todas(self):
+        """Libera todas las cámaras (apagado de la aplicación)"""
+        with self._lock:
+            capturas = list(self._capturas.items())
+            self._capturas.clear()
+            for camara_id, _ in capturas:
+                self._cerrando[camara_id] = threading.Event()
+
+        for camara_id, captura in capturas:
+            self._cerrar(camara_id, captura)
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            capturas = list(self._capturas.values())
+        return {
+            'camaras_activas': len(capturas),
+            'camaras': [captura.obtener_estadisticas() for captura in capturas]
+        }
+
+
+# Instancia global del hub de cámaras
+camera_hub = CameraHub()
@@ -0,0 +1,97 @@
+"""
+Registro en memoria de los metadatos de cámaras
+"""
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from app.utils.logger import obtener_logger
+
+logger = obtener_logger(__name__)
+
+# Columnas de Camara que se copian al registro
+CAMPOS_CAMARA = (
+    'id', 'nombre', 'ubicacion', 'descripcion', 'url_conexion', 'tipo_camara',
+    'resolucion_ancho', 'resolucion_alto', 'fps', 'estado', 'configuracion_json'
+)
+
+
+class RegistroCamaras:
+    """
+    Caché de cámaras para el camino caliente (pipelines, captura, streaming)
+
+    Guarda copias desacopladas de la sesión (atributos con los mismos nombres
+    que el modelo `Camara`). Se carga una vez y `ServicioCamaras` y la API de
+    cámaras la actualizan o invalidan cada vez que modifican una fila.
+    """
+
+    def __init__(self):
+        self._camaras: Dict[int, SimpleNamespace] = {}
+        self._cargado = False
+
+    @staticmethod
+    def _copiar(camara) -> SimpleNamespace:
+        return SimpleNamespace(**{campo: getattr(camara, campo) for campo in CAMPOS_CAMARA})
+
+    async def cargar(self):
+        """Carga todas las cámaras desde la base de datos"""
+        from app.core.database import SesionAsincrona
+        from app.models.camera import Camara
+
+        async with SesionAsincrona() as session:
+            resultado = await session.execute(select(Camara).order_by(Camara.id))
+            camaras = resultado.scalars().all()
+
+        self._camaras = {camara.id: self._copiar(camara) for camara in camaras}
+        self._cargado = True
+        logger.info(f"Registro de cámaras cargado: {len(self._camaras)} cámaras")
+        print(f"📋 Registro de cámaras cargado: {len(self._camaras)} cámaras")
+
+    async def obtener(self, camara_id: int) -> Optional[SimpleNamespace]:
+        """Obtiene una cámara de memoria; solo consulta la base de datos si no está"""
+        camara = self._camaras.get(camara_id)
+        if camara is not None:
+            return camara
+
+        from app.core.database import SesionAsincrona
+        from app.models.camera import Camara
+
+        try:
+            async with SesionAsincrona() as session:
+                fila = await session.get(Camara, camara_id)
+        except Exception as e:
+            logger.error(f"Error obteniendo cámara {camara_id}: {e}")
+            print(f"Error obteniendo cámara {camara_id}: {e}")
+            return None
+
+        if fila is None:
+            return None
+        return self.actualizar(fila)
+
+    async def listar(self) -> List[SimpleNamespace]:
+        if not self._cargado:
+            await self.cargar()
+        return list(self._camaras.values())
+
+    async def obtener_ubicacion(self, camara_id: int) -> str:
+        camara = await self.obtener(camara_id)
+        if camara is None or not camara.ubicacion:
+            return f"Cámara {camara_id}"
+        return camara.ubicacion
+
+    def actualizar(self, camara) -> SimpleNamespace:
+        """Reemplaza la entrada con los valores actuales de una fila `Camara`"""
+        copia = self._copiar(camara)
+        self._camaras[camara.id] = copia
+        return copia
+
+    def invalidar(self, camara_id: Optional[int] = None):
+        """Descarta una cámara (o todas) para que se relea de la base de datos"""
+        if camara_id is None:
+            self._camaras.clear()
+            self._cargado = False
+        else:
+            self._camaras.pop(camara_id, None)
+
+
+# Instancia global del registro
+registro_camaras = RegistroCamaras()
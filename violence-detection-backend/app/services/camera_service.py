@@ -5,6 +5,7 @@ from typing import List, Optional, Dict, Any
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.camera import Camara, EstadoCamara, TipoCamara  # Importar los Enum
+from app.services.camera_registry import registro_camaras
 from app.utils.logger import obtener_logger
 from datetime import datetime
 
@@ -24,6 +25,7 @@ class ServicioCamaras:
             self.db.add(camara)
             await self.db.commit()
             await self.db.refresh(camara)
+            registro_camaras.actualizar(camara)
             
             logger.info(f"Cámara creada: {camara.nombre}")
             print(f"Cámara creada: {camara.nombre}")
@@ -95,6 +97,7 @@ class ServicioCamaras:
             
             await self.db.commit()
             await self.db.refresh(camara)
+            registro_camaras.actualizar(camara)
             
             logger.info(f"Estado de cámara {camara_id} actualizado a: {estado.value}")
             print(f"Estado de cámara {camara_id} actualizado a: {estado.value}")
@@ -130,6 +133,7 @@ class ServicioCamaras:
             
             await self.db.commit()
             await self.db.refresh(camara)
+            registro_camaras.actualizar(camara)
             
             logger.info(f"Configuración de cámara {camara_id} actualizada")
             print(f"Configuración de cámara {camara_id} actualizada")
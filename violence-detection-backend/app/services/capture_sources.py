@@ -0,0 +1,345 @@
+"""
+Fuentes de captura intercambiables por cámara (USB, RTSP/HTTP, archivo, sintética)
+"""
+import sys
+import cv2
+import threading
+import numpy as np
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional, Tuple, Union
+from urllib.parse import urlparse, parse_qs
+from app.config import configuracion
+from app.utils.logger import obtener_logger
+
+logger = obtener_logger(__name__)
+
+EXTENSIONES_VIDEO = {".mp4", ".avi", ".mov", ".mkv", ".webm"}
+
+
+class FuenteCaptura(ABC):
+    """
+    Interfaz común de las fuentes que consume `CapturaCamara`
+
+    `leer()` puede bloquear hasta que haya un frame nuevo. Las fuentes con
+    `requiere_ritmo = False` (archivo a máxima velocidad) no se pacean en el
+    hilo de captura. `fps_nativo` permite a una fuente imponer su propio ritmo.
+    """
+
+    requiere_ritmo = True
+    fps_nativo: Optional[float] = None
+
+    def __init__(self):
+        self._evento_detener = threading.Event()
+
+    @abstractmethod
+    def abrir(self, ancho: int, alto: int, fps: int):
+        ...
+
+    @abstractmethod
+    def leer(self) -> Tuple[bool, Optional[np.ndarray]]:
+        ...
+
+    def cerrar(self):
+        self._evento_detener.set()
+
+    @property
+    @abstractmethod
+    def abierta(self) -> bool:
+        ...
+
+    def descripcion(self) -> str:
+        return self.__class__.__name__
+
+
+class FuenteUSB(FuenteCaptura):
+    """Cámara local por índice (DirectShow en Windows, backend por defecto en el resto)"""
+
+    def __init__(self, indice: int):
+        super().__init__()
+        self.indice = indice
+        self.cap = None
+
+    def abrir(self, ancho: int, alto: int, fps: int):
+        backend = cv2.CAP_DSHOW if sys.platform == "win32" else cv2.CAP_ANY
+        print(f"Iniciando cámara USB {self.indice}...")
+        self.cap = cv2.VideoCapture(self.indice, backend)
+        if not self.cap.isOpened():
+            self.cap = None
+            raise RuntimeError(f"No se pudo abrir la cámara USB {self.indice}")
+
+        # Configurar cámara con resolución fija
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, ancho)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, alto)
+        self.cap.set(cv2.CAP_PROP_FPS, fps)
+        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimizar buffer
+
+    def leer(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if self.cap is None:
+            return False, None
+        return self.cap.read()
+
+    def cerrar(self):
+        super().cerrar()
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+
+    @property
+    def abierta(self) -> bool:
+        return self.cap is not None and self.cap.isOpened()
+
+    def descripcion(self) -> str:
+        return f"usb:{self.indice}"
+
+
+class FuenteRed(FuenteCaptura):
+    """
+    Cámara IP por RTSP/HTTP decodificada con PyAV (FFmpeg)
+
+    Un hilo decodifica continuamente y conserva solo el último frame, de modo
+    que `leer()` nunca entrega frames atrasados aunque la captura vaya más
+    lenta que la cámara. Ante errores reconecta con espera exponencial.
+    """
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        self._frame: Optional[np.ndarray] = None
+        self._nuevo = threading.Condition()
+        self._hilo: Optional[threading.Thread] = None
+        self._conectada = False
+        self.reconexiones = 0
+
+    def abrir(self, ancho: int, alto: int, fps: int):
+        self._evento_detener.clear()
+        self._hilo = threading.Thread(
+            target=self._decodificar, name=f"fuente_red_{urlparse(self.url).hostname}", daemon=True
+        )
+        self._hilo.start()
+
+    def _decodificar(self):
+        import av
+
+        espera = configuracion.CAPTURE_RECONNECT_INITIAL_S
+        opciones = {
+            'rtsp_transport': configuracion.RTSP_TRANSPORT,
+            'fflags': 'nobuffer',
+            'flags': 'low_delay'
+        }
+
+        while not self._evento_detener.is_set():
+            try:
+                contenedor = av.open(
+                    self.url, options=opciones, timeout=configuracion.CAPTURE_NETWORK_TIMEOUT_S
+                )
+            except Exception as e:
+                logger.warning(f"No se pudo conectar a {self.url}: {e}; reintento en {espera:.0f}s")
+                print(f"⚠️ No se pudo conectar a {self.url}: {e}; reintento en {espera:.0f}s")
+                if self._evento_detener.wait(espera):
+                    break
+                espera = min(espera * 2, configuracion.CAPTURE_RECONNECT_MAX_S)
+                self.reconexiones += 1
+                continue
+
+            try:
+                self._conectada = True
+                espera = configuracion.CAPTURE_RECONNECT_INITIAL_S
+                print(f"📡 Conectado a {self.url}")
+
+                for frame in contenedor.decode(video=0):
+                    if self._evento_detener.is_set():
+                        break
+                    imagen = frame.to_ndarray(format="bgr24")
+                    with self._nuevo:
+                        self._frame = imagen
+                        self._nuevo.notify_all()
+            except Exception as e:
+                logger.warning(f"Flujo interrumpido en {self.url}: {e}")
+                print(f"⚠️ Flujo interrumpido en {self.url}: {e}")
+            finally:
+                self._conectada = False
+                contenedor.close()
+
+            if not self._evento_detener.is_set():
+                self.reconexiones += 1
+                self._evento_detener.wait(espera)
+
+    def leer(self) -> Tuple[bool, Optional[np.ndarray]]:
+        with self._nuevo:
+            if self._frame is None:
+                self._nuevo.wait(timeout=configuracion.CAPTURE_NETWORK_TIMEOUT_S)
+            frame, self._frame = self._frame, None
+        return frame is not None, frame
+
+    def cerrar(self):
+        super().cerrar()
+        with self._nuevo:
+            self._nuevo.notify_all()
+        if self._hilo and self._hilo.is_alive():
+            self._hilo.join(timeout=2)
+
+    @property
+    def abierta(self) -> bool:
+        # Mientras se reconecta la fuente sigue viva
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def descripcion(self) -> str:
+        return self.url
+
+
+class FuenteArchivo(FuenteCaptura):
+    """Video local reproducido en bucle, a tiempo real o a máxima velocidad"""
+
+    def __init__(self, ruta: Union[str, Path], bucle: bool = True, tiempo_real: bool = True):
+        super().__init__()
+        self.ruta = Path(ruta)
+        self.bucle = bucle
+        self.requiere_ritmo = tiempo_real
+        self.cap = None
+
+    def abrir(self, ancho: int, alto: int, fps: int):
+        self.cap = cv2.VideoCapture(str(self.ruta))
+        if not self.cap.isOpened():
+            self.cap = None
+            raise RuntimeError(f"No se pudo abrir el video {self.ruta}")
+
+        # A tiempo real se respeta el FPS del propio archivo
+        fps_archivo = self.cap.get(cv2.CAP_PROP_FPS)
+        if self.requiere_ritmo and fps_archivo and fps_archivo > 0:
+            self.fps_nativo = fps_archivo
+
+    def leer(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if self.cap is None:
+            return False, None
+
+        ret, frame = self.cap.read()
+        if not ret and self.bucle:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        if not ret and not self.bucle:
+            # Fin del archivo sin bucle: la fuente queda cerrada y la captura termina
+            print(f"⏹️ Fin del video {self.ruta}")
+            self.cap.release()
+            self.cap = None
+        return ret, frame
+
+    def cerrar(self):
+        super().cerrar()
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+
+    @property
+    def abierta(self) -> bool:
+        return self.cap is not None and self.cap.isOpened()
+
+    def descripcion(self) -> str:
+        return f"archivo:{self.ruta}"
+
+
+class FuenteSintetica(FuenteCaptura):
+    """
+    Generador de frames para pruebas de carga sin cámara
+
+    Dibuja `personas` rectángulos que se desplazan sobre un fondo con ruido,
+    de modo que la compuerta de movimiento y el resto del pipeline trabajen.
+    """
+
+    def __init__(self, personas: int = 2, semilla: int = 0):
+        super().__init__()
+        self.personas = personas
+        self._rng = np.random.default_rng(semilla)
+        self._abierta = False
+        self._indice = 0
+
+    def abrir(self, ancho: int, alto: int, fps: int):
+        self.ancho, self.alto = ancho, alto
+        self._fondo = self._rng.integers(40, 80, size=(alto, ancho, 3), dtype=np.uint8)
+        self._posiciones = self._rng.uniform(0, 1, size=(self.personas, 2))
+        self._velocidades = self._rng.uniform(-0.01, 0.01, size=(self.personas, 2))
+        self._abierta = True
+
+    def leer(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if not self._abierta:
+            return False, None
+
+        frame = self._fondo.copy()
+        self._posiciones += self._velocidades
+        rebote = (self._posiciones < 0) | (self._posiciones > 1)
+        self._velocidades[rebote] *= -1
+        np.clip(self._posiciones, 0, 1, out=self._posiciones)
+
+        alto_persona = self.alto // 3
+        ancho_persona = alto_persona // 3
+        for x, y in self._posiciones:
+            x1 = int(x * (self.ancho - ancho_persona))
+            y1 = int(y * (self.alto - alto_persona))
+            cv2.rectangle(frame, (x1, y1), (x1 + ancho_persona, y1 + alto_persona), (180, 160, 140), -1)
+
+        cv2.putText(frame, f"SINTETICA {self._indice}", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        self._indice += 1
+        return True, frame
+
+    def cerrar(self):
+        super().cerrar()
+        self._abierta = False
+
+    @property
+    def abierta(self) -> bool:
+        return self._abierta
+
+    def descripcion(self) -> str:
+        return f"sintetica:{self.personas}"
+
+
+def crear_fuente(url_conexion: Optional[str], tipo_camara=None) -> FuenteCaptura:
+    """
+    Resuelve la fuente de captura a partir de `Camara.url_conexion`/`tipo_camara`
+
+    Formatos de `url_conexion`:
+        - "0", "1"...                       → cámara USB por índice
+        - "rtsp://...", "http(s)://..."     → cámara IP (PyAV/FFmpeg)
+        - "file:///ruta/video.mp4?bucle=1&velocidad=max" o ruta a un video
+        - "sintetica://?personas=3"         → generador sintético
+
+    Sin URL (o una cámara USB sin índice) se usa CAMERA_INDEX.
+    """
+    tipo = getattr(tipo_camara, 'value', tipo_camara)
+    url = (url_conexion or "").strip()
+
+    if not url:
+        if tipo in ("rtsp", "ip"):
+            raise ValueError("Una cámara IP/RTSP necesita url_conexion")
+        return FuenteUSB(configuracion.CAMERA_INDEX)
+
+    if url.isdigit():
+        return FuenteUSB(int(url))
+
+    partes = urlparse(url)
+    parametros = {clave: valores[-1] for clave, valores in parse_qs(partes.query).items()}
+
+    if partes.scheme in ("rtsp", "rtsps", "rtmp", "http", "https"):
+        return FuenteRed(url)
+
+    if partes.scheme in ("sintetica", "synthetic"):
+        return FuenteSintetica(
+            personas=int(parametros.get('personas', 2)),
+            semilla=int(parametros.get('semilla', 0))
+        )
+
+    ruta = partes.path if partes.scheme == "file" else url.split('?')[0]
+    if partes.scheme == "file" or Path(ruta).suffix.lower() in EXTENSIONES_VIDEO:
+        return FuenteArchivo(
+            ruta,
+            bucle=parametros.get('bucle', '1') not in ('0', 'false'),
+            tiempo_real=parametros.get('velocidad', 'real') != 'max'
+        )
+
+    if tipo == "usb":
+        return FuenteUSB(configuracion.CAMERA_INDEX)
+
+    # Cualquier otra URL de una cámara IP se intenta con FFmpeg
+    return FuenteRed(url)
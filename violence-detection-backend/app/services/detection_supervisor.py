@@ -0,0 +1,511 @@
+"""
+Trabajadores de detección por cámara, independientes de las sesiones de visualización
+"""
+import asyncio
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from app.ai.frame_views import VistasFrame
+from app.ai.model_loader import cargador_modelos
+from app.ai.pipeline import PipelineDeteccion
+from app.ai.yolo_detector import DetectorPersonas
+from app.ai.violence_detector import DetectorViolencia
+from app.api.websocket.common import manejador_webrtc
+from app.services.alarm_service import ServicioAlarma
+from app.services.notification_service import ServicioNotificaciones
+from app.services.incident_service import ServicioIncidentes
+from app.services.camera_hub import camera_hub, RanuraFrame
+from app.services.stream_relay import relay_streaming
+from app.services.mjpeg_relay import relay_mjpeg
+from app.services.capture_sources import crear_fuente
+from app.services.camera_registry import registro_camaras
+from app.config import configuracion
+from app.utils.logger import obtener_logger
+
+logger = obtener_logger(__name__)
+
+
+class TrabajadorDeteccion:
+    """
+    Pipeline de detección de una cámara alimentado por el hub de captura
+
+    Corre mientras la cámara esté activa, haya o no espectadores. Los
+    espectadores se adjuntan a su salida anotada: cada frame capturado se
+    publica con las últimas detecciones y la alerta dibujadas, una sola vez
+    por cámara, en la ranura de cada espectador. El dibujo se hace en un
+    executor desde la tarea de anotación, nunca en el hilo de captura.
+    """
+
+    def __init__(self, camara, pipeline: PipelineDeteccion):
+        self.camara_id = camara.id
+        self.ubicacion = camara.ubicacion
+        self.fuente = crear_fuente(camara.url_conexion, camara.tipo_camara)
+        self.fps = camara.fps
+        self.pipeline = pipeline
+
+        self.captura = None
+        self.ranura: Optional[RanuraFrame] = None
+        self.ranura_anotacion: Optional[RanuraFrame] = None
+        self.tarea: Optional[asyncio.Task] = None
+        self.tarea_anotacion: Optional[asyncio.Task] = None
+        self.running = False
+
+        # Espectadores adjuntos a la salida anotada
+        self._espectadores: List[RanuraFrame] = []
+        self._lock = threading.Lock()
+
+        # Última superposición: (detecciones, forma del frame analizado, texto de alerta)
+        self._superposicion: Tuple[List[Dict[str, Any]], Tuple[int, int], Optional[str]] = ([], (1, 1), None)
+
+        # Estado de violencia
+        self.violence_mode = False
+        self.last_violence_detection = 0
+        self.inicio = None
+
+    async def iniciar(self):
+        """Se suscribe a la cámara y arranca el bucle de detección"""
+        self.ranura = RanuraFrame()
+        self.ranura_anotacion = RanuraFrame()
+        self.running = True
+        self.inicio = time.time()
+        # Abrir el dispositivo bloquea: se hace en un hilo, fuera del loop
+        self.captura = await asyncio.to_thread(
+            camera_hub.suscribir, self.camara_id, self._recibir_frame, fuente=self.fuente, fps=self.fps
+        )
+        self.tarea = asyncio.create_task(self._procesar_frames())
+        self.tarea_anotacion = asyncio.create_task(self._anotar_frames())
+        logger.info(f"Trabajador de detección iniciado para cámara {self.camara_id}")
+        print(f"🛰️ Trabajador de detección iniciado para cámara {self.camara_id} ({self.ubicacion})")
+
+    async def detener(self):
+        """Detiene el bucle, libera la suscripción y reinicia el pipeline"""
+        self.running = False
+        for tarea in (self.tarea, self.tarea_anotacion):
+            if tarea:
+                tarea.cancel()
+                try:
+                    await tarea
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self.tarea = None
+        self.tarea_anotacion = None
+
+        if self.captura:
+            # Liberar la cámara puede esperar al hilo de captura (join)
+            await asyncio.to_thread(camera_hub.desuscribir, self.camara_id, self._recibir_frame)
+            self.captura = None
+
+        self.pipeline.reiniciar()
+        # Cierra la grabación en curso y el hilo de guardado de su grabador
+        await asyncio.to_thread(self.pipeline.detener)
+        print(f"🛰️ Trabajador de detección detenido para cámara {self.camara_id}")
+
+    def agregar_espectador(self, ranura: RanuraFrame):
+        with self._lock:
+            self._espectadores.append(ranura)
+
+    def quitar_espectador(self, ranura: RanuraFrame):
+        with self._lock:
+            if ranura in self._espectadores:
+                self._espectadores.remove(ranura)
+
+    def _recibir_frame(self, frame_data: Dict[str, Any]):
+        """Hilo de captura: solo publica el frame crudo, sin copiar ni dibujar"""
+        self.ranura.publicar(frame_data)
+        if self._espectadores:
+            self.ranura_anotacion.publicar((frame_data, self._superposicion))
+
+    async def _anotar_frames(self):
+        """Dibuja la superposición en un executor y publica el frame anotado a los espectadores"""
+        loop = asyncio.get_running_loop()
+        ultima_secuencia = 0
+
+        while self.running:
+            try:
+                nuevo = await self.ranura_anotacion.esperar(ultima_secuencia, timeout=0.5)
+                if nuevo is None:
+                    continue
+                ultima_secuencia, (frame_data, superposicion) = nuevo
+
+                with self._lock:
+                    espectadores = list(self._espectadores)
+                if not espectadores:
+                    continue
+
+                frame = await loop.run_in_executor(None, self._anotar, frame_data['frame'], superposicion)
+                anotado = {**frame_data, 'frame': frame, 'vistas': VistasFrame(frame)}
+                for ranura in espectadores:
+                    ranura.publicar(anotado)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error anotando frame para cámara {self.camara_id}: {e}")
+                await asyncio.sleep(0.1)
+
+    def _actualizar_superposicion(self, resultado: Dict[str, Any], forma_analizada: Tuple[int, int]):
+        texto = None
+        if self.violence_mode:
+            probabilidad = resultado.get("probabilidad_violencia") or resultado.get("probabilidad") or 0.0
+            texto = f"Probabilidad: {probabilidad:.1%}"
+        self._superposicion = (resultado.get("personas_detectadas") or [], forma_analizada, texto)
+
+    def _anotar(self, frame, superposicion):
+        """Dibuja la superposición sobre una copia del frame"""
+        detecciones, (alto_analizado, ancho_analizado), texto = superposicion
+        anotado = frame.copy()
+
+        # Las detecciones vienen en la resolución analizada; se escalan a la del frame
+        escala_x = frame.shape[1] / ancho_analizado
+        escala_y = frame.shape[0] / alto_analizado
+        escaladas = [
+            {
+                **deteccion,
+                'bbox': [
+                    deteccion['bbox'][0] * escala_x, deteccion['bbox'][1] * escala_y,
+                    deteccion['bbox'][2] * escala_x, deteccion['bbox'][3] * escala_y
+                ]
+            }
+            for deteccion in detecciones
+        ]
+        anotado = self.pipeline._dibujar_detecciones(anotado, escaladas)
+
+        if texto:
+            anotado = self.pipeline.procesador_video.agregar_texto_alerta(anotado, texto, (0, 0, 255), 1.2)
+        return anotado
+
+    def _establecer_modo_violencia(self, activo: bool):
+        """Cambia el modo violencia del trabajador y de la captura compartida"""
+        self.violence_mode = activo
+        if self.captura:
+            self.captura.modo_violencia = activo
+
+    async def _notificar_espectadores(self, mensaje: Dict[str, Any]):
+        """Envía el mensaje a los clientes conectados a la sala de la cámara"""
+        if self.camara_id in manejador_webrtc.salas:
+            await manejador_webrtc.broadcast_a_sala(self.camara_id, mensaje)
+
+    async def _procesar_frames(self):
+        """CORREGIDO: Procesamiento que preserva TODA la secuencia de violencia"""
+        try:
+            print(f"Iniciando procesamiento MEJORADO de frames para cámara {self.camara_id}")
+            last_process_time = time.time()
+            frames_sin_violencia = 0
+            limpieza_programada = False
+            
+            # *** NUEVO: Control de secuencia activa ***
+            secuencia_violencia_activa = False
+            frames_secuencia_procesados = 0
+            
+            # Frames más antiguos que el último visto se descartan: siempre se procesa el más reciente
+            ultima_secuencia = 0
+            ultimo_frame_id = -configuracion.PROCESS_EVERY_N_FRAMES
+            
+            while self.running:
+                try:
+                    nuevo = await self.ranura.esperar(ultima_secuencia, timeout=0.1)
+                    if nuevo is None:
+                        continue
+                    ultima_secuencia, frame_data = nuevo
+                    
+                    vistas = frame_data['vistas']
+                    frame_id = frame_data['frame_id']
+                    current_time = time.time()
+                    
+                    # *** CORRECCIÓN: Procesamiento adaptativo MEJORADO ***
+                    # (por distancia entre frames: con la ranura no llegan todos los frame_id)
+                    if self.violence_mode or secuencia_violencia_activa:
+                        should_process = True  # *** CADA frame durante violencia ***
+                    else:
+                        should_process = (frame_id - ultimo_frame_id >= configuracion.PROCESS_EVERY_N_FRAMES)
+                    
+                    if should_process and (current_time - last_process_time >= 0.05):  # *** REDUCIDO tiempo mínimo ***
+                        try:
+                            print(f"Procesando frame {frame_id} para cámara {self.camara_id}")
+                            
+                            ubicacion_camara = await self._obtener_ubicacion_camara(self.camara_id)
+                            
+                            # *** PROCESAR FRAME CON PIPELINE CORREGIDO ***
+                            # (sin redimensionado previo: cada etapa toma su vista del frame original)
+                            resultado = await self.pipeline.procesar_frame(
+                                vistas,
+                                camara_id=self.camara_id,
+                                ubicacion=ubicacion_camara,
+                                timestamp=frame_data['timestamp']
+                            )
+                            
+                            # Las detecciones se dibujan sobre cada frame que ven los espectadores
+                            self._actualizar_superposicion(resultado, vistas.forma)
+                            
+                            if resultado and resultado.get("violencia_detectada"):
+                                print(f"✅ Violencia detectada para cámara {self.camara_id}")
+                                
+                                # *** ACTIVAR MODO VIOLENCIA Y SECUENCIA ***
+                                self._establecer_modo_violencia(True)
+                                secuencia_violencia_activa = True
+                                self.last_violence_detection = current_time
+                                frames_sin_violencia = 0
+                                frames_secuencia_procesados = 0
+                                limpieza_programada = False
+                                
+                                probabilidad_real = (
+                                    resultado.get("probabilidad_violencia") or
+                                    resultado.get("probabilidad") or 
+                                    0.0
+                                )
+                                
+                                personas_detectadas = len(resultado.get("personas_detectadas", []))
+                                
+                                # *** MENSAJE CORREGIDO con información de secuencia ***
+                                mensaje_notificacion = {
+                                    "tipo": "deteccion_violencia",
+                                    "probabilidad": float(probabilidad_real),
+                                    "probability": float(probabilidad_real),
+                                    "probabilidad_violencia": float(probabilidad_real),
+                                    "mensaje": f"¡ALERTA! Violencia detectada - {probabilidad_real:.1%}",
+                                    "personas_detectadas": int(personas_detectadas),
+                                    "peopleCount": int(personas_detectadas),
+                                    "ubicacion": str(ubicacion_camara),
+                                    "location": str(ubicacion_camara),
+                                    "timestamp": datetime.now().isoformat(),
+                                    "camara_id": self.camara_id,
+                                    "violencia_detectada": True,
+                                    "frames_analizados": resultado.get("frames_analizados", 8),  # *** NUEVO ***
+                                    "secuencia_activa": True  # *** NUEVO ***
+                                }
+                                
+                                print(f"📤 ENVIANDO MENSAJE CORREGIDO: {mensaje_notificacion}")
+                                
+                                await self._notificar_espectadores(mensaje_notificacion)
+                                
+                            else:
+                                # *** CORRECCIÓN: Manejo de frames de secuencia sin violencia confirmada ***
+                                frames_sin_violencia += 1
+                                frames_secuencia_procesados += 1
+                                
+                                # *** ENVIAR ACTUALIZACIÓN DE SECUENCIA EN ANÁLISIS ***
+                                if secuencia_violencia_activa and frames_secuencia_procesados < 15:  # Mantener secuencia por más tiempo
+                                    mensaje_secuencia = {
+                                        "tipo": "secuencia_analisis",
+                                        "probabilidad": resultado.get("probabilidad_violencia", 0.0),
+                                        "probability": resultado.get("probabilidad_violencia", 0.0),
+                                        "mensaje": f"Analizando secuencia... ({frames_secuencia_procesados}/15)",
+                                        "personas_detectadas": len(resultado.get("personas_detectadas", [])),
+                                        "ubicacion": str(ubicacion_camara),
+                                        "timestamp": datetime.now().isoformat(),
+                                        "camara_id": self.camara_id,
+                                        "violencia_detectada": False,
+                                        "secuencia_activa": True,
+                                        "frames_procesados": frames_secuencia_procesados
+                                    }
+                                    
+                                    await self._notificar_espectadores(mensaje_secuencia)
+                                
+                                # *** FINALIZAR SECUENCIA después de más frames ***
+                                if secuencia_violencia_activa and frames_secuencia_procesados >= 15:
+                                    secuencia_violencia_activa = False
+                                    print(f"🔄 Secuencia de análisis finalizada para cámara {self.camara_id}")
+                                
+                                # *** PROGRAMAR LIMPIEZA después de suficiente tiempo ***
+                                if self.violence_mode and frames_sin_violencia > 25 and not limpieza_programada:  # *** AUMENTADO: ~2 segundos ***
+                                    print(f"⏰ Programando limpieza de alerta para cámara {self.camara_id}")
+                                    asyncio.create_task(self._limpiar_alerta_violencia(6))  # *** AUMENTADO: 6 segundos ***
+                                    limpieza_programada = True
+                                
+                                # *** DESACTIVAR MODO VIOLENCIA después de más tiempo ***
+                                if self.violence_mode and frames_sin_violencia > 60:  # *** AUMENTADO: ~4 segundos ***
+                                    self._establecer_modo_violencia(False)
+                                    print(f"🔄 Modo violencia desactivado para cámara {self.camara_id}")
+                            
+                            last_process_time = current_time
+                            ultimo_frame_id = frame_id
+                            
+                        except Exception as e:
+                            print(f"❌ Error procesando frame {frame_id}: {e}")
+                            import traceback
+                            print(traceback.format_exc())
+                    
+                except Exception as e:
+                    # Un trabajador sin espectadores no debe morir por un error puntual
+                    print(f"❌ Error en process_frames: {e}")
+                    await asyncio.sleep(0.1)
+                    
+        except Exception as e:
+            print(f"❌ Error en process_frames: {e}")
+            import traceback
+            print(traceback.format_exc())
+        finally:
+            print(f"Tarea de procesamiento MEJORADO finalizada para cámara {self.camara_id}")
+
+
+    async def _obtener_ubicacion_camara(self, camara_id: int) -> str:
+        """Obtiene la ubicación de la cámara desde el registro en memoria"""
+        self.ubicacion = await registro_camaras.obtener_ubicacion(camara_id)
+        return self.ubicacion
+
+    async def _limpiar_alerta_violencia(self, delay_seconds: int = 5):
+        """Limpia la alerta de violencia después de un delay"""
+        await asyncio.sleep(delay_seconds)
+        
+        # Verificar si aún no hay violencia después del delay
+        current_time = time.time()
+        if not self.violence_mode or (current_time - self.last_violence_detection) > delay_seconds:
+            try:
+                ubicacion_camara = await self._obtener_ubicacion_camara(self.camara_id)
+                
+                # Enviar mensaje de limpieza de violencia
+                mensaje_limpieza = {
+                    "tipo": "deteccion_violencia_fin",
+                    "violencia_detectada": False,
+                    "probabilidad": 0.0,
+                    "probability": 0.0,
+                    "probabilidad_violencia": 0.0,
+                    "mensaje": "Alerta de violencia finalizada",
+                    "personas_detectadas": 0,
+                    "peopleCount": 0,
+                    "ubicacion": str(ubicacion_camara),
+                    "location": str(ubicacion_camara),
+                    "timestamp": datetime.now().isoformat(),
+                    "camara_id": self.camara_id,
+                    "limpiar_alerta": True
+                }
+                
+                print(f"🧹 Limpiando alerta de violencia para cámara {self.camara_id}")
+                await self._notificar_espectadores(mensaje_limpieza)
+                
+            except Exception as e:
+                print(f"❌ Error limpiando alerta de violencia: {e}")
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            espectadores = len(self._espectadores)
+        return {
+            'camara_id': self.camara_id,
+            'ubicacion': self.ubicacion,
+            'activo': self.running,
+            'espectadores': espectadores,
+            'tiempo_activo_s': time.time() - self.inicio if self.inicio else 0.0,
+            'modo_violencia': self.violence_mode,
+            'frames': self.ranura.obtener_estadisticas() if self.ranura else {},
+            'captura': self.captura.obtener_estadisticas() if self.captura else {},
+            'pipeline': self.pipeline.obtener_estadisticas()
+        }
+
+
+class SupervisorDeteccion:
+    """
+    Mantiene un trabajador de detección por cámara activa
+
+    Al arrancar la aplicación se lanza uno por cada cámara en estado
+    ACTIVA; la API de cámaras los inicia o detiene al cambiar su estado.
+    """
+
+    def __init__(self):
+        self.trabajadores: Dict[int, TrabajadorDeteccion] = {}
+        self.servicio_alarma: Optional[ServicioAlarma] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _obtener_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def iniciar(self):
+        """Inicia un trabajador por cada cámara ACTIVA"""
+        from app.models.camera import EstadoCamara
+
+        # Carga única del registro; a partir de aquí nadie consulta la tabla por frame
+        await registro_camaras.cargar()
+        camaras = [
+            camara for camara in await registro_camaras.listar()
+            if camara.estado == EstadoCamara.ACTIVA
+        ]
+
+        for camara in camaras:
+            try:
+                await self.iniciar_trabajador(camara)
+            except Exception as e:
+                logger.error(f"No se pudo iniciar la detección de la cámara {camara.id}: {e}")
+                print(f"❌ No se pudo iniciar la detección de la cámara {camara.id}: {e}")
+
+        print(f"🛰️ Supervisor de detección: {len(self.trabajadores)} cámaras activas")
+
+    async def iniciar_trabajador(self, camara) -> TrabajadorDeteccion:
+        """Inicia (si no existe) el trabajador de una cámara"""
+        async with self._obtener_lock():
+            if camara.id in self.trabajadores:
+                return self.trabajadores[camara.id]
+
+            trabajador = TrabajadorDeteccion(camara, self._crear_pipeline(camara.id))
+            await trabajador.iniciar()
+            self.trabajadores[camara.id] = trabajador
+            return trabajador
+
+    async def asegurar_trabajador(self, camara_id: int) -> Optional[TrabajadorDeteccion]:
+        """
+        Devuelve el trabajador de la cámara, iniciándolo bajo demanda
+
+        Solo las cámaras ACTIVA tienen trabajador: un espectador no puede dejar
+        la detección corriendo en una cámara inactiva (solo desactivar o
+        eliminar la cámara detiene un trabajador). None si no procede.
+        """
+        from app.models.camera import EstadoCamara
+
+        trabajador = self.trabajadores.get(camara_id)
+        if trabajador:
+            return trabajador
+
+        camara = await registro_camaras.obtener(camara_id)
+        if camara is None or camara.estado != EstadoCamara.ACTIVA:
+            return None
+        return await self.iniciar_trabajador(camara)
+
+    async def detener_trabajador(self, camara_id: int):
+        async with self._obtener_lock():
+            trabajador = self.trabajadores.pop(camara_id, None)
+        if trabajador:
+            # Sus espectadores WebRTC pasan al relay crudo en lugar de congelarse
+            relay_streaming.soltar_trabajador(trabajador)
+            relay_mjpeg.soltar_trabajador(trabajador)
+            await trabajador.detener()
+
+    async def detener(self):
+        """Detiene todos los trabajadores (apagado de la aplicación)"""
+        for camara_id in list(self.trabajadores.keys()):
+            await self.detener_trabajador(camara_id)
+
+    def obtener_trabajador(self, camara_id: int) -> Optional[TrabajadorDeteccion]:
+        return self.trabajadores.get(camara_id)
+
+    def _crear_pipeline(self, camara_id: int) -> PipelineDeteccion:
+        from app.core.database import SesionAsincrona
+        db = SesionAsincrona()
+
+        if self.servicio_alarma is None:
+            self.servicio_alarma = ServicioAlarma()
+
+        pipeline = PipelineDeteccion(
+            detector_personas=DetectorPersonas(cargador_modelos.obtener_modelo('yolo')),
+            detector_violencia=DetectorViolencia(cargador_modelos.obtener_motor_timesformer()),
+            servicio_alarma=self.servicio_alarma,
+            servicio_notificaciones=ServicioNotificaciones(db),
+            servicio_incidentes=ServicioIncidentes(db),
+            session=db
+        )
+        pipeline.activo = True
+
+        print(f"Pipeline creado para cámara {camara_id}")
+        return pipeline
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {
+            'trabajadores_activos': len(self.trabajadores),
+            'camaras': {
+                camara_id: trabajador.obtener_estadisticas()
+                for camara_id, trabajador in self.trabajadores.items()
+            }
+        }
+
+
+# Instancia global del supervisor
+supervisor_deteccion = SupervisorDeteccion()
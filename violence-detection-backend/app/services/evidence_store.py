@@ -0,0 +1,286 @@
+"""
+Almacén de evidencias direccionado por contenido (sistema de archivos local o S3 compatible)
+"""
+import hashlib
+import os
+import re
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional
+from app.config import configuracion
+from app.utils.logger import obtener_logger
+
+logger = obtener_logger(__name__)
+
+# Tamaño de bloque para hashear, copiar y servir objetos
+TAMANO_BLOQUE = 1024 * 1024
+
+# sha256/ab/cd/<hash>.<ext>: evita directorios con miles de archivos
+PATRON_CLAVE = re.compile(r"^sha256/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]{1,5}$")
+
+
+def calcular_sha256(ruta: Path) -> str:
+    """SHA-256 de un archivo leído por bloques"""
+    digest = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE), b""):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def clave_para(sha256: str, extension: str = ".mp4") -> str:
+    """Clave de un objeto a partir de su hash, repartida en dos niveles de directorios"""
+    extension = extension.lower().lstrip(".") or "bin"
+    return f"sha256/{sha256[:2]}/{sha256[2:4]}/{sha256}.{extension}"
+
+
+def iterar_archivo(ruta: Path, inicio: int = 0, fin: Optional[int] = None) -> Iterator[bytes]:
+    """Bytes de un archivo de `inicio` a `fin` (inclusive) en bloques de TAMANO_BLOQUE"""
+    with open(ruta, "rb") as archivo:
+        archivo.seek(inicio)
+        restantes = None if fin is None else fin - inicio + 1
+        while restantes is None or restantes > 0:
+            bloque = archivo.read(TAMANO_BLOQUE if restantes is None else min(TAMANO_BLOQUE, restantes))
+            if not bloque:
+                break
+            if restantes is not None:
+                restantes -= len(bloque)
+            yield bloque
+
+
+def validar_clave(clave: str) -> str:
+    """Rechaza claves que no sigan el formato del almacén (evita salir de la raíz)"""
+    if not PATRON_CLAVE.match(clave or ""):
+        raise ValueError(f"Clave de evidencia inválida: {clave!r}")
+    return clave
+
+
+class AlmacenEvidencias(ABC):
+    """
+    Interfaz común de los almacenes de evidencias
+
+    Cada objeto se identifica por el SHA-256 de su contenido: guardar dos
+    veces el mismo video no ocupa espacio extra y la clave sirve también de
+    ETag estable. Los incidentes guardan solo la clave, el tamaño y la
+    duración; los bytes nunca pasan por la base de datos.
+    """
+
+    nombre = "base"
+
+    def guardar_archivo(self, ruta: Path) -> Dict[str, Any]:
+        """Guarda el archivo (si su contenido no estaba ya) y devuelve clave, hash y tamaño"""
+        ruta = Path(ruta)
+        sha256 = calcular_sha256(ruta)
+        clave = clave_para(sha256, ruta.suffix)
+        tamano = ruta.stat().st_size
+
+        nuevo = not self.existe(clave)
+        if nuevo:
+            self._subir(ruta, clave)
+            logger.info(f"Evidencia guardada en almacén {self.nombre}: {clave} ({tamano} bytes)")
+        else:
+            logger.info(f"Evidencia ya presente en almacén {self.nombre}: {clave}")
+
+        return {'clave': clave, 'sha256': sha256, 'tamano': tamano, 'nuevo': nuevo}
+
+    @abstractmethod
+    def _subir(self, ruta: Path, clave: str):
+        ...
+
+    @abstractmethod
+    def existe(self, clave: str) -> bool:
+        ...
+
+    @abstractmethod
+    def metadatos(self, clave: str) -> Optional[Dict[str, Any]]:
+        """{'tamano': int, 'modificado': datetime} o None si el objeto no existe"""
+
+    @abstractmethod
+    def iterar(self, clave: str, inicio: int = 0, fin: Optional[int] = None) -> Iterator[bytes]:
+        """Bytes del objeto de `inicio` a `fin` (inclusive) en bloques de TAMANO_BLOQUE"""
+
+    @abstractmethod
+    def eliminar(self, clave: str) -> bool:
+        ...
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {'backend': self.nombre}
+
+
+class AlmacenLocal(AlmacenEvidencias):
+    """Objetos en `raiz/sha256/ab/cd/<hash>.mp4`, escritos de forma atómica"""
+
+    nombre = "local"
+
+    def __init__(self, raiz: Path):
+        self.raiz = Path(raiz)
+
+    def ruta(self, clave: str) -> Path:
+        return self.raiz / validar_clave(clave)
+
+    def _subir(self, ruta: Path, clave: str):
+        destino = self.ruta(clave)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        # Copia a un temporal del mismo directorio y rename: nunca queda un objeto a medias
+        temporal = destino.with_name(f".{destino.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.copyfile(ruta, temporal)
+            os.replace(temporal, destino)
+        finally:
+            temporal.unlink(missing_ok=True)
+
+    def existe(self, clave: str) -> bool:
+        return self.ruta(clave).is_file()
+
+    def metadatos(self, clave: str) -> Optional[Dict[str, Any]]:
+        try:
+            stat = self.ruta(clave).stat()
+        except FileNotFoundError:
+            return None
+        return {
+            'tamano': stat.st_size,
+            'modificado': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+        }
+
+    def iterar(self, clave: str, inicio: int = 0, fin: Optional[int] = None) -> Iterator[bytes]:
+        return iterar_archivo(self.ruta(clave), inicio, fin)
+
+    def eliminar(self, clave: str) -> bool:
+        ruta = self.ruta(clave)
+        if not ruta.exists():
+            return False
+        ruta.unlink()
+        # Quitar los directorios de shard que queden vacíos
+        for directorio in (ruta.parent, ruta.parent.parent):
+            try:
+                directorio.rmdir()
+            except OSError:
+                break
+        return True
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {'backend': self.nombre, 'raiz': str(self.raiz)}
+
+
+class AlmacenS3(AlmacenEvidencias):
+    """
+    Objetos en un bucket S3 o compatible (MinIO, Ceph, moto en modo servidor)
+
+    Con EVIDENCE_S3_ENDPOINT_URL apuntando a un servicio local se prueba sin
+    AWS. boto3 solo se importa al usar el almacén por primera vez.
+    """
+
+    nombre = "s3"
+
+    def __init__(
+        self,
+        bucket: str,
+        prefijo: str = "",
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None
+    ):
+        self.bucket = bucket
+        self.prefijo = prefijo.strip("/")
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self._cliente = None
+
+    @property
+    def cliente(self):
+        if self._cliente is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise RuntimeError("EVIDENCE_STORE_BACKEND='s3' requiere boto3 instalado") from e
+            self._cliente = boto3.client(
+                "s3",
+                endpoint_url=self.endpoint_url,
+                region_name=self.region,
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key
+            )
+        return self._cliente
+
+    def _objeto(self, clave: str) -> str:
+        validar_clave(clave)
+        return f"{self.prefijo}/{clave}" if self.prefijo else clave
+
+    @staticmethod
+    def _no_encontrado(error) -> bool:
+        codigo = str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+        return codigo in ("404", "NoSuchKey", "NotFound")
+
+    def _subir(self, ruta: Path, clave: str):
+        tipo = "video/mp4" if ruta.suffix.lower() == ".mp4" else "application/octet-stream"
+        self.cliente.upload_file(
+            str(ruta), self.bucket, self._objeto(clave), ExtraArgs={"ContentType": tipo}
+        )
+
+    def _head(self, clave: str) -> Optional[Dict[str, Any]]:
+        from botocore.exceptions import ClientError
+        try:
+            return self.cliente.head_object(Bucket=self.bucket, Key=self._objeto(clave))
+        except ClientError as e:
+            if self._no_encontrado(e):
+                return None
+            raise
+
+    def existe(self, clave: str) -> bool:
+        return self._head(clave) is not None
+
+    def metadatos(self, clave: str) -> Optional[Dict[str, Any]]:
+        respuesta = self._head(clave)
+        if respuesta is None:
+            return None
+        return {'tamano': respuesta["ContentLength"], 'modificado': respuesta["LastModified"]}
+
+    def iterar(self, clave: str, inicio: int = 0, fin: Optional[int] = None) -> Iterator[bytes]:
+        rango = f"bytes={inicio}-{'' if fin is None else fin}"
+        respuesta = self.cliente.get_object(Bucket=self.bucket, Key=self._objeto(clave), Range=rango)
+        cuerpo = respuesta["Body"]
+        try:
+            yield from cuerpo.iter_chunks(TAMANO_BLOQUE)
+        finally:
+            cuerpo.close()
+
+    def eliminar(self, clave: str) -> bool:
+        if not self.existe(clave):
+            return False
+        self.cliente.delete_object(Bucket=self.bucket, Key=self._objeto(clave))
+        return True
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {
+            'backend': self.nombre,
+            'bucket': self.bucket,
+            'prefijo': self.prefijo,
+            'endpoint_url': self.endpoint_url
+        }
+
+
+def crear_almacen() -> AlmacenEvidencias:
+    """Crea el almacén indicado por EVIDENCE_STORE_BACKEND"""
+    backend = configuracion.EVIDENCE_STORE_BACKEND.lower()
+    if backend == "local":
+        return AlmacenLocal(configuracion.EVIDENCE_STORE_PATH)
+    if backend == "s3":
+        return AlmacenS3(
+            bucket=configuracion.EVIDENCE_S3_BUCKET,
+            prefijo=configuracion.EVIDENCE_S3_PREFIX,
+            endpoint_url=configuracion.EVIDENCE_S3_ENDPOINT_URL,
+            region=configuracion.EVIDENCE_S3_REGION,
+            access_key=configuracion.EVIDENCE_S3_ACCESS_KEY,
+            secret_key=configuracion.EVIDENCE_S3_SECRET_KEY
+        )
+    raise ValueError(f"EVIDENCE_STORE_BACKEND no soportado: {configuracion.EVIDENCE_STORE_BACKEND}")
+
+
+# Instancia global del almacén de evidencias
+almacen_evidencias = crear_almacen()
@@ -1,10 +1,12 @@
 """
 Servicio de gestión de incidentes
 """
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy import select, and_, or_, func
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 from app.models.incident import Incidente, EstadoIncidente, TipoIncidente, SeveridadIncidente  # Importar los Enum
 from app.utils.logger import obtener_logger
 
@@ -41,17 +43,65 @@ class ServicioIncidentes:
             print(traceback.format_exc())
             raise
         
-    async def obtener_incidente(self, incidente_id: int) -> Optional[Incidente]:
+    async def obtener_incidente(self, incidente_id: int, con_video_base64: bool = False) -> Optional[Incidente]:
+        """`con_video_base64` carga también el video Base64 legado (columna diferida)"""
         try:
-            resultado = await self.db.execute(
-                select(Incidente).where(Incidente.id == incidente_id)
-            )
+            query = select(Incidente).where(Incidente.id == incidente_id)
+            if con_video_base64:
+                query = query.options(undefer(Incidente.video_base64))
+            resultado = await self.db.execute(query)
             return resultado.scalars().first()
         except Exception as e:
             logger.error(f"Error al obtener incidente: {e}")
             print(f"Error al obtener incidente: {e}")
             return None
     
+    async def obtener_resumen_base64(self, incidente_id: int) -> Tuple[int, str]:
+        """Longitud y últimos caracteres del video Base64 legado, sin traer el texto"""
+        try:
+            resultado = await self.db.execute(
+                select(
+                    func.length(Incidente.video_base64),
+                    func.right(Incidente.video_base64, 2)
+                ).where(Incidente.id == incidente_id)
+            )
+            fila = resultado.first()
+            if not fila or not fila[0]:
+                return 0, ""
+            return fila[0], fila[1] or ""
+        except Exception as e:
+            logger.error(f"Error al consultar Base64 del incidente {incidente_id}: {e}")
+            print(f"Error al consultar Base64 del incidente {incidente_id}: {e}")
+            return 0, ""
+    
+    async def liberar_evidencia(self, clave: Optional[str]) -> bool:
+        """
+        Borra un video del almacén si ningún incidente lo referencia ya
+
+        Las claves son el hash del contenido, así que dos incidentes pueden
+        compartir objeto; llamar después de quitar la referencia propia.
+        """
+        if not clave:
+            return False
+        
+        from app.services.evidence_store import almacen_evidencias
+        
+        resultado = await self.db.execute(
+            select(func.count(Incidente.id)).where(Incidente.video_storage_key == clave)
+        )
+        if resultado.scalar():
+            return False
+        
+        try:
+            eliminado = await asyncio.to_thread(almacen_evidencias.eliminar, clave)
+            if eliminado:
+                logger.info(f"🗑️ Evidencia {clave} eliminada del almacén")
+            return eliminado
+        except Exception as e:
+            logger.error(f"Error eliminando evidencia {clave} del almacén: {e}")
+            print(f"Error eliminando evidencia {clave} del almacén: {e}")
+            return False
+    
     async def listar_incidentes(
         self,
         limite: int = 100,
@@ -0,0 +1,289 @@
+"""
+Difusión MJPEG: una codificación JPEG por frame y cámara compartida por todos los clientes HTTP
+"""
+import cv2
+import asyncio
+from typing import AsyncIterator, Dict, Any, Optional, Tuple
+from app.config import configuracion
+from app.services.camera_hub import camera_hub, RanuraFrame
+from app.services.capture_sources import FuenteCaptura
+from app.utils.logger import obtener_logger
+
+logger = obtener_logger(__name__)
+
+
+class DifusorMjpeg:
+    """
+    Codificador JPEG compartido de una cámara
+
+    Toma los frames crudos del hub de captura o la salida anotada del
+    trabajador de detección, codifica como mucho MJPEG_FPS frames por
+    segundo y guarda el último JPEG. Los clientes (monitores, vistas previas,
+    snapshots) solo leen esos bytes: el coste es una codificación por frame,
+    no una por cliente. Abrir y liberar la cámara bloquea (apertura del
+    dispositivo, join del hilo de captura), así que se hace en un hilo.
+    """
+
+    def __init__(
+        self,
+        camara_id: int,
+        trabajador=None,
+        fuente: Optional[FuenteCaptura] = None,
+        fps: Optional[int] = None
+    ):
+        self.camara_id = camara_id
+        self.trabajador = trabajador
+        self.fuente = fuente
+        self.fps_camara = fps
+        self.fps = configuracion.MJPEG_FPS
+        self.calidad = configuracion.MJPEG_QUALITY
+
+        self.ranura: Optional[RanuraFrame] = None
+        self.captura = None
+        self.tarea: Optional[asyncio.Task] = None
+        self.running = False
+        self.clientes = 0
+        self.parada: Optional[asyncio.Task] = None  # Parada diferida tras quedarse sin clientes
+
+        # Último JPEG publicado
+        self.jpeg: Optional[bytes] = None
+        self.secuencia = 0
+        self._condicion: Optional[asyncio.Condition] = None
+
+        # Estadísticas
+        self.frames_codificados = 0
+        self.bytes_codificados = 0
+
+    @property
+    def anotado(self) -> bool:
+        return self.trabajador is not None
+
+    async def iniciar_async(self):
+        self.ranura = RanuraFrame()
+        self._condicion = asyncio.Condition()
+        self.running = True
+
+        if self.anotado:
+            self.trabajador.agregar_espectador(self.ranura)
+        else:
+            self.captura = await asyncio.to_thread(
+                camera_hub.suscribir,
+                self.camara_id, self.ranura.publicar, fuente=self.fuente, fps=self.fps_camara
+            )
+
+        self.tarea = asyncio.create_task(self._codificar_frames())
+        print(f"🖼️ Difusor MJPEG iniciado para cámara {self.camara_id} "
+              f"({'anotado' if self.anotado else 'crudo'}, {self.fps} FPS)")
+
+    def _detener_codificacion(self):
+        self.running = False
+        if self.tarea:
+            self.tarea.cancel()
+            self.tarea = None
+        if self.anotado:
+            self.trabajador.quitar_espectador(self.ranura)
+
+    def _liberar_captura(self):
+        if self.captura:
+            camera_hub.desuscribir(self.camara_id, self.ranura.publicar)
+            self.captura = None
+
+    def detener(self):
+        """Parada síncrona (apagado de la aplicación)"""
+        self._detener_codificacion()
+        self._liberar_captura()
+        print(f"🖼️ Difusor MJPEG detenido para cámara {self.camara_id}")
+
+    async def detener_async(self):
+        """Parada sin bloquear el loop mientras termina el hilo de captura"""
+        self._detener_codificacion()
+        await asyncio.to_thread(self._liberar_captura)
+        print(f"🖼️ Difusor MJPEG detenido para cámara {self.camara_id}")
+
+    def _codificar(self, frame) -> bytes:
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.calidad])
+        if not ok:
+            raise RuntimeError("cv2.imencode falló")
+        return buffer.tobytes()
+
+    async def _codificar_frames(self):
+        loop = asyncio.get_running_loop()
+        intervalo = 1.0 / self.fps
+        ultima_secuencia = 0
+
+        try:
+            while self.running:
+                inicio = loop.time()
+                nuevo = await self.ranura.esperar(ultima_secuencia, timeout=1.0)
+                if nuevo is None:
+                    continue
+                ultima_secuencia, frame_data = nuevo
+
+                try:
+                    jpeg = await loop.run_in_executor(None, self._codificar, frame_data['frame'])
+                except Exception as e:
+                    logger.error(f"Error codificando JPEG de cámara {self.camara_id}: {e}")
+                    continue
+
+                self.frames_codificados += 1
+                self.bytes_codificados += len(jpeg)
+                async with self._condicion:
+                    self.jpeg = jpeg
+                    self.secuencia += 1
+                    self._condicion.notify_all()
+
+                # Limitar al FPS configurado: los frames intermedios se descartan en la ranura
+                restante = intervalo - (loop.time() - inicio)
+                if restante > 0:
+                    await asyncio.sleep(restante)
+
+        except asyncio.CancelledError:
+            pass
+
+    async def esperar_jpeg(self, ultima_secuencia: int = 0, timeout: Optional[float] = None) -> Optional[Tuple[int, bytes]]:
+        """Espera un JPEG más nuevo que `ultima_secuencia`; None si vence el timeout"""
+        try:
+            async with self._condicion:
+                await asyncio.wait_for(
+                    self._condicion.wait_for(lambda: self.secuencia > ultima_secuencia),
+                    timeout=timeout
+                )
+                return self.secuencia, self.jpeg
+        except asyncio.TimeoutError:
+            return None
+
+    async def iterar(self) -> AsyncIterator[bytes]:
+        """JPEGs sucesivos para un cliente; si el cliente es lento recibe siempre el último"""
+        ultima_secuencia = 0
+        while self.running:
+            nuevo = await self.esperar_jpeg(ultima_secuencia, timeout=5.0)
+            if nuevo is None:
+                continue
+            ultima_secuencia, jpeg = nuevo
+            yield jpeg
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {
+            'camara_id': self.camara_id,
+            'anotado': self.anotado,
+            'clientes': self.clientes,
+            'fps': self.fps,
+            'frames_codificados': self.frames_codificados,
+            'bytes_promedio': self.bytes_codificados / self.frames_codificados if self.frames_codificados else 0,
+            'frames': self.ranura.obtener_estadisticas() if self.ranura else {}
+        }
+
+
+class RelayMjpeg:
+    """
+    Registro de difusores MJPEG por (camara_id, trabajador) con conteo de clientes
+
+    Un difusor sin clientes sigue vivo MJPEG_IDLE_GRACE_S antes de liberar la
+    cámara: los snapshots periódicos de un panel reutilizan la captura abierta.
+    Los anotados pertenecen a un trabajador concreto y se retiran cuando este
+    se detiene, para no servir el último frame de un trabajador parado.
+    """
+
+    def __init__(self):
+        self._difusores: Dict[Tuple[int, Any], DifusorMjpeg] = {}
+
+    async def suscribir(
+        self,
+        camara_id: int,
+        trabajador=None,
+        fuente: Optional[FuenteCaptura] = None,
+        fps: Optional[int] = None
+    ) -> DifusorMjpeg:
+        clave = (camara_id, trabajador)
+        difusor = self._difusores.get(clave)
+        if difusor is not None:
+            if difusor.parada:
+                difusor.parada.cancel()
+                difusor.parada = None
+            difusor.clientes += 1
+            return difusor
+
+        # Se registra antes de abrir la cámara para que las peticiones concurrentes lo compartan
+        difusor = DifusorMjpeg(camara_id, trabajador=trabajador, fuente=fuente, fps=fps)
+        difusor.clientes += 1
+        self._difusores[clave] = difusor
+        try:
+            await difusor.iniciar_async()
+        except Exception:
+            if self._difusores.get(clave) is difusor:
+                del self._difusores[clave]
+            difusor._detener_codificacion()
+            raise
+        return difusor
+
+    def desuscribir(self, difusor: DifusorMjpeg):
+        difusor.clientes -= 1
+        # Un difusor ya retirado (trabajador detenido) no necesita parada diferida
+        if difusor.clientes <= 0 and difusor.parada is None and difusor.running:
+            difusor.parada = asyncio.create_task(self._detener_tras_gracia(difusor))
+
+    async def _detener_tras_gracia(self, difusor: DifusorMjpeg):
+        try:
+            await asyncio.sleep(configuracion.MJPEG_IDLE_GRACE_S)
+        except asyncio.CancelledError:
+            return
+        if difusor.clientes > 0:
+            return
+
+        clave = (difusor.camara_id, difusor.trabajador)
+        if self._difusores.get(clave) is difusor:
+            del self._difusores[clave]
+        difusor.parada = None
+        await difusor.detener_async()
+
+    async def capturar_snapshot(
+        self,
+        camara_id: int,
+        trabajador=None,
+        fuente: Optional[FuenteCaptura] = None,
+        fps: Optional[int] = None
+    ) -> Optional[bytes]:
+        """JPEG actual de la cámara; reutiliza el del difusor activo si lo hay"""
+        difusor = await self.suscribir(camara_id, trabajador=trabajador, fuente=fuente, fps=fps)
+        try:
+            if difusor.jpeg is not None:
+                return difusor.jpeg
+            nuevo = await difusor.esperar_jpeg(0, timeout=configuracion.MJPEG_SNAPSHOT_TIMEOUT_S)
+            return nuevo[1] if nuevo else None
+        finally:
+            self.desuscribir(difusor)
+
+    def soltar_trabajador(self, trabajador):
+        """
+        Retira los difusores anotados de un trabajador que se detiene
+
+        Sus clientes terminan el stream y, al reconectar, obtienen un difusor
+        del trabajador nuevo (o el crudo si la cámara ya no está activa).
+        """
+        for clave, difusor in list(self._difusores.items()):
+            if difusor.trabajador is not trabajador:
+                continue
+            del self._difusores[clave]
+            if difusor.parada:
+                difusor.parada.cancel()
+                difusor.parada = None
+            # Sin captura propia: la parada no toca el hub y no bloquea
+            difusor.detener()
+
+    def detener_todos(self):
+        difusores = list(self._difusores.values())
+        self._difusores.clear()
+        for difusor in difusores:
+            if difusor.parada:
+                difusor.parada.cancel()
+            difusor.detener()
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {
+            'difusores_activos': len(self._difusores),
+            'difusores': [difusor.obtener_estadisticas() for difusor in self._difusores.values()]
+        }
+
+
+# Instancia global del relay MJPEG
+relay_mjpeg = RelayMjpeg()
@@ -0,0 +1,152 @@
+"""
+Control adaptativo de la calidad de streaming por espectador
+"""
+import asyncio
+import psutil
+from typing import Dict, Any, List, Optional
+from app.config import configuracion
+from app.utils.logger import obtener_logger
+
+logger = obtener_logger(__name__)
+
+# Métricas que solo cuentan para bajar de perfil
+METRICAS_SOLO_BAJADA = ("memory_usage",)
+
+
+class ControladorCalidad:
+    """
+    Ajusta el perfil de STREAM_QUALITY_PROFILES de un track de visualización
+
+    Cada QUALITY_ADAPTATION_INTERVAL segundos combina las estadísticas RTCP
+    del espectador (pérdida de paquetes), los frames que su track no alcanzó
+    a enviar, la CPU y memoria del servidor y la cola de inferencia. Si
+    alguna métrica supera su umbral "high" se baja un perfil; si todas
+    quedan por debajo de "medium" durante dos evaluaciones seguidas se sube
+    uno. La memoria del servidor no depende de la calidad del stream: puede
+    forzar una bajada pero no impide recuperarse.
+
+    Solo afecta a lo que ve el espectador: los trabajadores de detección
+    consumen siempre los frames completos del hub de captura.
+    """
+
+    def __init__(self, track, sender=None):
+        self.track = track
+        self.sender = sender
+        self.perfiles: List[str] = list(configuracion.STREAM_QUALITY_PROFILES.keys())
+        self.indice = self.perfiles.index(track.perfil) if track.perfil in self.perfiles else 0
+        self.umbrales = configuracion.QUALITY_THRESHOLDS
+        self.intervalo = configuracion.QUALITY_ADAPTATION_INTERVAL
+
+        self.tarea: Optional[asyncio.Task] = None
+        self.metricas: Dict[str, float] = {}
+        self.cambios = 0
+        self._evaluaciones_buenas = 0
+        self._descartados_previos = track.obtener_descartados()
+
+        # Primera lectura de CPU sin bloquear (psutil mide desde la llamada anterior)
+        psutil.cpu_percent(interval=None)
+
+    @property
+    def perfil(self) -> str:
+        return self.perfiles[self.indice]
+
+    def iniciar(self):
+        self.tarea = asyncio.create_task(self._bucle())
+
+    def detener(self):
+        if self.tarea:
+            self.tarea.cancel()
+            self.tarea = None
+
+    async def _bucle(self):
+        try:
+            while True:
+                await asyncio.sleep(self.intervalo)
+                try:
+                    await self._evaluar()
+                except Exception as e:
+                    logger.error(f"Error evaluando calidad de {self.track.cliente_id}: {e}")
+        except asyncio.CancelledError:
+            pass
+
+    async def _perdida_rtcp(self) -> float:
+        """Porcentaje de paquetes perdidos según los Receiver Reports del navegador"""
+        if self.sender is None:
+            return 0.0
+
+        perdida = 0.0
+        informe = await self.sender.getStats()
+        for estadistica in informe.values():
+            if estadistica.type == "remote-inbound-rtp":
+                perdida = max(perdida, self.fraccion_perdida(estadistica.fractionLost))
+        return perdida * 100
+
+    @staticmethod
+    def fraccion_perdida(fraction_lost: Optional[int]) -> float:
+        """aiortc entrega el `fraction_lost` crudo del RTCP: 0-255 en unidades de 1/256"""
+        return (fraction_lost or 0) / 256
+
+    def _descartes_locales(self) -> float:
+        """Porcentaje de frames que el track no pudo enviar a tiempo en el intervalo"""
+        descartados = self.track.obtener_descartados()
+        nuevos = max(0, descartados - self._descartados_previos)
+        self._descartados_previos = descartados
+
+        frames_esperados = max(1.0, self.intervalo * self.track.fps_objetivo())
+        return min(100.0, nuevos / frames_esperados * 100)
+
+    @staticmethod
+    def _cola_inferencia() -> float:
+        from app.ai.inference_scheduler import planificador_inferencia, planificador_personas
+        return float(
+            planificador_inferencia.obtener_estadisticas()['en_cola'] +
+            planificador_personas.obtener_estadisticas()['en_cola']
+        )
+
+    async def _recolectar_metricas(self) -> Dict[str, float]:
+        return {
+            'cpu_usage': psutil.cpu_percent(interval=None),
+            'memory_usage': psutil.virtual_memory().percent,
+            'frame_drop_rate': max(await self._perdida_rtcp(), self._descartes_locales()),
+            'inference_backlog': self._cola_inferencia()
+        }
+
+    async def _evaluar(self):
+        self.metricas = await self._recolectar_metricas()
+
+        saturado = [
+            nombre for nombre, valor in self.metricas.items()
+            if nombre in self.umbrales and valor >= self.umbrales[nombre]['high']
+        ]
+        holgado = all(
+            valor < self.umbrales[nombre]['medium']
+            for nombre, valor in self.metricas.items()
+            if nombre in self.umbrales and nombre not in METRICAS_SOLO_BAJADA
+        )
+
+        if saturado:
+            self._evaluaciones_buenas = 0
+            if self.indice < len(self.perfiles) - 1:
+                self._cambiar(self.indice + 1, f"saturación en {', '.join(saturado)}")
+        elif holgado:
+            self._evaluaciones_buenas += 1
+            if self._evaluaciones_buenas >= 2 and self.indice > 0:
+                self._evaluaciones_buenas = 0
+                self._cambiar(self.indice - 1, "recursos holgados")
+        else:
+            self._evaluaciones_buenas = 0
+
+    def _cambiar(self, indice: int, motivo: str):
+        anterior = self.perfil
+        self.indice = indice
+        self.cambios += 1
+        self.track.aplicar_perfil(self.perfil)
+        logger.info(f"Calidad de {self.track.cliente_id}: {anterior} → {self.perfil} ({motivo})")
+        print(f"🎚️ Calidad de {self.track.cliente_id}: {anterior} → {self.perfil} ({motivo})")
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {
+            'perfil': self.perfil,
+            'cambios': self.cambios,
+            'metricas': self.metricas
+        }
@@ -0,0 +1,402 @@
+"""
+Relay de streaming: una codificación H.264 por cámara compartida por todos los espectadores
+"""
+import asyncio
+import threading
+import av
+from fractions import Fraction
+from typing import Dict, Any, List, Optional, Tuple
+from av.video.frame import PictureType
+from app.config import configuracion
+from app.services.camera_hub import camera_hub, RanuraFrame
+from app.services.capture_sources import FuenteCaptura
+from app.utils.logger import obtener_logger
+
+logger = obtener_logger(__name__)
+
+# Reloj RTP de video (90 kHz)
+BASE_TIEMPO_VIDEO = Fraction(1, 90000)
+
+
+def bitrate_a_bps(bitrate) -> int:
+    """Convierte "1500k"/"2M"/1500000 a bits por segundo"""
+    if isinstance(bitrate, (int, float)):
+        return int(bitrate)
+    texto = str(bitrate).strip().lower()
+    multiplicador = {'k': 1_000, 'm': 1_000_000}.get(texto[-1:], 1)
+    if multiplicador > 1:
+        texto = texto[:-1]
+    return int(float(texto) * multiplicador)
+
+
+class SuscripcionRelay:
+    """
+    Cola de paquetes codificados de un espectador
+
+    Un flujo H.264 no admite saltarse paquetes: si el espectador se retrasa
+    y su cola se llena, se vacía y se espera al siguiente keyframe en lugar
+    de entregar P-frames que no podría decodificar.
+    """
+
+    def __init__(self, tamano_cola: int):
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=tamano_cola)
+        self.esperando_keyframe = True
+        self.descartados = 0
+
+    def entregar(self, paquete: av.Packet) -> bool:
+        """Encola un paquete; devuelve False si el espectador necesita un keyframe"""
+        if self.esperando_keyframe:
+            if not paquete.is_keyframe:
+                self.descartados += 1
+                return True
+            self.esperando_keyframe = False
+
+        try:
+            self.cola.put_nowait(paquete)
+            return True
+        except asyncio.QueueFull:
+            # Espectador lento: descartar lo pendiente y resincronizar en un keyframe
+            while not self.cola.empty():
+                self.cola.get_nowait()
+                self.descartados += 1
+            self.descartados += 1
+            self.esperando_keyframe = True
+            return False
+
+
+class RelayCamara:
+    """
+    Codificador compartido de una cámara
+
+    Toma los frames crudos del hub de captura o, con detección, la salida
+    anotada del trabajador de la cámara (ya dibujada una sola vez), los
+    codifica una vez en H.264 y reparte los paquetes a cada espectador. El
+    coste de visualización crece con las cámaras, no con los espectadores.
+
+    Con `perfil` (uno de STREAM_QUALITY_PROFILES) se codifica a la
+    resolución, FPS y bitrate del perfil; los espectadores que comparten
+    perfil comparten también la codificación.
+    """
+
+    def __init__(
+        self,
+        camara_id: int,
+        trabajador=None,
+        fuente: Optional[FuenteCaptura] = None,
+        fps: Optional[int] = None,
+        perfil: Optional[str] = None
+    ):
+        self.camara_id = camara_id
+        self.trabajador = trabajador
+        self.fuente = fuente
+        self.perfil = perfil
+        self.fps = fps or configuracion.CAMERA_FPS
+        self.ancho = configuracion.DISPLAY_WIDTH
+        self.alto = configuracion.DISPLAY_HEIGHT
+        self.bitrate = configuracion.STREAM_RELAY_BITRATE
+        self.fps_maximo: Optional[float] = None
+
+        if perfil is not None:
+            datos_perfil = configuracion.STREAM_QUALITY_PROFILES[perfil]
+            self.ancho, self.alto = datos_perfil["width"], datos_perfil["height"]
+            self.fps_maximo = datos_perfil["fps"]
+            self.bitrate = bitrate_a_bps(datos_perfil["bitrate"])
+
+        self.ranura: Optional[RanuraFrame] = None
+        self.captura = None
+        self.tarea: Optional[asyncio.Task] = None
+        self.codificador = None
+        self.running = False
+        # El trabajador se detuvo: los espectadores deben volver al relay crudo
+        self.retirado = False
+
+        self._suscripciones: List[SuscripcionRelay] = []
+        self._forzar_keyframe = threading.Event()
+        # Serializa la apertura y liberación de la captura (se hacen en hilos)
+        self._lock_captura = threading.Lock()
+        self._pts_inicial: Optional[float] = None
+        self._ultimo_pts = -1
+        self._ultimo_timestamp: Optional[float] = None
+
+        # Estadísticas
+        self.frames_codificados = 0
+        self.keyframes = 0
+        self.bytes_codificados = 0
+
+    @property
+    def anotado(self) -> bool:
+        return self.trabajador is not None
+
+    def iniciar(self):
+        """
+        Arranca el bucle de codificación sin bloquear el loop
+
+        La suscripción al hub (que puede abrir el dispositivo) la hace la
+        propia tarea en un hilo; la del trabajador anotado es inmediata.
+        """
+        self.ranura = RanuraFrame()
+        self.running = True
+
+        if self.anotado:
+            self.trabajador.agregar_espectador(self.ranura)
+
+        self.tarea = asyncio.create_task(self._codificar_frames())
+
+    def detener(self, bloqueante: bool = False):
+        """
+        Detiene la codificación y libera la fuente de frames
+
+        Con un loop en marcha la captura se libera en un hilo (cerrar el
+        dispositivo puede bloquear); `bloqueante` la libera en el acto.
+        """
+        self.running = False
+        if self.tarea:
+            self.tarea.cancel()
+            self.tarea = None
+
+        if self.anotado:
+            self.trabajador.quitar_espectador(self.ranura)
+        else:
+            try:
+                loop = None if bloqueante else asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is None:
+                self._liberar_captura()
+            else:
+                loop.run_in_executor(None, self._liberar_captura)
+
+        self.codificador = None
+        print(f"📡 Relay detenido para cámara {self.camara_id}")
+
+    def _suscribir_captura(self):
+        """Hilo: se suscribe al hub salvo que el relay ya se haya detenido"""
+        with self._lock_captura:
+            if not self.running:
+                return
+            self.captura = camera_hub.suscribir(
+                self.camara_id, self._recibir_frame, fuente=self.fuente, fps=self.fps
+            )
+            self.fps = self.captura.fps
+
+    def _liberar_captura(self):
+        """Hilo: libera la suscripción al hub si llegó a abrirse"""
+        with self._lock_captura:
+            if self.captura is None:
+                return
+            try:
+                camera_hub.desuscribir(self.camara_id, self._recibir_frame)
+            except Exception as e:
+                logger.error(f"Error liberando la captura de cámara {self.camara_id}: {e}")
+            self.captura = None
+
+    def _recibir_frame(self, frame_data: Dict[str, Any]):
+        """Hilo de captura: solo se conserva el último frame"""
+        self.ranura.publicar(frame_data)
+
+    def suscribir(self) -> SuscripcionRelay:
+        suscripcion = SuscripcionRelay(configuracion.STREAM_RELAY_QUEUE_SIZE)
+        self._suscripciones.append(suscripcion)
+        # Un espectador nuevo no puede decodificar hasta el siguiente keyframe
+        self._forzar_keyframe.set()
+        return suscripcion
+
+    def desuscribir(self, suscripcion: SuscripcionRelay) -> int:
+        """Quita un espectador y devuelve cuántos quedan"""
+        if suscripcion in self._suscripciones:
+            self._suscripciones.remove(suscripcion)
+        return len(self._suscripciones)
+
+    def _crear_codificador(self, ancho: int, alto: int):
+        codificador = av.CodecContext.create("libx264", "w")
+        codificador.width = ancho
+        codificador.height = alto
+        codificador.pix_fmt = "yuv420p"
+        codificador.time_base = BASE_TIEMPO_VIDEO
+        codificador.framerate = Fraction(int(round(self.fps)), 1)
+        codificador.bit_rate = self.bitrate
+        codificador.gop_size = max(1, int(self.fps * configuracion.STREAM_RELAY_GOP_SECONDS))
+        # Mismo perfil que el codificador H.264 de aiortc (compatible con los navegadores)
+        codificador.options = {
+            "profile": "baseline",
+            "level": "31",
+            "preset": "ultrafast",
+            "tune": "zerolatency"
+        }
+        return codificador
+
+    def _codificar(self, vistas, timestamp: float) -> List[av.Packet]:
+        """Convierte y codifica un frame (se ejecuta fuera del loop)"""
+        # Vista memoizada del frame: ajustada al perfil sin deformar
+        frame = vistas.visualizacion(self.ancho, self.alto)
+        alto, ancho = frame.shape[:2]
+
+        if self.codificador is None or (self.codificador.width, self.codificador.height) != (ancho, alto):
+            self.codificador = self._crear_codificador(ancho, alto)
+            self._forzar_keyframe.set()
+
+        # BGR → YUV420 en una sola pasada de swscale
+        video_frame = av.VideoFrame.from_ndarray(frame, format="bgr24").reformat(format="yuv420p")
+
+        if self._pts_inicial is None:
+            self._pts_inicial = timestamp
+        pts = int((timestamp - self._pts_inicial) / BASE_TIEMPO_VIDEO)
+        pts = max(pts, self._ultimo_pts + 1)
+        self._ultimo_pts = pts
+        video_frame.pts = pts
+        video_frame.time_base = BASE_TIEMPO_VIDEO
+
+        if self._forzar_keyframe.is_set():
+            self._forzar_keyframe.clear()
+            video_frame.pict_type = PictureType.I
+
+        paquetes = self.codificador.encode(video_frame)
+        for paquete in paquetes:
+            paquete.time_base = BASE_TIEMPO_VIDEO
+        return paquetes
+
+    async def _codificar_frames(self):
+        loop = asyncio.get_running_loop()
+        ultima_secuencia = 0
+
+        try:
+            if not self.anotado:
+                try:
+                    await asyncio.to_thread(self._suscribir_captura)
+                except Exception as e:
+                    logger.error(f"Error abriendo la captura de cámara {self.camara_id}: {e}")
+                    print(f"❌ Error abriendo la captura de cámara {self.camara_id}: {e}")
+                    return
+            if self.fps_maximo:
+                self.fps = min(self.fps, self.fps_maximo)
+            print(f"📡 Relay iniciado para cámara {self.camara_id} "
+                  f"({'anotado' if self.anotado else 'crudo'}, {self.ancho}x{self.alto}@{self.fps:.0f})")
+
+            while self.running:
+                nuevo = await self.ranura.esperar(ultima_secuencia, timeout=1.0)
+                if nuevo is None or not self._suscripciones:
+                    continue
+                ultima_secuencia, frame_data = nuevo
+
+                # Perfiles con menos FPS que la captura: saltar frames (tolerancia del 10%)
+                timestamp = frame_data['timestamp']
+                if (self._ultimo_timestamp is not None
+                        and timestamp - self._ultimo_timestamp < 0.9 / self.fps):
+                    continue
+                self._ultimo_timestamp = timestamp
+
+                try:
+                    paquetes = await loop.run_in_executor(
+                        None, self._codificar, frame_data['vistas'], timestamp
+                    )
+                except Exception as e:
+                    logger.error(f"Error codificando frame de cámara {self.camara_id}: {e}")
+                    print(f"❌ Error codificando frame de cámara {self.camara_id}: {e}")
+                    self.codificador = None
+                    continue
+
+                self.frames_codificados += 1
+                for paquete in paquetes:
+                    self.bytes_codificados += paquete.size
+                    if paquete.is_keyframe:
+                        self.keyframes += 1
+                    for suscripcion in list(self._suscripciones):
+                        if not suscripcion.entregar(paquete):
+                            self._forzar_keyframe.set()
+
+        except asyncio.CancelledError:
+            pass
+        finally:
+            print(f"Codificación del relay finalizada para cámara {self.camara_id}")
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {
+            'camara_id': self.camara_id,
+            'anotado': self.anotado,
+            'perfil': self.perfil,
+            'espectadores': len(self._suscripciones),
+            'resolucion': f"{self.ancho}x{self.alto}",
+            'fps': self.fps,
+            'frames_codificados': self.frames_codificados,
+            'keyframes': self.keyframes,
+            'bytes_codificados': self.bytes_codificados,
+            'paquetes_descartados': sum(s.descartados for s in self._suscripciones),
+            'frames': self.ranura.obtener_estadisticas() if self.ranura else {}
+        }
+
+
+class RelayStreaming:
+    """
+    Registro de relays por (camara_id, trabajador, perfil)
+
+    El primer espectador de una variante crea su codificador y el último en
+    irse lo detiene. Los relays anotados se identifican por el trabajador
+    concreto: al reactivar una cámara su nuevo trabajador tiene relays nuevos
+    y los del trabajador detenido se retiran.
+    """
+
+    def __init__(self):
+        self._relays: Dict[Tuple[int, Any, Optional[str]], RelayCamara] = {}
+
+    @staticmethod
+    def _clave(camara_id: int, trabajador, perfil: Optional[str]) -> Tuple[int, Any, Optional[str]]:
+        return camara_id, trabajador, perfil
+
+    def suscribir(
+        self,
+        camara_id: int,
+        trabajador=None,
+        fuente: Optional[FuenteCaptura] = None,
+        fps: Optional[int] = None,
+        perfil: Optional[str] = None
+    ) -> Tuple[RelayCamara, SuscripcionRelay]:
+        """Suscribe un espectador a la salida cruda o, con `trabajador`, a la anotada"""
+        clave = self._clave(camara_id, trabajador, perfil)
+        relay = self._relays.get(clave)
+        if relay is None:
+            relay = RelayCamara(camara_id, trabajador=trabajador, fuente=fuente, fps=fps, perfil=perfil)
+            relay.iniciar()
+            self._relays[clave] = relay
+
+        return relay, relay.suscribir()
+
+    def desuscribir(self, relay: RelayCamara, suscripcion: SuscripcionRelay):
+        restantes = relay.desuscribir(suscripcion)
+        if restantes == 0:
+            clave = self._clave(relay.camara_id, relay.trabajador, relay.perfil)
+            if self._relays.get(clave) is relay:
+                del self._relays[clave]
+            relay.detener()
+
+    def soltar_trabajador(self, trabajador):
+        """
+        Retira los relays anotados de un trabajador que se detiene
+
+        Los que no tienen espectadores se detienen; los demás quedan marcados
+        como retirados y sus espectadores vuelven al relay crudo (el último en
+        irse lo detiene).
+        """
+        for clave, relay in list(self._relays.items()):
+            if relay.trabajador is not trabajador:
+                continue
+            del self._relays[clave]
+            relay.retirado = True
+            if not relay._suscripciones:
+                relay.detener()
+
+    def detener_todos(self):
+        """Detiene todos los relays (apagado de la aplicación)"""
+        relays = list(self._relays.values())
+        self._relays.clear()
+        for relay in relays:
+            relay.detener(bloqueante=True)
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {
+            'relays_activos': len(self._relays),
+            'relays': [relay.obtener_estadisticas() for relay in self._relays.values()]
+        }
+
+
+# Instancia global del relay de streaming
+relay_streaming = RelayStreaming()
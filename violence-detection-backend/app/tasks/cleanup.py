@@ -9,8 +9,9 @@ from app.config import configuracion
 from app.utils.logger import obtener_logger
 from app.utils.file_utils import ManejadorArchivos
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, or_
 from app.models.incident import Incidente
+from app.services.incident_service import ServicioIncidentes
 from app.core.database import obtener_db
 
 logger = obtener_logger(__name__)
@@ -57,7 +58,10 @@ async def limpiar_videos_antiguos(dias_retencion: int = 30):
             query = select(Incidente).where(
                 and_(
                     Incidente.fecha_creacion < fecha_limite,
-                    Incidente.video_evidencia_path.isnot(None)
+                    or_(
+                        Incidente.video_evidencia_path.isnot(None),
+                        Incidente.video_storage_key.isnot(None)
+                    )
                 )
             )
             
@@ -67,7 +71,14 @@ async def limpiar_videos_antiguos(dias_retencion: int = 30):
             videos_eliminados = 0
             espacio_liberado = 0
             
+            claves_almacen = {}
+            
             for incidente in incidentes_antiguos:
+                # Videos del almacén: se quita la referencia y el objeto se borra al final
+                if incidente.video_storage_key:
+                    claves_almacen[incidente.video_storage_key] = incidente.video_file_size or 0
+                    incidente.video_storage_key = None
+                
                 if incidente.video_evidencia_path:
                     video_path = Path(incidente.video_evidencia_path)
                     
@@ -100,6 +111,13 @@ async def limpiar_videos_antiguos(dias_retencion: int = 30):
             
             await db.commit()
             
+            # Un objeto compartido con incidentes más recientes se conserva
+            servicio = ServicioIncidentes(db)
+            for clave, tamaño in claves_almacen.items():
+                if await servicio.liberar_evidencia(clave):
+                    videos_eliminados += 1
+                    espacio_liberado += tamaño
+            
             # Reportar resultados
             espacio_mb = espacio_liberado / (1024 * 1024)
             logger.info(
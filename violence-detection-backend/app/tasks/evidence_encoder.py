@@ -0,0 +1,264 @@
+"""
+Codificador incremental de evidencias: H.264/MP4 listo para web mientras ocurre el incidente
+"""
+import av
+import queue
+import threading
+import numpy as np
+from datetime import datetime
+from fractions import Fraction
+from pathlib import Path
+from typing import Dict, Any, Optional, Union
+from app.config import configuracion
+from app.services.stream_relay import bitrate_a_bps
+from app.tasks.preroll_buffer import descomprimir_frame
+from app.utils.logger import obtener_logger
+
+logger = obtener_logger(__name__)
+
+# Marca de fin de la cola de escritura
+_FIN = object()
+
+# Base de tiempo de entrada al filtro fps (milisegundos)
+BASE_TIEMPO_ENTRADA = Fraction(1, 1000)
+
+
+class CodificadorEvidencia:
+    """
+    Escribe un video de evidencia frame a frame en un único codificador H.264
+
+    Se abre al iniciar la grabación, recibe primero el pre-roll y luego cada
+    frame nuevo. La codificación ocurre en un hilo propio alimentado por una
+    cola acotada, así quien entrega frames nunca espera al codificador; si la
+    cola se llena el frame se descarta y se cuenta.
+
+    El MP4 resultante (baseline, yuv420p, faststart) ya es reproducible en
+    el navegador: no hace falta una segunda conversión con ffmpeg.
+
+    Cada frame real entra una sola vez con su PTS de captura y el filtro
+    `fps` de libavfilter produce la salida a FPS constante repitiendo o
+    saltando frames por referencia (x264 codifica las repeticiones casi
+    gratis). La cámara lenta de los tramos de violencia es un estiramiento
+    del reloj (`factor_lento`), no copias del frame.
+    """
+
+    def __init__(
+        self,
+        ruta: Path,
+        ancho: int,
+        alto: int,
+        fps: int,
+        tamano_cola: int,
+        max_segundos: Optional[float] = None,
+        factor_lento: float = 1.0
+    ):
+        self.ruta = Path(ruta)
+        self.ancho = ancho
+        self.alto = alto
+        self.fps = fps
+        self.max_segundos = max_segundos
+        self.factor_lento = max(1.0, factor_lento)
+
+        self.cola: queue.Queue = queue.Queue(maxsize=tamano_cola)
+        self.hilo: Optional[threading.Thread] = None
+        self.contenedor = None
+        self.stream = None
+        self.grafo = None
+        self.error: Optional[Exception] = None
+
+        # Reloj del video (ms): avanza con los timestamps de captura, estirado en violencia
+        self._ultima_captura: Optional[datetime] = None
+        self._reloj_ms = 0.0
+        self._ultimo_pts = -1
+        self._ultimo_frame = None
+
+        # Estadísticas
+        self.frames_recibidos = 0
+        self.frames_escritos = 0
+        self.frames_descartados = 0
+        self.frames_violencia = 0
+
+    def iniciar(self):
+        """Abre el contenedor y arranca el hilo de codificación"""
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+
+        calidad = configuracion.VIDEO_QUALITY_SETTINGS.get(
+            configuracion.EVIDENCE_QUALITY, configuracion.VIDEO_QUALITY_SETTINGS["media"]
+        )
+
+        self.contenedor = av.open(
+            str(self.ruta), mode="w", format="mp4",
+            container_options={"movflags": "+faststart"}
+        )
+        self.stream = self.contenedor.add_stream("libx264", rate=Fraction(self.fps, 1))
+        self.stream.width = self.ancho
+        self.stream.height = self.alto
+        self.stream.pix_fmt = "yuv420p"
+        self.stream.codec_context.time_base = Fraction(1, self.fps)
+        self.stream.codec_context.gop_size = self.fps * 2
+        # Mismos parámetros que la antigua conversión web con ffmpeg
+        self.stream.options = {
+            "profile": "baseline",
+            "level": "3.0",
+            "preset": configuracion.EVIDENCE_ENCODER_PRESET,
+            "crf": str(calidad["crf"]),
+            "maxrate": str(bitrate_a_bps(calidad["bitrate"])),
+            "bufsize": str(bitrate_a_bps(calidad["bitrate"]) * 2)
+        }
+
+        self.grafo = self._crear_grafo()
+
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+        print(f"🎞️ Codificador de evidencia abierto: {self.ruta.name} "
+              f"({self.ancho}x{self.alto}@{self.fps}, preset {configuracion.EVIDENCE_ENCODER_PRESET})")
+
+    def _crear_grafo(self):
+        """buffer (PTS de captura) → fps (salida constante) → buffersink"""
+        grafo = av.filter.Graph()
+        fuente = grafo.add_buffer(
+            width=self.ancho, height=self.alto, format="yuv420p", time_base=BASE_TIEMPO_ENTRADA
+        )
+        fps = grafo.add("fps", f"fps={self.fps}")
+        salida = grafo.add("buffersink")
+        fuente.link_to(fps)
+        fps.link_to(salida)
+        grafo.configure()
+        return grafo
+
+    def escribir(
+        self,
+        frame: Union[np.ndarray, bytes],
+        timestamp: datetime,
+        es_violencia: bool = False
+    ) -> bool:
+        """Encola un frame (BGR o JPEG del pre-roll) con su hora de captura; False si se descartó"""
+        # PTS en el reloj del video: el intervalo real desde el frame anterior,
+        # estirado si el frame es de violencia y la cámara lenta está activa
+        if self._ultima_captura is not None:
+            intervalo = max(0.0, (timestamp - self._ultima_captura).total_seconds())
+            self._reloj_ms += intervalo * 1000 * (self.factor_lento if es_violencia else 1.0)
+        self._ultima_captura = timestamp
+        pts = round(self._reloj_ms)
+
+        if self.max_segundos is not None and pts > self.max_segundos * 1000:
+            self.frames_descartados += 1
+            return False
+
+        try:
+            self.cola.put_nowait((frame, pts))
+        except queue.Full:
+            self.frames_descartados += 1
+            return False
+
+        self.frames_recibidos += 1
+        if es_violencia:
+            self.frames_violencia += 1
+        return True
+
+    def _bucle(self):
+        while True:
+            elemento = self.cola.get()
+            if elemento is _FIN:
+                break
+            if self.error is not None:
+                continue
+
+            try:
+                self._codificar(elemento)
+            except Exception as e:
+                self.error = e
+                logger.error(f"Error codificando evidencia {self.ruta.name}: {e}")
+                print(f"❌ Error codificando evidencia {self.ruta.name}: {e}")
+
+    def _codificar(self, elemento):
+        frame, pts = elemento
+        # El pre-roll llega en JPEG: se decodifica aquí, fuera del hilo que entrega frames
+        if isinstance(frame, bytes):
+            frame = descomprimir_frame(frame)
+        video_frame = av.VideoFrame.from_ndarray(frame, format="bgr24")
+        # Conversión a yuv420p (y al tamaño del video si la cámara cambió) en una pasada
+        video_frame = video_frame.reformat(width=self.ancho, height=self.alto, format="yuv420p")
+        self._empujar(video_frame, pts)
+
+    def _empujar(self, video_frame, pts: int):
+        """Entrega un frame al filtro fps y codifica los frames de salida disponibles"""
+        video_frame.pts = max(pts, self._ultimo_pts + 1)
+        video_frame.time_base = BASE_TIEMPO_ENTRADA
+        self._ultimo_pts = video_frame.pts
+        self._ultimo_frame = video_frame
+
+        self.grafo.push(video_frame)
+        self._vaciar_grafo()
+
+    def _vaciar_grafo(self):
+        while True:
+            try:
+                salida = self.grafo.pull()
+            except (BlockingIOError, EOFError):
+                return
+            for paquete in self.stream.encode(salida):
+                self.contenedor.mux(paquete)
+            self.frames_escritos += 1
+
+    def finalizar(self, duracion_minima: float = 0.0) -> Dict[str, Any]:
+        """
+        Vacía la cola, cierra el MP4 y devuelve sus estadísticas (bloqueante)
+
+        El último frame se vuelve a entregar un intervalo después (o en
+        `duracion_minima` si el video no llega): el filtro fps solo emite un
+        frame al ver el instante siguiente, y así el último también dura
+        1/fps y rellena el hueco hasta la duración mínima sin copiar frames.
+        """
+        self.cola.put(_FIN)
+        if self.hilo:
+            self.hilo.join()
+
+        try:
+            if self.error is None:
+                if self._ultimo_frame is not None:
+                    pts_final = max(int(duracion_minima * 1000), self._ultimo_pts + round(1000 / self.fps))
+                    self._empujar(self._ultimo_frame, pts_final)
+
+                # EOF al filtro: emite los frames pendientes
+                self.grafo.push(None)
+                self._vaciar_grafo()
+
+                for paquete in self.stream.encode(None):
+                    self.contenedor.mux(paquete)
+        except Exception as e:
+            self.error = e
+            logger.error(f"Error vaciando el codificador de {self.ruta.name}: {e}")
+        finally:
+            self.contenedor.close()
+
+        if self.error is not None:
+            raise RuntimeError(f"No se pudo codificar la evidencia: {self.error}")
+
+        return self.obtener_estadisticas()
+
+    def cancelar(self):
+        """Descarta la grabación en curso y borra el archivo parcial"""
+        self.error = self.error or RuntimeError("cancelado")
+        self.cola.put(_FIN)
+        if self.hilo:
+            self.hilo.join(timeout=5)
+        try:
+            self.contenedor.close()
+        except Exception:
+            pass
+        self.ruta.unlink(missing_ok=True)
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {
+            'ruta': str(self.ruta),
+            'frames_recibidos': self.frames_recibidos,
+            'frames_escritos': self.frames_escritos,
+            'frames_descartados': self.frames_descartados,
+            'frames_violencia': self.frames_violencia,
+            'factor_lento': self.factor_lento,
+            'duracion_segundos': self.frames_escritos / self.fps,
+            'fps': self.fps,
+            'resolution': f"{self.ancho}x{self.alto}",
+            'codec': 'h264'
+        }
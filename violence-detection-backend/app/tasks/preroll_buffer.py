@@ -0,0 +1,129 @@
+"""
+Buffer circular de pre-roll con frames comprimidos en JPEG y presupuesto de memoria compartido
+"""
+import cv2
+import threading
+import weakref
+import numpy as np
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+from app.config import configuracion
+
+
+def comprimir_frame(frame: np.ndarray, calidad: Optional[int] = None) -> bytes:
+    """Codifica un frame BGR en JPEG"""
+    calidad = calidad or configuracion.EVIDENCE_PREROLL_JPEG_QUALITY
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, calidad])
+    if not ok:
+        raise RuntimeError("cv2.imencode falló")
+    return buffer.tobytes()
+
+
+def descomprimir_frame(jpeg: bytes) -> np.ndarray:
+    """Decodifica un JPEG del buffer a frame BGR"""
+    frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise RuntimeError("cv2.imdecode falló")
+    return frame
+
+
+class BufferPreRoll:
+    """
+    Ventana de los últimos segundos de una cámara, comprimida en JPEG
+
+    Cada entrada es un dict con los metadatos del frame y sus bytes JPEG en
+    'jpeg'; los píxeles solo se decodifican si un incidente llega a guardarse.
+    Se descartan las entradas más antiguas por edad (`max_segundos`), por
+    número (`max_frames`) y por memoria: todos los buffers del proceso
+    comparten EVIDENCE_PREROLL_MEMORY_FRACTION de MAX_MEMORY_USAGE_MB, y
+    cuando ese total se supera cada buffer recorta lo que exceda su parte.
+    """
+
+    # Buffers vivos del proceso para repartir el presupuesto de memoria
+    _instancias: "weakref.WeakSet[BufferPreRoll]" = weakref.WeakSet()
+
+    def __init__(self, max_segundos: float, max_frames: Optional[int] = None):
+        self.max_segundos = max_segundos
+        self.max_frames = max_frames
+        self.entradas: deque = deque()
+        self.bytes_totales = 0
+        self.descartados_por_memoria = 0
+        self._lock = threading.Lock()
+        BufferPreRoll._instancias.add(self)
+
+    @staticmethod
+    def presupuesto_global() -> int:
+        """Bytes disponibles para el pre-roll de todas las cámaras"""
+        return int(configuracion.MAX_MEMORY_USAGE_MB * configuracion.EVIDENCE_PREROLL_MEMORY_FRACTION * 1024 * 1024)
+
+    @classmethod
+    def _bytes_globales(cls) -> int:
+        return sum(buffer.bytes_totales for buffer in list(cls._instancias))
+
+    @classmethod
+    def _cuota(cls) -> int:
+        activos = sum(1 for buffer in list(cls._instancias) if buffer.entradas)
+        return cls.presupuesto_global() // max(1, activos)
+
+    def __len__(self) -> int:
+        return len(self.entradas)
+
+    def agregar(self, frame: np.ndarray, metadatos: Dict[str, Any]) -> Dict[str, Any]:
+        """Comprime el frame y lo agrega; `metadatos` debe incluir 'timestamp' (datetime)"""
+        jpeg = comprimir_frame(frame)
+        entrada = {**metadatos, 'jpeg': jpeg}
+
+        with self._lock:
+            self.entradas.append(entrada)
+            self.bytes_totales += len(jpeg)
+            self._recortar(metadatos['timestamp'])
+
+        return entrada
+
+    def _recortar(self, ahora: datetime):
+        # Edad y número máximo de frames
+        while self.entradas and (ahora - self.entradas[0]['timestamp']).total_seconds() > self.max_segundos:
+            self._descartar_primera()
+        while self.max_frames is not None and len(self.entradas) > self.max_frames:
+            self._descartar_primera()
+
+        # Presupuesto de memoria compartido (siempre se conserva el frame más nuevo)
+        if self._bytes_globales() > self.presupuesto_global():
+            cuota = self._cuota()
+            while len(self.entradas) > 1 and self.bytes_totales > cuota:
+                self._descartar_primera()
+                self.descartados_por_memoria += 1
+
+    def _descartar_primera(self):
+        entrada = self.entradas.popleft()
+        self.bytes_totales -= len(entrada['jpeg'])
+
+    def desde(self, inicio: datetime) -> List[Dict[str, Any]]:
+        """Entradas (comprimidas) con timestamp >= inicio, en orden"""
+        with self._lock:
+            return [entrada for entrada in self.entradas if entrada['timestamp'] >= inicio]
+
+    def ultimas(self, cantidad: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.entradas)[-cantidad:] if cantidad > 0 else []
+
+    @staticmethod
+    def decodificar(entrada: Dict[str, Any]) -> np.ndarray:
+        return descomprimir_frame(entrada['jpeg'])
+
+    def limpiar(self):
+        with self._lock:
+            self.entradas.clear()
+            self.bytes_totales = 0
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        return {
+            'frames': len(self.entradas),
+            'bytes': self.bytes_totales,
+            'bytes_promedio': self.bytes_totales / len(self.entradas) if self.entradas else 0,
+            'descartados_por_memoria': self.descartados_por_memoria,
+            'presupuesto_global_bytes': self.presupuesto_global(),
+            'max_segundos': self.max_segundos,
+            'max_frames': self.max_frames
+        }
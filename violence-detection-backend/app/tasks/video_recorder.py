@@ -1,4 +1,4 @@
-# app/tasks/video_recorder.py - ACTUALIZADO PARA BASE64
+# app/tasks/video_recorder.py - ACTUALIZADO PARA ALMACÉN DE EVIDENCIAS
 import cv2
 import numpy as np
 import threading
@@ -12,12 +12,20 @@ from collections import deque
 from app.config import configuracion
 from app.models.incident import Incidente, EstadoIncidente
 from app.utils.logger import obtener_logger
-from app.utils.video_base64_utils import video_to_base64, get_video_info_detailed  # NUEVO IMPORT
+from app.utils.video_base64_utils import get_video_info_detailed
+from app.services.evidence_store import almacen_evidencias
+from app.tasks.evidence_encoder import CodificadorEvidencia
+from app.tasks.preroll_buffer import BufferPreRoll
 
 logger = obtener_logger(__name__)
 
 class ViolenceEvidenceRecorder:
-    """Grabador de evidencia con conversión a Base64 - ACTUALIZADO"""
+    """
+    Grabador de evidencia: codifica el MP4 durante el incidente y lo guarda en el almacén de evidencias
+
+    Hay uno por pipeline (una cámara): el pre-roll, el video y el incidente
+    de cada cámara nunca se mezclan con los de otra.
+    """
     
     def __init__(self):
         # CONFIGURACIÓN DESDE CONFIG.PY
@@ -36,14 +44,13 @@ class ViolenceEvidenceRecorder:
         self.last_violence_state = False
         self.violence_sequence_count = 0
         
-        # BUFFER PRINCIPAL MÁS GRANDE
+        # BUFFER PRINCIPAL (PRE-ROLL) EN JPEG: se decodifica solo si se guarda un incidente
         buffer_seconds = configuracion.EVIDENCE_BUFFER_SIZE_SECONDS
         max_frames = int(buffer_seconds * self.capture_fps)
-        self.frame_buffer = deque(maxlen=max_frames)
-        self.buffer_lock = threading.Lock()
+        self.frame_buffer = BufferPreRoll(max_segundos=buffer_seconds, max_frames=max_frames)
         
-        # BUFFER DE VIOLENCIA GIGANTE PARA MÁXIMA CAPTURA - AUMENTADO
-        self.violence_sequence_buffer = deque(maxlen=5000)  # AUMENTADO: 5000 frames
+        # REGISTRO DE LA SECUENCIA DE VIOLENCIA: solo metadatos, los píxeles van al codificador
+        self.violence_sequence_buffer = deque(maxlen=5000)
         self.violence_buffer_lock = threading.Lock()
         
         # Cola para procesamiento asíncrono
@@ -60,16 +67,11 @@ class ViolenceEvidenceRecorder:
         # DURACIÓN MÍNIMA GARANTIZADA
         self.min_duration_seconds = 5.0
         
-        # MULTIPLICADOR DE DUPLICACIÓN MASIVA PARA VIOLENCIA
-        self.violence_duplication_multiplier = 12  # AUMENTADO: Cada frame de violencia se duplica 12 veces
-        
-        # CONFIGURACIÓN DE VIDEO
-        opencv_config = configuracion.OPENCV_WRITER_CONFIG if hasattr(configuracion, 'OPENCV_WRITER_CONFIG') else {}
-        fourcc_primary = opencv_config.get('fourcc_primary', 'H264')
-        fourcc_fallback = opencv_config.get('fourcc_fallback', 'mp4v')
+        # CÁMARA LENTA OPCIONAL: estira el reloj del video en los tramos de violencia
+        self.slow_motion_factor = configuracion.EVIDENCE_SLOW_MOTION_FACTOR
         
-        self.fourcc = cv2.VideoWriter_fourcc(*fourcc_primary)
-        self.fourcc_fallback = cv2.VideoWriter_fourcc(*fourcc_fallback)
+        # CODIFICADOR INCREMENTAL: se abre con la grabación y recibe los frames al vuelo
+        self.codificador: Optional[CodificadorEvidencia] = None
         
         # Estadísticas mejoradas
         self.stats = {
@@ -81,23 +83,25 @@ class ViolenceEvidenceRecorder:
             'violence_frames_captured': 0,
             'violence_sequences': 0,
             'last_video_duration': 0.0,
-            'violence_duplications': 0,
-            'base64_conversions': 0,  # NUEVO
-            'base64_size_mb': 0.0     # NUEVO
+            'evidencias_almacenadas': 0,
+            'evidencias_duplicadas': 0,  # Contenido ya presente en el almacén
+            'last_video_size_mb': 0.0
         }
         
         # Crear directorios
         configuracion.VIDEO_EVIDENCE_PATH.mkdir(parents=True, exist_ok=True)
         (configuracion.VIDEO_EVIDENCE_PATH / "temp").mkdir(parents=True, exist_ok=True)
         
-        print(f"📹 EvidenceRecorder CON BASE64 - ACTUALIZADO:")
+        print(f"📹 EvidenceRecorder:")
         print(f"   - FPS Captura: {self.capture_fps}")
         print(f"   - FPS Video: {self.fps}")
-        print(f"   - Buffer Principal: {max_frames} frames ({buffer_seconds}s)")
-        print(f"   - Buffer Violencia: 5000 frames (~250s)")
-        print(f"   - Multiplicador duplicación: {self.violence_duplication_multiplier}x")
+        print(f"   - Buffer Principal: {max_frames} frames ({buffer_seconds}s, JPEG q{configuracion.EVIDENCE_PREROLL_JPEG_QUALITY})")
+        print(f"   - Presupuesto pre-roll: {BufferPreRoll.presupuesto_global() / (1024 * 1024):.0f} MB (todas las cámaras)")
+        print(f"   - Registro de violencia: 5000 entradas (solo metadatos)")
+        print(f"   - FPS constante por PTS de captura (cámara lenta en violencia: {self.slow_motion_factor}x)")
         print(f"   - Duración mínima garantizada: {self.min_duration_seconds}s")
-        print(f"   - 🆕 CONVERSIÓN A BASE64 HABILITADA")
+        print(f"   - Codificación H.264 incremental (preset {configuracion.EVIDENCE_ENCODER_PRESET})")
+        print(f"   - Almacén de evidencias: {almacen_evidencias.nombre}")
     
     def start_processing(self):
         """Inicia el hilo de procesamiento"""
@@ -105,7 +109,7 @@ class ViolenceEvidenceRecorder:
             self.running = True
             self.save_thread = threading.Thread(target=self._process_save_queue, daemon=True)
             self.save_thread.start()
-            print("🚀 Procesamiento de evidencias con Base64 iniciado")
+            print("🚀 Procesamiento de evidencias iniciado")
     
     def stop_processing(self):
         """Detiene el procesamiento"""
@@ -117,8 +121,19 @@ class ViolenceEvidenceRecorder:
             self.save_thread.join(timeout=5)
         print("🛑 Procesamiento de evidencias detenido")
     
-    def add_frame(self, frame: np.ndarray, detections: List[Dict], violence_info: Optional[Dict] = None):
-        """CORREGIDO: Verificación robusta de parámetros de entrada"""
+    def add_frame(
+        self,
+        frame: np.ndarray,
+        detections: List[Dict],
+        violence_info: Optional[Dict] = None,
+        timestamp: Optional[datetime] = None
+    ):
+        """
+        CORREGIDO: Verificación robusta de parámetros de entrada
+
+        `timestamp` es la hora de captura del frame: de ella sale el PTS del
+        video de evidencia. Sin ella se usa la hora actual.
+        """
         
         # *** VERIFICACIÓN CRÍTICA DE ENTRADA ***
         if frame is None:
@@ -200,8 +215,7 @@ class ViolenceEvidenceRecorder:
         
         # *** VERIFICACIÓN AL CREAR frame_data ***
         frame_data = {
-            'frame': frame_copy,
-            'timestamp': datetime.now(),
+            'timestamp': timestamp if timestamp is not None else datetime.now(),
             'datetime': datetime.now(),
             'detections': detections if detections is not None else [],
             'violence_info': violence_info if violence_info is not None else {},
@@ -218,169 +232,82 @@ class ViolenceEvidenceRecorder:
         
         # *** VERIFICACIÓN ANTES DE AGREGAR AL BUFFER ***
         if frame_data is not None and isinstance(frame_data, dict):
-            # 1) Siempre alimentar el buffer principal
-            with self.buffer_lock:
-                self.frame_buffer.append(frame_data)
+            # 1) Siempre alimentar el buffer principal (comprimido)
+            try:
+                self.frame_buffer.agregar(frame_copy, frame_data)
+            except Exception as e:
+                print(f"❌ Error comprimiendo frame para el pre-roll: {e}")
+            
+            # 2) Con grabación activa el frame va directo al codificador de evidencia
+            if self.codificador is not None:
+                self.codificador.escribir(frame_copy, frame_data['timestamp'], violence_detected)
             
-            # 2) *** CORRECCIÓN: Captura MÁS INTELIGENTE para secuencias completas ***
+            # 3) *** CORRECCIÓN: Captura MÁS INTELIGENTE para secuencias completas ***
             if is_violence_sequence or violence_detected:
                 with self.violence_buffer_lock:
-                    # Frame original SIEMPRE
+                    # Cada frame una sola vez: la duración la da su timestamp, no copias
                     self.violence_sequence_buffer.append(frame_data)
-                    
-                    # *** CORRECCIÓN: Duplicación inteligente basada en importancia ***
-                    if violence_detected and violence_probability > 0.7:
-                        # VIOLENCIA CONFIRMADA: Duplicación masiva
-                        duplications = self.violence_duplication_multiplier
-                        duplication_type = 'confirmed_violence'
-                    elif is_violence_sequence and violence_info.get('es_secuencia_violencia', False):
-                        # SECUENCIA DE ANÁLISIS: Duplicación moderada
-                        duplications = self.violence_duplication_multiplier // 2  # *** 6 duplicaciones ***
-                        duplication_type = 'analysis_sequence'
-                    elif violence_info.get('es_contexto_secuencia', False):
-                        # CONTEXTO DURANTE VIOLENCIA: Duplicación mínima
-                        duplications = 3
-                        duplication_type = 'context_sequence'
-                    else:
-                        duplications = 0
-                        duplication_type = 'none'
-                    
-                    # Realizar duplicaciones
-                    for i in range(duplications):
-                        duplicate = frame_data.copy()
-                        duplicate['frame'] = frame_copy.copy()
-                        duplicate['frame_type'] = duplication_type
-                        duplicate['duplicate_id'] = i + 1
-                        self.violence_sequence_buffer.append(duplicate)
-                    
-                    if duplications > 0:
-                        self.stats['violence_duplications'] += duplications
-                        print(f"🔥 Frame {duplication_type} P={violence_probability:.3f} - {duplications+1} copias guardadas")
-                    
                     self.stats['violence_frames_captured'] += 1
         
-        # 3) Actualizar estadísticas y contadores
+        # 4) Actualizar estadísticas y contadores
         self.frame_counter += 1
         self.last_frame_time = current_time
         self.last_violence_state = violence_detected
         self.stats['frames_added'] += 1
 
     def _save_evidence_video(self, save_data: Dict):
-        """*** MÉTODO PRINCIPAL ACTUALIZADO PARA BASE64 ***"""
+        """*** MÉTODO PRINCIPAL: cierra el MP4 codificado durante el incidente y lo guarda en el almacén de evidencias ***"""
+        codificador: CodificadorEvidencia = save_data['codificador']
+        incidente_id = save_data.get('incidente_id')
+        temp_video_path = codificador.ruta
+        
         try:
-            frames_data = save_data['frames']
-            camara_id = save_data['camara_id']
-            violence_start_time = save_data['violence_start_time']
-            incidente_id = save_data.get('incidente_id')
-            
-            # **CORREGIR: Asegurar que violence_start_time sea datetime**
-            if isinstance(violence_start_time, (int, float)):
-                violence_start_time = datetime.fromtimestamp(violence_start_time)
-            elif isinstance(violence_start_time, str):
-                violence_start_time = datetime.fromisoformat(violence_start_time)
-            elif not isinstance(violence_start_time, datetime):
-                violence_start_time = datetime.now()
-                print(f"⚠️ violence_start_time tenía tipo inesperado: {type(violence_start_time)}")
-            
-            if not frames_data:
-                print("❌ No hay frames para guardar")
-                return
-            
-            # *** PASO 1: GUARDAR VIDEO TEMPORAL ***
-            timestamp_str = violence_start_time.strftime("%Y%m%d_%H%M%S")
-            nombre_archivo = f"evidencia_camara{camara_id}_{timestamp_str}.mp4"
-            
-            # Crear archivo temporal para conversión
-            temp_dir = configuracion.VIDEO_EVIDENCE_PATH / "temp"
-            temp_dir.mkdir(parents=True, exist_ok=True)
-            temp_video_path = temp_dir / nombre_archivo
+            # *** PASO 1: CERRAR EL VIDEO (solo quedan en cola los últimos frames) ***
+            print(f"📹 Cerrando video de evidencia: {temp_video_path.name}")
+            video_stats = codificador.finalizar(duracion_minima=self.min_duration_seconds)
             
-            print(f"📹 Guardando video temporal: {nombre_archivo}")
-            print(f"📹 Dimensiones: {self.frame_width}x{self.frame_height}")
-            print(f"📹 FPS objetivo: {self.fps}")
-            print(f"📹 Frames disponibles: {len(frames_data)}")
+            frames_escritos = video_stats['frames_escritos']
+            frames_con_violencia = video_stats['frames_violencia']
             
-            # Configurar el escritor de video
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Usar mp4v como en el ejemplo
+            print(f"📹 Dimensiones: {video_stats['resolution']}")
+            print(f"📹 FPS objetivo: {video_stats['fps']}")
+            print(f"📹 Frames escritos: {frames_escritos} (descartados: {video_stats['frames_descartados']})")
             
-            out = cv2.VideoWriter(
-                str(temp_video_path),
-                fourcc,
-                self.fps,
-                (self.frame_width, self.frame_height)
-            )
-            
-            if not out.isOpened():
-                print(f"❌ Error: No se pudo abrir el escritor de video para {temp_video_path}")
+            if frames_escritos == 0:
+                print("❌ No hay frames para guardar")
+                temp_video_path.unlink(missing_ok=True)
                 return
             
-            frames_escritos = 0
-            frames_con_violencia = 0
-            
-            # Escribir frames al video temporal
-            for frame_data in frames_data:
-                if frame_data and 'frame' in frame_data:
-                    frame = frame_data['frame']
-                    if frame is not None and frame.size > 0:
-                        # Redimensionar si es necesario
-                        if frame.shape[:2] != (self.frame_height, self.frame_width):
-                            frame = cv2.resize(frame, (self.frame_width, self.frame_height))
-                        
-                        out.write(frame)
-                        frames_escritos += 1
-                        
-                        # Contar frames con violencia
-                        if frame_data.get('is_violence_frame', False):
-                            frames_con_violencia += 1
-            
-            out.release()
-            
-            # *** PASO 2: CONVERTIR A BASE64 ***
-            print(f"🔄 Convirtiendo video a Base64...")
-            
+            # *** PASO 2: GUARDAR EN EL ALMACÉN (el MP4 ya es H.264 web, sin reconversión) ***
             if not temp_video_path.exists():
                 print(f"❌ Error: El archivo temporal no se creó: {temp_video_path}")
                 return
             
-            # Obtener información del video antes de conversión
             video_info = get_video_info_detailed(str(temp_video_path))
-            
-            # Convertir a Base64 usando las utilidades (como en tu ejemplo)
-            base64_data = video_to_base64(str(temp_video_path))
-            
-            if not base64_data:
-                print("❌ Error: No se pudo convertir el video a Base64")
-                # Limpiar archivo temporal
-                try:
-                    temp_video_path.unlink()
-                except:
-                    pass
-                return
+            objeto = almacen_evidencias.guardar_archivo(temp_video_path)
             
             # *** PASO 3: CALCULAR ESTADÍSTICAS ***
-            file_size = temp_video_path.stat().st_size
-            duracion_segundos = frames_escritos / self.fps
-            base64_size_mb = len(base64_data) / (1024 * 1024)
+            file_size = objeto['tamano']
+            duracion_segundos = video_stats['duracion_segundos']
+            file_size_mb = file_size / (1024 * 1024)
             
-            print(f"✅ Video convertido a Base64 exitosamente:")
-            print(f"📹 Tamaño original: {file_size / (1024*1024):.2f} MB")
-            print(f"📹 Tamaño Base64: {base64_size_mb:.2f} MB")
-            print(f"📹 Caracteres Base64: {len(base64_data)}")
+            print(f"✅ Video guardado en almacén {almacen_evidencias.nombre}: {objeto['clave']}")
+            print(f"📹 Tamaño: {file_size_mb:.2f} MB{'' if objeto['nuevo'] else ' (contenido ya existente)'}")
             print(f"📹 Frames: {frames_escritos}")
             print(f"📹 Duración: {duracion_segundos:.2f} segundos")
             print(f"🔥 Contenido de violencia: {frames_con_violencia} frames ({frames_con_violencia/frames_escritos*100:.1f}%)")
             
-            # *** PASO 4: ACTUALIZAR INCIDENTE CON BASE64 ***
+            # *** PASO 4: REFERENCIAR LA EVIDENCIA DESDE EL INCIDENTE ***
             if incidente_id:
-                self._actualizar_incidente_con_base64(incidente_id, base64_data, {
+                self._actualizar_incidente_con_evidencia(incidente_id, objeto, {
                     'frames_total': frames_escritos,
                     'frames_violencia': frames_con_violencia,
                     'duracion_segundos': duracion_segundos,
-                    'tamaño_mb': base64_size_mb,
+                    'tamaño_mb': file_size_mb,
                     'file_size': file_size,
-                    'fps': self.fps,
-                    'resolution': f"{self.frame_width}x{self.frame_height}",
-                    'codec': 'mp4v',
+                    'fps': video_stats['fps'],
+                    'resolution': video_stats['resolution'],
+                    'codec': video_stats['codec'],
                     'video_info': video_info
                 })
             
@@ -394,27 +321,28 @@ class ViolenceEvidenceRecorder:
             # Actualizar estadísticas
             self.stats['videos_saved'] += 1
             self.stats['last_video_duration'] = duracion_segundos
-            self.stats['base64_conversions'] += 1
-            self.stats['base64_size_mb'] = base64_size_mb
+            self.stats['evidencias_almacenadas'] += 1
+            if not objeto['nuevo']:
+                self.stats['evidencias_duplicadas'] += 1
+            self.stats['last_video_size_mb'] = file_size_mb
             
         except Exception as e:
-            print(f"❌ Error guardando video con Base64: {e}")
+            print(f"❌ Error guardando video de evidencia: {e}")
             import traceback
             print(traceback.format_exc())
+            temp_video_path.unlink(missing_ok=True)
 
-    def _actualizar_incidente_con_base64(self, incidente_id: int, base64_data: str, stats: Dict):
-        """*** NUEVO: Actualiza el incidente con Base64 en lugar de archivo ***"""
+    def _actualizar_incidente_con_evidencia(self, incidente_id: int, objeto: Dict[str, Any], stats: Dict):
+        """Referencia el video del almacén desde el incidente (clave, tamaño y duración)"""
         try:
             import requests
             
-            print(f"📝 Actualizando incidente {incidente_id} con Base64")
-            print(f"📊 Tamaño Base64: {len(base64_data)} caracteres")
+            print(f"📝 Actualizando incidente {incidente_id} con evidencia {objeto['clave']}")
             print(f"📊 Duración: {stats['duracion_segundos']:.2f}s")
             
-            # Preparar datos de actualización con Base64
             datos_actualizacion = {
-                # *** NUEVOS CAMPOS BASE64 ***
-                'video_base64': base64_data,
+                # *** EVIDENCIA EN ALMACÉN ***
+                'video_storage_key': objeto['clave'],
                 'video_file_size': stats['file_size'],
                 'video_duration': stats['duracion_segundos'],
                 'video_codec': stats['codec'],
@@ -433,9 +361,9 @@ class ViolenceEvidenceRecorder:
                         'frames_violencia': stats['frames_violencia'],
                         'duracion_segundos': stats['duracion_segundos'],
                         'tamaño_archivo_mb': stats['tamaño_mb'],
-                        'tamaño_base64_mb': len(base64_data) / (1024 * 1024),
-                        'base64_length': len(base64_data),
-                        'generado_por': 'evidence_recorder_base64',
+                        'sha256': objeto['sha256'],
+                        'almacen': almacen_evidencias.nombre,
+                        'generado_por': 'evidence_recorder',
                         'codec': stats['codec'],
                         'fps': stats['fps'],
                         'resolution': stats['resolution'],
@@ -444,24 +372,21 @@ class ViolenceEvidenceRecorder:
                 }
             }
             
-            print(f"🔗 Datos a enviar: Base64={len(base64_data)} chars, Codec={stats['codec']}")
-            
             # Realizar petición HTTP al endpoint interno
             response = requests.patch(
                 f"http://localhost:8000/api/v1/incidents/{incidente_id}/internal",
                 json=datos_actualizacion,
-                timeout=30  # Aumentar timeout para Base64 grandes
+                timeout=10
             )
             
             if response.status_code == 200:
-                print(f"✅ Incidente {incidente_id} actualizado con Base64 exitosamente")
-                print(f"💾 Base64 guardado en DB: {len(base64_data)} caracteres")
+                print(f"✅ Incidente {incidente_id} actualizado con evidencia en almacén")
             else:
                 print(f"❌ Error actualizando incidente: {response.status_code}")
                 print(f"❌ Respuesta: {response.text}")
                 
         except Exception as e:
-            print(f"❌ Error actualizando incidente {incidente_id} con Base64: {e}")
+            print(f"❌ Error actualizando incidente {incidente_id} con evidencia: {e}")
             import traceback
             print(traceback.format_exc())
     
@@ -470,7 +395,7 @@ class ViolenceEvidenceRecorder:
         if self.is_recording:
             return
         
-        print(f"🚨 Iniciando grabación de evidencia CON BASE64")
+        print(f"🚨 Iniciando grabación de evidencia (almacén {almacen_evidencias.nombre})")
         
         # **CORREGIR: Manejar tanto datetime como float**
         if isinstance(violence_datetime, datetime):
@@ -482,237 +407,52 @@ class ViolenceEvidenceRecorder:
             print(f"⚠️ Tipo inesperado para violence_datetime: {type(violence_datetime)}")
         
         self.is_recording = True
+        self._abrir_codificador()
         
         # Estadísticas del buffer actual
-        with self.buffer_lock:
-            buffer_size = len(self.frame_buffer)
+        buffer_size = len(self.frame_buffer)
         
         with self.violence_buffer_lock:
             violence_buffer_size = len(self.violence_sequence_buffer)
         
         print(f"📊 Buffer principal: {buffer_size} frames")
         print(f"📊 Buffer violencia: {violence_buffer_size} frames")
-        print(f"📊 Conversión a Base64: HABILITADA")
-    
-    def _extract_evidence_frames(self) -> List[Dict]:
-        """CORREGIDO: Extracción con verificación robusta de frames None"""
-        # 1) Obtener frames de ambos buffers
-        with self.buffer_lock:
-            main_frames = list(self.frame_buffer)
-        
-        with self.violence_buffer_lock:
-            violence_frames = list(self.violence_sequence_buffer)
-        
-        # *** CORRECCIÓN CRÍTICA: Filtrar frames None INMEDIATAMENTE ***
-        main_frames = [f for f in main_frames if f is not None]
-        violence_frames = [f for f in violence_frames if f is not None]
-        
-        print(f"📹 Frames filtrados: {len(main_frames)} principales, {len(violence_frames)} violencia")
-        
-        # *** CORRECCIÓN: Análisis seguro por TIPO de frame ***
-        violence_confirmed = []
-        violence_sequence = []
-        violence_context = []
-        
-        for f in violence_frames:
-            if f is not None and isinstance(f, dict):
-                if f.get('is_violence_frame', False):
-                    violence_confirmed.append(f)
-                elif f.get('is_violence_sequence', False):
-                    violence_sequence.append(f)
-        
-        for f in main_frames:
-            if f is not None and isinstance(f, dict):
-                violence_info = f.get('violence_info')
-                if violence_info is not None and isinstance(violence_info, dict):
-                    if violence_info.get('es_contexto_secuencia', False):
-                        violence_context.append(f)
-        
-        print(f"📹 Análisis de frames por tipo:")
-        print(f"   - Violencia confirmada: {len(violence_confirmed)} frames")
-        print(f"   - Secuencia de análisis: {len(violence_sequence)} frames")  
-        print(f"   - Contexto de violencia: {len(violence_context)} frames")
-        
-        # *** CORRECCIÓN: Construcción segura de video ***
-        combined_frames = {}
-        
-        # PASO 1: Agregar frames de contexto como base
-        for frame in main_frames:
-            if frame is not None and isinstance(frame, dict):
-                if not frame.get('is_violence_frame', False):  # Solo contexto
-                    timestamp_key = frame['timestamp'].isoformat()
-                    combined_frames[timestamp_key] = frame
-        
-        # PASO 2: SOBRESCRIBIR con frames de secuencia de análisis
-        for frame in violence_sequence:
-            if frame is not None and isinstance(frame, dict):
-                timestamp_key = frame['timestamp'].isoformat()
-                combined_frames[timestamp_key] = frame
-        
-        # PASO 3: SOBRESCRIBIR con frames de violencia confirmada (máxima prioridad)
-        for frame in violence_confirmed:
-            if frame is not None and isinstance(frame, dict):
-                timestamp_key = frame['timestamp'].isoformat()
-                combined_frames[timestamp_key] = frame
-        
-        # PASO 4: Agregar contexto específico de violencia
-        for frame in violence_context:
-            if frame is not None and isinstance(frame, dict):
-                timestamp_key = frame['timestamp'].isoformat()
-                if timestamp_key not in combined_frames:  # Solo si no hay algo mejor
-                    combined_frames[timestamp_key] = frame
-        
-        # 3) Convertir a lista ordenada y filtrar None final
-        frames = [f for f in sorted(combined_frames.values(), key=lambda x: x['timestamp']) if f is not None]
-        
-        # *** ESTADÍSTICAS CORREGIDAS Y SEGURAS ***
-        final_violence_confirmed = 0
-        final_violence_sequence = 0
-        final_context = 0
-        
-        for f in frames:
-            if f is not None and isinstance(f, dict):
-                if f.get('is_violence_frame', False):
-                    final_violence_confirmed += 1
-                elif f.get('is_violence_sequence', False):
-                    final_violence_sequence += 1
-                else:
-                    final_context += 1
-        
-        print(f"📹 Frames combinados: {len(frames)} total")
-        print(f"📹 Frames de violencia confirmada: {final_violence_confirmed}")
-        print(f"📹 Frames de secuencia de análisis: {final_violence_sequence}")
-        print(f"📹 Frames de contexto: {final_context}")
-        
-        if len(frames) > 0:
-            relevance_percentage = ((final_violence_confirmed + final_violence_sequence) / len(frames) * 100)
-            print(f"📹 Porcentaje de contenido relevante: {relevance_percentage:.1f}%")
-        
-        # 4) *** CORRECCIÓN: Verificar contenido MÍNIMO con validación ***
-        min_relevant_frames = 45  # 3 segundos de contenido relevante a 15 FPS
-        current_relevant = final_violence_confirmed + final_violence_sequence
-        
-        if current_relevant < min_relevant_frames:
-            print(f"⚠️ Insuficiente contenido relevante ({current_relevant}/{min_relevant_frames})")
-            print(f"🔄 Expandiendo contenido de violencia...")
-            
-            # Expandir específicamente contenido relevante
-            frames = self._expand_relevant_content(frames, min_relevant_frames)
-        
-        # 5) *** CORRECCIÓN: Garantizar duración MÍNIMA pero ÓPTIMA ***
-        min_frames_needed = int(self.fps * 8)  # 8 segundos para análisis completo
-        max_frames_allowed = int(self.fps * 15) # 15 segundos máximo
-        
-        if len(frames) < min_frames_needed:
-            print(f"⚠️ Expandiendo video de {len(frames)} a {min_frames_needed} frames mínimos")
-            frames = self._expandir_frames_para_duracion_masiva(frames, min_frames_needed)
-        elif len(frames) > max_frames_allowed:
-            print(f"⚠️ Optimizando video de {len(frames)} a {max_frames_allowed} frames máximos")
-            frames = self._optimizar_frames_para_video(frames, max_frames_allowed)
-        
-        # *** FILTRADO FINAL ABSOLUTO ***
-        frames = [f for f in frames if f is not None and isinstance(f, dict)]
-        
-        # *** ESTADÍSTICAS FINALES SEGURAS ***
-        final_violence_after = len([f for f in frames if f.get('is_violence_frame', False)])
-        final_sequence_after = len([f for f in frames if f.get('is_violence_sequence', False) and not f.get('is_violence_frame', False)])
-        
-        print(f"📹 FINAL: {len(frames)} frames para video de evidencia")
-        print(f"📹 Duración estimada: {len(frames)/self.fps:.2f} segundos a {self.fps} FPS")
-        print(f"📹 Violencia confirmada final: {final_violence_after} frames ({(final_violence_after/len(frames)*100):.1f}%)")
-        print(f"📹 Secuencia de análisis final: {final_sequence_after} frames ({(final_sequence_after/len(frames)*100):.1f}%)")
-        print(f"📹 Contenido relevante total: {((final_violence_after + final_sequence_after)/len(frames)*100):.1f}%")
-        
-        return frames
+        print(f"📊 Almacén de evidencias: {almacen_evidencias.nombre}")
     
-    # *** NUEVO MÉTODO: Expandir contenido relevante ***
-    def _expand_relevant_content(self, frames: List[Dict], min_relevant_frames: int) -> List[Dict]:
-        """NUEVO: Expande específicamente el contenido relevante (violencia + secuencia)"""
-        violence_frames = [f for f in frames if f.get('is_violence_frame', False)]
-        sequence_frames = [f for f in frames if f.get('is_violence_sequence', False) and not f.get('is_violence_frame', False)]
-        normal_frames = [f for f in frames if not f.get('is_violence_sequence', False) and not f.get('is_violence_frame', False)]
-        
-        current_relevant = len(violence_frames) + len(sequence_frames)
-        needed_relevant = min_relevant_frames - current_relevant
-        
-        if needed_relevant <= 0:
-            return frames
-        
-        print(f"🔄 Expandiendo contenido relevante: {current_relevant} → {min_relevant_frames}")
-        
-        expanded_relevant = violence_frames + sequence_frames
-        
-        # PRIORIDAD 1: Duplicar frames de violencia confirmada
-        if violence_frames and needed_relevant > 0:
-            violence_duplications = min(needed_relevant, len(violence_frames) * 6)
-            for i in range(violence_duplications):
-                if len(expanded_relevant) >= min_relevant_frames:
-                    break
-                idx = i % len(violence_frames)
-                duplicate = violence_frames[idx].copy()
-                duplicate['frame'] = violence_frames[idx]['frame'].copy()
-                duplicate['timestamp'] = violence_frames[idx]['timestamp'] + timedelta(microseconds=i*50)
-                duplicate['expanded_violence'] = True
-                duplicate['expansion_type'] = 'violence_expansion'
-                expanded_relevant.append(duplicate)
-            
-            needed_relevant = min_relevant_frames - len(expanded_relevant)
-        
-        # PRIORIDAD 2: Duplicar frames de secuencia
-        if sequence_frames and needed_relevant > 0:
-            sequence_duplications = min(needed_relevant, len(sequence_frames) * 4)
-            for i in range(sequence_duplications):
-                if len(expanded_relevant) >= min_relevant_frames:
-                    break
-                idx = i % len(sequence_frames)
-                duplicate = sequence_frames[idx].copy()
-                duplicate['frame'] = sequence_frames[idx]['frame'].copy()
-                duplicate['timestamp'] = sequence_frames[idx]['timestamp'] + timedelta(microseconds=i*75)
-                duplicate['expanded_sequence'] = True
-                duplicate['expansion_type'] = 'sequence_expansion'
-                expanded_relevant.append(duplicate)
+    def _abrir_codificador(self):
+        """Abre el codificador incremental y le entrega el pre-roll del buffer principal"""
+        inicio_pre_roll = self.violence_start_time - timedelta(seconds=configuracion.EVIDENCE_PRE_INCIDENT_SECONDS)
+        pre_roll = self.frame_buffer.desde(inicio_pre_roll)
+        
+        camara_id = getattr(self, 'current_camera_id', 1)
+        timestamp_str = self.violence_start_time.strftime("%Y%m%d_%H%M%S")
+        ruta = configuracion.VIDEO_EVIDENCE_PATH / "temp" / f"evidencia_camara{camara_id}_{timestamp_str}.mp4"
+        
+        codificador = CodificadorEvidencia(
+            ruta,
+            self.frame_width,
+            self.frame_height,
+            self.fps,
+            # La cola absorbe el pre-roll completo sin bloquear a quien entrega frames
+            tamano_cola=len(pre_roll) + configuracion.VIDEO_WRITE_BUFFER_SIZE,
+            max_segundos=configuracion.EVIDENCE_MAX_DURATION_SECONDS,
+            factor_lento=self.slow_motion_factor
+        )
         
-        # Combinar con frames normales
-        all_frames = expanded_relevant + normal_frames
-        all_frames.sort(key=lambda x: x['timestamp'])
+        try:
+            codificador.iniciar()
+        except Exception as e:
+            logger.error(f"No se pudo abrir el codificador de evidencia: {e}")
+            print(f"❌ No se pudo abrir el codificador de evidencia: {e}")
+            return
         
-        print(f"📹 Contenido relevante expandido a {len([f for f in all_frames if f.get('is_violence_frame', False) or f.get('is_violence_sequence', False)])} frames")
+        # Se entregan los JPEG: el hilo del codificador los decodifica
+        for frame_data in pre_roll:
+            codificador.escribir(frame_data['jpeg'], frame_data['timestamp'], frame_data.get('is_violence_frame', False))
         
-        return all_frames
+        self.codificador = codificador
+        print(f"🎞️ Pre-roll entregado al codificador: {len(pre_roll)} frames")
     
-    def _optimizar_frames_para_video(self, frames: List[Dict], max_frames: int) -> List[Dict]:
-        """NUEVO: Optimiza los frames para un video de duración adecuada"""
-        if len(frames) <= max_frames:
-            return frames
-        
-        # Separar frames por tipo
-        violence_frames = [f for f in frames if f.get('is_violence_frame', False)]
-        sequence_frames = [f for f in frames if f.get('is_violence_sequence', False) and not f.get('is_violence_frame', False)]
-        normal_frames = [f for f in frames if not f.get('is_violence_sequence', False) and not f.get('is_violence_frame', False)]
-        
-        print(f"🎬 Optimizando video: {len(violence_frames)} violencia, {len(sequence_frames)} secuencia, {len(normal_frames)} normales")
-        
-        # Prioridad: mantener TODOS los frames de violencia
-        selected = list(violence_frames)
-        remaining_slots = max_frames - len(selected)
-        
-        # Agregar frames de secuencia (análisis)
-        if remaining_slots > 0 and sequence_frames:
-            sequence_to_add = min(len(sequence_frames), remaining_slots // 2)
-            selected.extend(sequence_frames[:sequence_to_add])
-            remaining_slots -= sequence_to_add
-        
-        # Rellenar con frames normales si es necesario
-        if remaining_slots > 0 and normal_frames:
-            normal_to_add = min(len(normal_frames), remaining_slots)
-            selected.extend(normal_frames[:normal_to_add])
-        
-        # Ordenar por timestamp para mantener secuencia temporal
-        selected.sort(key=lambda x: x['timestamp'])
-        
-        print(f"🎬 Video optimizado: {len(selected)} frames seleccionados")
-        return selected
-
     def _draw_violence_overlay_mejorado(self, frame: np.ndarray, violence_info: Dict) -> np.ndarray:
         """CORREGIDO: Overlay diferenciado según tipo de frame"""
         height, width = frame.shape[:2]
@@ -764,53 +504,10 @@ class ViolenceEvidenceRecorder:
         
         return frame
     
-    def _expand_violence_content(self, frames: List[Dict], min_violence_frames: int) -> List[Dict]:
-        """NUEVO: Expande específicamente el contenido de violencia"""
-        violence_frames = [f for f in frames if f.get('is_violence_frame', False)]
-        non_violence_frames = [f for f in frames if not f.get('is_violence_frame', False)]
-        
-        current_violence_count = len(violence_frames)
-        needed_violence_frames = min_violence_frames - current_violence_count
-        
-        if needed_violence_frames <= 0:
-            return frames
-        
-        print(f"🔄 Expandiendo contenido de violencia: {current_violence_count} → {min_violence_frames}")
-        
-        # Expandir frames de violencia existentes
-        expanded_violence = list(violence_frames)
-        
-        # Duplicar frames de violencia para alcanzar el mínimo
-        duplication_rounds = (needed_violence_frames // len(violence_frames)) + 1
-        
-        for round_num in range(duplication_rounds):
-            if len(expanded_violence) >= min_violence_frames:
-                break
-                
-            for original_frame in violence_frames:
-                if len(expanded_violence) >= min_violence_frames:
-                    break
-                    
-                # Crear duplicado con timestamp ligeramente diferente
-                duplicate = original_frame.copy()
-                duplicate['frame'] = original_frame['frame'].copy()
-                duplicate['timestamp'] = original_frame['timestamp'] + timedelta(microseconds=round_num*100)
-                duplicate['expanded_violence'] = True
-                duplicate['expansion_round'] = round_num
-                expanded_violence.append(duplicate)
-        
-        # Combinar con frames no violentos
-        all_frames = expanded_violence + non_violence_frames
-        
-        # Ordenar por timestamp
-        all_frames.sort(key=lambda x: x['timestamp'])
-        
-        return all_frames[:len(frames) + needed_violence_frames]
-    
     def set_current_incident_id(self, incidente_id: int):
         """Establece el ID del incidente actual para el video"""
         self.current_incident_id = incidente_id
-        print(f"📋 Incident ID {incidente_id} asignado al evidence_recorder CON BASE64")
+        print(f"📋 Incident ID {incidente_id} asignado al evidence_recorder")
 
     def _draw_detection(self, frame: np.ndarray, detection: Dict):
         """Dibuja bounding box de persona detectada con tamaño moderado"""
@@ -852,7 +549,8 @@ class ViolenceEvidenceRecorder:
     
     def _process_save_queue(self):
         """Procesa la cola de guardado en hilo separado"""
-        while self.running:
+        # Al detener se vacía la cola: cerrar un video ya codificado cuesta poco
+        while self.running or not self.save_queue.empty():
             try:
                 save_data = self.save_queue.get(timeout=1.0)
                 self._save_evidence_video(save_data)
@@ -868,27 +566,29 @@ class ViolenceEvidenceRecorder:
         return {
             'frames_added': self.stats['frames_added'],
             'violence_frames_captured': self.stats['violence_frames_captured'],
-            'violence_duplications': self.stats['violence_duplications'],
             'violence_sequences': self.stats['violence_sequences'],
             'frames_interpolated': self.stats['frames_interpolated'],
             'videos_saved': self.stats['videos_saved'],
-            'base64_conversions': self.stats['base64_conversions'],  # NUEVO
-            'base64_size_mb': self.stats['base64_size_mb'],         # NUEVO
+            'evidencias_almacenadas': self.stats['evidencias_almacenadas'],
+            'evidencias_duplicadas': self.stats['evidencias_duplicadas'],
+            'last_video_size_mb': self.stats['last_video_size_mb'],
             'last_video_duration': self.stats['last_video_duration'],
             'buffer_size': len(self.frame_buffer),
             'violence_buffer_size': len(self.violence_sequence_buffer),
-            'buffer_max_size': self.frame_buffer.maxlen,
+            'buffer_max_size': self.frame_buffer.max_frames,
+            'buffer_memory': self.frame_buffer.obtener_estadisticas(),
             'violence_buffer_max_size': self.violence_sequence_buffer.maxlen,
             'buffer_density': self.stats['buffer_density'],
             'min_duration_guarantee': self.min_duration_seconds,
-            'duplication_multiplier': self.violence_duplication_multiplier,
+            'slow_motion_factor': self.slow_motion_factor,
             'is_recording': self.is_recording,
+            'encoder': self.codificador.obtener_estadisticas() if self.codificador else None,
             'violence_active': self.violence_active,
             'running': self.running,
             'config_fps': self.fps,
             'config_capture_fps': self.capture_fps,
             'interpolation_enabled': self.interpolation_enabled if hasattr(self, 'interpolation_enabled') else False,
-            'base64_enabled': True  # NUEVO INDICADOR
+            'evidence_store': almacen_evidencias.obtener_estadisticas()
         }
         
     def _finish_recording(self):
@@ -904,16 +604,16 @@ class ViolenceEvidenceRecorder:
             self.is_recording = False
             self.violence_active = False
             
-            # Extraer frames para el video
-            frames_evidencia = self._extract_evidence_frames()
+            # El video ya está codificado: solo falta cerrarlo en el hilo de guardado
+            codificador, self.codificador = self.codificador, None
             
-            if not frames_evidencia:
-                print("❌ No hay frames para crear video de evidencia")
+            if codificador is None:
+                print("❌ No hay codificador de evidencia activo")
                 return
             
             # Preparar datos para guardar
             save_data = {
-                'frames': frames_evidencia,
+                'codificador': codificador,
                 'camara_id': getattr(self, 'current_camera_id', 1),
                 'violence_start_time': self.violence_start_time,
                 'incidente_id': getattr(self, 'current_incident_id', None),
@@ -924,16 +624,12 @@ class ViolenceEvidenceRecorder:
             try:
                 self.save_queue.put_nowait(save_data)
                 print(f"✅ Video de evidencia agregado a cola de guardado")
-                print(f"📊 Frames en video: {len(frames_evidencia)}")
-                
-                # Estadísticas de contenido
-                violence_frames = len([f for f in frames_evidencia if f.get('is_violence_frame', False)])
-                sequence_frames = len([f for f in frames_evidencia if f.get('is_violence_sequence', False)])
-                print(f"📊 Frames de violencia: {violence_frames}")
-                print(f"📊 Frames de secuencia: {sequence_frames}")
+                print(f"📊 Frames en video: {codificador.frames_recibidos}")
+                print(f"📊 Frames de violencia: {codificador.frames_violencia}")
                 
             except queue.Full:
                 print("❌ Cola de guardado llena, descartando video")
+                codificador.cancelar()
                 
         except Exception as e:
             print(f"❌ Error finalizando grabación: {e}")
@@ -952,101 +648,7 @@ class ViolenceEvidenceRecorder:
             self.last_violence_state = False
             self.violence_active = False
 
-    def _expandir_frames_para_duracion_masiva(self, frames_originales: List[Dict], frames_objetivo: int) -> List[Dict]:
-        """MEJORADO: Expande frames para alcanzar duración objetivo priorizando violencia"""
-        if not frames_originales:
-            return []
-        
-        frames_expandidos = frames_originales.copy()
-        
-        # Si ya tenemos suficientes frames, devolver
-        if len(frames_expandidos) >= frames_objetivo:
-            return frames_expandidos[:frames_objetivo]
-        
-        print(f"📹 Expandiendo frames de {len(frames_originales)} a {frames_objetivo}")
-        
-        # Separar frames por tipo para duplicación inteligente
-        violence_frames = [f for f in frames_originales if f.get('is_violence_frame', False)]
-        sequence_frames = [f for f in frames_originales if f.get('is_violence_sequence', False) and not f.get('is_violence_frame', False)]
-        normal_frames = [f for f in frames_originales if not f.get('is_violence_sequence', False) and not f.get('is_violence_frame', False)]
-        
-        frames_faltantes = frames_objetivo - len(frames_expandidos)
-        
-        # PRIORIDAD 1: Duplicar frames de violencia confirmada masivamente
-        if violence_frames and frames_faltantes > 0:
-            duplicaciones_violencia = min(frames_faltantes, len(violence_frames) * 8)
-            for i in range(duplicaciones_violencia):
-                idx = i % len(violence_frames)
-                frame_duplicado = violence_frames[idx].copy()
-                frame_duplicado['frame'] = violence_frames[idx]['frame'].copy()
-                frame_duplicado['timestamp'] = violence_frames[idx]['timestamp'] + timedelta(microseconds=100 + i*10)
-                frame_duplicado['duplicated'] = True
-                frame_duplicado['duplicate_round'] = 'violence_expansion'
-                frames_expandidos.append(frame_duplicado)
-            
-            frames_faltantes = frames_objetivo - len(frames_expandidos)
-            print(f"📹 Duplicación violencia: +{duplicaciones_violencia} frames")
-        
-        # PRIORIDAD 2: Duplicar frames de secuencia de análisis
-        if sequence_frames and frames_faltantes > 0:
-            duplicaciones_secuencia = min(frames_faltantes, len(sequence_frames) * 4)
-            for i in range(duplicaciones_secuencia):
-                idx = i % len(sequence_frames)
-                frame_duplicado = sequence_frames[idx].copy()
-                frame_duplicado['frame'] = sequence_frames[idx]['frame'].copy()
-                frame_duplicado['timestamp'] = sequence_frames[idx]['timestamp'] + timedelta(microseconds=200 + i*20)
-                frame_duplicado['duplicated'] = True
-                frame_duplicado['duplicate_round'] = 'sequence_expansion'
-                frames_expandidos.append(frame_duplicado)
-            
-            frames_faltantes = frames_objetivo - len(frames_expandidos)
-            print(f"📹 Duplicación secuencia: +{duplicaciones_secuencia} frames")
-        
-        # PRIORIDAD 3: Duplicar frames normales si es necesario
-        if normal_frames and frames_faltantes > 0:
-            duplicaciones_normales = min(frames_faltantes, len(normal_frames) * 2)
-            for i in range(duplicaciones_normales):
-                idx = i % len(normal_frames)
-                frame_duplicado = normal_frames[idx].copy()
-                frame_duplicado['frame'] = normal_frames[idx]['frame'].copy()
-                frame_duplicado['timestamp'] = normal_frames[idx]['timestamp'] + timedelta(microseconds=300 + i*30)
-                frame_duplicado['duplicated'] = True
-                frame_duplicado['duplicate_round'] = 'normal_expansion'
-                frames_expandidos.append(frame_duplicado)
-            
-            print(f"📹 Duplicación normal: +{duplicaciones_normales} frames")
-        
-        # PRIORIDAD 4: Si aún faltan frames, repetir todo el ciclo
-        while len(frames_expandidos) < frames_objetivo:
-            frames_faltantes = frames_objetivo - len(frames_expandidos)
-            if frames_faltantes <= 0:
-                break
-            
-            # Repetir todo el conjunto de frames originales
-            for frame in frames_originales[:min(frames_faltantes, len(frames_originales))]:
-                frame_repetido = frame.copy()
-                frame_repetido['frame'] = frame['frame'].copy()
-                frame_repetido['timestamp'] = frame['timestamp'] + timedelta(microseconds=500 + len(frames_expandidos)*5)
-                frame_repetido['repeated'] = True
-                frames_expandidos.append(frame_repetido)
-            
-            # Evitar bucle infinito
-            if len(frames_expandidos) >= frames_objetivo * 2:
-                break
-        
-        # Limitar al objetivo exacto
-        frames_expandidos = frames_expandidos[:frames_objetivo]
-        
-        # Ordenar por timestamp para mantener secuencia temporal
-        frames_expandidos.sort(key=lambda x: x['timestamp'])
-        
-        print(f"📹 Expansión completada: {len(frames_expandidos)} frames finales")
-        return frames_expandidos
-
     def set_camera_id(self, camera_id: int):
         """Establece el ID de la cámara actual"""
         self.current_camera_id = camera_id
         print(f"📹 Camera ID {camera_id} asignado al evidence_recorder")
-
-# Instancia global
-evidence_recorder = ViolenceEvidenceRecorder()
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Respuestas HTTP por rangos de bytes (Range / 206 Partial Content) con ETag y Last-Modified
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Tuple, Union
+from fastapi import Request, Response, status
+from fastapi.responses import StreamingResponse
+
+# Función que produce los bytes [inicio, fin] (inclusive) del contenido
+AbrirRango = Callable[[int, int], Union[Iterator[bytes], AsyncIterator[bytes]]]
+
+
+class RangoNoSatisfacible(Exception):
+    """El rango pedido empieza después del final del contenido"""
+
+
+def formatear_fecha_http(fecha: datetime) -> str:
+    """Fecha en formato HTTP (RFC 7231): 'Wed, 21 Oct 2015 07:28:00 GMT'"""
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return format_datetime(fecha.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def parsear_fecha_http(texto: Optional[str]) -> Optional[datetime]:
+    if not texto:
+        return None
+    try:
+        fecha = parsedate_to_datetime(texto)
+    except (TypeError, ValueError):
+        return None
+    return fecha if fecha.tzinfo else fecha.replace(tzinfo=timezone.utc)
+
+
+def parsear_range(cabecera: Optional[str], tamano: int) -> Optional[Tuple[int, int]]:
+    """
+    (inicio, fin) inclusive de 'bytes=a-b', 'bytes=a-' o 'bytes=-n'
+
+    Devuelve None si no hay cabecera o no se puede usar (otra unidad, varios
+    rangos, sintaxis inválida): se responde el contenido completo, como
+    permite el RFC 7233. Lanza RangoNoSatisfacible si empieza fuera del contenido.
+    """
+    if not cabecera:
+        return None
+    unidad, _, rangos = cabecera.partition("=")
+    if unidad.strip().lower() != "bytes" or "," in rangos:
+        return None
+
+    inicio_texto, separador, fin_texto = rangos.strip().partition("-")
+    if not separador:
+        return None
+
+    try:
+        if inicio_texto == "":
+            # Sufijo: los últimos n bytes
+            sufijo = int(fin_texto)
+            if sufijo <= 0 or tamano == 0:
+                raise RangoNoSatisfacible()
+            return max(0, tamano - sufijo), tamano - 1
+        inicio = int(inicio_texto)
+        fin = int(fin_texto) if fin_texto else tamano - 1
+    except ValueError:
+        return None
+
+    if inicio >= tamano:
+        raise RangoNoSatisfacible()
+    if fin < inicio:
+        return None
+    return inicio, min(fin, tamano - 1)
+
+
+def _etags(cabecera: str):
+    return [etag.strip().removeprefix("W/") for etag in cabecera.split(",")]
+
+
+def no_modificado(request: Request, etag: str, modificado: Optional[datetime]) -> bool:
+    """If-None-Match (comparación débil) o, si no viene, If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return if_none_match.strip() == "*" or etag.removeprefix("W/") in _etags(if_none_match)
+
+    desde = parsear_fecha_http(request.headers.get("if-modified-since"))
+    return bool(desde and modificado and modificado.replace(microsecond=0) <= desde)
+
+
+def if_range_valido(request: Request, etag: str, modificado: Optional[datetime]) -> bool:
+    """False si If-Range no coincide: el cliente tiene otra versión y el Range se ignora"""
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        # Comparación fuerte: un ETag débil nunca valida un rango
+        return not etag.startswith("W/") and if_range == etag
+    return modificado is not None and if_range == formatear_fecha_http(modificado)
+
+
+def respuesta_con_rangos(
+    request: Request,
+    tamano: int,
+    etag: str,
+    modificado: Optional[datetime],
+    abrir_rango: AbrirRango,
+    media_type: str = "application/octet-stream",
+    headers: Optional[Dict[str, Any]] = None
+) -> Response:
+    """
+    Responde 200, 206, 304 o 416 según las cabeceras condicionales y Range
+
+    Solo se leen los bytes que se envían: `abrir_rango` recibe el rango ya
+    resuelto y el cuerpo se transmite por bloques.
+    """
+    cabeceras = {**(headers or {}), "Accept-Ranges": "bytes", "ETag": etag}
+    if modificado is not None:
+        cabeceras["Last-Modified"] = formatear_fecha_http(modificado)
+
+    if no_modificado(request, etag, modificado):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabeceras)
+
+    rango = None
+    if if_range_valido(request, etag, modificado):
+        try:
+            rango = parsear_range(request.headers.get("range"), tamano)
+        except RangoNoSatisfacible:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**cabeceras, "Content-Range": f"bytes */{tamano}"}
+            )
+
+    if rango is None:
+        inicio, fin = 0, tamano - 1
+        codigo = status.HTTP_200_OK
+    else:
+        inicio, fin = rango
+        codigo = status.HTTP_206_PARTIAL_CONTENT
+        cabeceras["Content-Range"] = f"bytes {inicio}-{fin}/{tamano}"
+
+    cabeceras["Content-Length"] = str(fin - inicio + 1)
+    cuerpo = abrir_rango(inicio, fin) if fin >= inicio else iter(())
+
+    return StreamingResponse(cuerpo, status_code=codigo, media_type=media_type, headers=cabeceras)
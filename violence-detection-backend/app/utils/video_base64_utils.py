@@ -7,7 +7,7 @@ import base64
 import subprocess
 import os
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from app.config import configuracion
 from app.utils.logger import obtener_logger
 
@@ -98,10 +98,13 @@ def convert_video_to_web_format(input_path: str, output_path: str) -> bool:
         print(f"❌ Error convirtiendo video: {e}")
         return False
 
-def video_to_base64(video_path: str) -> Optional[str]:
+def video_to_base64(video_path: str, convertir_web: bool = True) -> Optional[str]:
     """
     Convierte un archivo de video a Base64 con conversión web-compatible
     Basado exactamente en el ejemplo funcional de Prueba_video_base64
+
+    Con convertir_web=False el archivo ya es H.264 apto para navegador (el del
+    codificador incremental de evidencias) y se codifica tal cual.
     """
     try:
         # Verificar que el archivo existe
@@ -109,19 +112,23 @@ def video_to_base64(video_path: str) -> Optional[str]:
             print(f"❌ Error: El archivo no existe: {video_path}")
             return None
         
-        # Crear archivo temporal convertido
-        base_name = os.path.splitext(os.path.basename(video_path))[0]
-        temp_dir = configuracion.VIDEO_EVIDENCE_PATH / "temp"
-        temp_dir.mkdir(parents=True, exist_ok=True)
-        converted_path = temp_dir / f"{base_name}_web.mp4"
-        
-        # Convertir a formato web-compatible
-        if not convert_video_to_web_format(video_path, str(converted_path)):
-            print("❌ Error: No se pudo convertir el video a formato web")
-            return None
-        
-        # Usar el archivo convertido para Base64
-        final_path = converted_path
+        converted_path = None
+        if convertir_web:
+            # Crear archivo temporal convertido
+            base_name = os.path.splitext(os.path.basename(video_path))[0]
+            temp_dir = configuracion.VIDEO_EVIDENCE_PATH / "temp"
+            temp_dir.mkdir(parents=True, exist_ok=True)
+            converted_path = temp_dir / f"{base_name}_web.mp4"
+            
+            # Convertir a formato web-compatible
+            if not convert_video_to_web_format(video_path, str(converted_path)):
+                print("❌ Error: No se pudo convertir el video a formato web")
+                return None
+            
+            # Usar el archivo convertido para Base64
+            final_path = converted_path
+        else:
+            final_path = video_path
         
         file_size = os.path.getsize(final_path)
         print(f"📏 Tamaño del archivo convertido: {file_size} bytes")
@@ -153,11 +160,12 @@ def video_to_base64(video_path: str) -> Optional[str]:
                 return None
         
         # Limpiar archivo convertido temporal
-        try:
-            os.remove(converted_path)
-            print(f"🗑️ Archivo convertido temporal eliminado: {converted_path}")
-        except:
-            pass
+        if converted_path is not None:
+            try:
+                os.remove(converted_path)
+                print(f"🗑️ Archivo convertido temporal eliminado: {converted_path}")
+            except:
+                pass
         
         return base64_data
             
@@ -230,4 +238,22 @@ def validate_base64_video(base64_data: str) -> bool:
         
     except Exception as e:
         print(f"❌ Error validando Base64: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+def tamano_base64_decodificado(longitud: int, final: str = "") -> int:
+    """Bytes que representa un Base64 de `longitud` caracteres terminado en `final`, sin decodificarlo"""
+    return longitud // 4 * 3 - final[-2:].count("=")
+
+
+def caracteres_base64_para_rango(inicio: int, fin: int) -> Tuple[int, int, int]:
+    """
+    Caracteres [desde, hasta) que contienen los bytes [inicio, fin] de un Base64
+
+    Cada grupo de 4 caracteres decodifica 3 bytes, así que el rango se
+    alinea a grupos completos; el tercer valor son los bytes a descartar al
+    principio de lo decodificado.
+    """
+    desde = inicio // 3 * 4
+    hasta = (fin // 3 + 1) * 4
+    return desde, hasta, inicio % 3
@@ -0,0 +1,79 @@
+"""
+Microbenchmark del preprocesamiento TimesFormer: cadena original vs. kernel fusionado
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+import cv2
+import numpy as np
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.ai.timesformer_processor import TimesFormerProcessor, BufferClipTimesFormer
+
+
+def preprocesar_cadena_original(processor: TimesFormerProcessor, frames) -> np.ndarray:
+    """Reproduce la cadena anterior: cvtColor → canvas nuevo → float64 → stack/transpose/astype"""
+    config = processor.config
+    procesados = []
+    for frame in frames:
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame_padded, _ = processor.resize_and_pad(frame_rgb)
+        normalizado = frame_padded.astype(np.float32) / 255.0
+        normalizado = (normalizado - np.array(config["mean"])) / np.array(config["std"])
+        procesados.append(normalizado)
+
+    batch = np.stack(procesados, axis=0).transpose(3, 0, 1, 2)
+    return np.expand_dims(batch, axis=0).astype(np.float16)
+
+
+def medir(nombre: str, funcion, repeticiones: int) -> float:
+    """Ejecuta la función varias veces y devuelve ms por llamada"""
+    funcion()  # Calentamiento
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    ms = (time.perf_counter() - inicio) * 1000 / repeticiones
+    print(f"{nombre:<40} {ms:8.3f} ms")
+    return ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de preprocesamiento TimesFormer")
+    parser.add_argument("--ancho", type=int, default=640)
+    parser.add_argument("--alto", type=int, default=480)
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    processor = TimesFormerProcessor()
+    num_frames = processor.config["num_frames"]
+    rng = np.random.default_rng(0)
+    frames = [
+        rng.integers(0, 256, (args.alto, args.ancho, 3), dtype=np.uint8)
+        for _ in range(num_frames)
+    ]
+
+    referencia = preprocesar_cadena_original(processor, frames)
+    fusionado = processor.preprocess_frames(frames)
+    diferencia = np.abs(referencia.astype(np.float32) - fusionado.astype(np.float32)).max()
+    print(f"Diferencia máxima vs. cadena original: {diferencia:.5f}\n")
+
+    print(f"Clip de {num_frames} frames {args.ancho}x{args.alto}:")
+    t_original = medir("Cadena original (clip)", lambda: preprocesar_cadena_original(processor, frames), args.repeticiones)
+    t_fusionado = medir("Kernel fusionado (clip)", lambda: processor.preprocess_frames(frames), args.repeticiones)
+
+    buffer = BufferClipTimesFormer(processor)
+    for frame in frames:
+        buffer.agregar(frame)
+    frame = frames[0]
+    t_incremental = medir("Buffer incremental (1 frame + clip)",
+                          lambda: (buffer.agregar(frame), buffer.obtener_tensor()), args.repeticiones)
+
+    print(f"\nAceleración fusionado vs. original: {t_original / t_fusionado:.2f}x")
+    print(f"Aceleración incremental vs. original: {t_original / t_incremental:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
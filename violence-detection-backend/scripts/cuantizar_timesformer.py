@@ -0,0 +1,262 @@
+"""
+Cuantización INT8 del modelo TimesFormer ONNX e informe comparativo FP16/FP32/INT8
+
+Uso:
+    python scripts/cuantizar_timesformer.py \
+        --calibracion datos/clips_calibracion \
+        --evaluacion datos/clips_evaluacion \
+        --modo static
+
+`--calibracion` es una carpeta con videos de ejemplo (se usan para calibrar
+los rangos de activación en modo estático). `--evaluacion` contiene una
+subcarpeta por etiqueta de TIMESFORMER_CONFIG["labels"] (p. ej.
+`violencia/` y `no_violencia/`) con clips reservados que no se usaron en la
+calibración.
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import cv2
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.config import configuracion
+from app.ai.timesformer_processor import TimesFormerProcessor
+
+EXTENSIONES_VIDEO = {".mp4", ".avi", ".mov", ".mkv", ".webm"}
+
+
+def listar_videos(carpeta: Path) -> List[Path]:
+    return sorted(p for p in carpeta.rglob("*") if p.suffix.lower() in EXTENSIONES_VIDEO)
+
+
+def extraer_clip(ruta_video: Path, processor: TimesFormerProcessor) -> Optional[np.ndarray]:
+    """Muestrea num_frames frames uniformes del video y devuelve el tensor [1, C, T, H, W] en FP32"""
+    num_frames = processor.config["num_frames"]
+    cap = cv2.VideoCapture(str(ruta_video))
+    try:
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total <= 0:
+            return None
+
+        indices = set(np.linspace(0, total - 1, num_frames).astype(int).tolist())
+        frames = []
+        for indice in range(total):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if indice in indices:
+                frames.append(frame)
+            if len(frames) == num_frames:
+                break
+    finally:
+        cap.release()
+
+    if not frames:
+        return None
+    # Videos muy cortos: repetir el último frame hasta completar el clip
+    while len(frames) < num_frames:
+        frames.append(frames[-1])
+
+    return processor.preprocess_frames(frames).astype(np.float32)
+
+
+class LectorCalibracion(CalibrationDataReader):
+    """Entrega los clips de calibración a quantize_static"""
+
+    def __init__(self, clips: List[np.ndarray], nombre_entrada: str):
+        self._iterador = iter([{nombre_entrada: clip} for clip in clips])
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        return next(self._iterador, None)
+
+
+def crear_sesion(ruta_modelo: Path, precision: str) -> ort.InferenceSession:
+    """Sesión con la misma configuración que MotorTimesFormer"""
+    opciones = ort.SessionOptions()
+    opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    opciones.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    opciones.intra_op_num_threads = configuracion.TIMESFORMER_INTRA_OP_THREADS
+    opciones.inter_op_num_threads = 1
+    if precision == "fp16":
+        opciones.add_session_config_entry('session.gpu.fp16_enable', '1')
+
+    providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] \
+        if configuracion.USE_GPU else ['CPUExecutionProvider']
+    return ort.InferenceSession(str(ruta_modelo), providers=providers, sess_options=opciones)
+
+
+def cuantizar(ruta_fp32: Path, ruta_int8: Path, modo: str, clips_calibracion: List[np.ndarray]):
+    """Genera el modelo INT8 a partir del export FP32"""
+    ruta_int8.parent.mkdir(parents=True, exist_ok=True)
+
+    if modo == "dynamic":
+        print("⚙️ Cuantización dinámica (pesos INT8, activaciones en tiempo de ejecución)")
+        quantize_dynamic(str(ruta_fp32), str(ruta_int8), weight_type=QuantType.QInt8)
+        return
+
+    if not clips_calibracion:
+        raise ValueError("La cuantización estática necesita clips de calibración")
+
+    nombre_entrada = ort.InferenceSession(
+        str(ruta_fp32), providers=['CPUExecutionProvider']
+    ).get_inputs()[0].name
+
+    print(f"⚙️ Cuantización estática QDQ con {len(clips_calibracion)} clips de calibración")
+    quantize_static(
+        str(ruta_fp32),
+        str(ruta_int8),
+        LectorCalibracion(clips_calibracion, nombre_entrada),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+
+
+def cargar_evaluacion(carpeta: Path, processor: TimesFormerProcessor) -> List[Tuple[np.ndarray, int]]:
+    """Carga los clips reservados con su etiqueta según el nombre de la subcarpeta"""
+    etiquetas = processor.config["labels"]
+    muestras = []
+    for indice, etiqueta in enumerate(etiquetas):
+        subcarpeta = carpeta / etiqueta
+        if not subcarpeta.is_dir():
+            print(f"⚠️ No existe {subcarpeta}, se omite la etiqueta '{etiqueta}'")
+            continue
+        for video in listar_videos(subcarpeta):
+            clip = extraer_clip(video, processor)
+            if clip is not None:
+                muestras.append((clip, indice))
+    return muestras
+
+
+def evaluar_variante(
+    precision: str,
+    ruta_modelo: Path,
+    muestras: List[Tuple[np.ndarray, int]],
+    repeticiones: int,
+    tamano_lote: int
+) -> Dict[str, Any]:
+    """Mide latencia (lote 1), throughput (lote N) y exactitud sobre los clips reservados"""
+    sesion = crear_sesion(ruta_modelo, precision)
+    entrada = sesion.get_inputs()[0]
+    tipo = np.float16 if entrada.type == 'tensor(float16)' else np.float32
+    clips = [clip.astype(tipo) for clip, _ in muestras]
+    umbral = configuracion.VIOLENCE_THRESHOLD
+
+    # Exactitud
+    aciertos = 0
+    for clip, (_, etiqueta) in zip(clips, muestras):
+        logits = sesion.run(None, {entrada.name: clip})[0][0].astype(np.float32)
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        prediccion = 1 if probs[1] >= umbral else 0
+        aciertos += int(prediccion == etiqueta)
+
+    # Latencia con lote 1
+    sesion.run(None, {entrada.name: clips[0]})  # Calentamiento
+    tiempos = []
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        sesion.run(None, {entrada.name: clips[i % len(clips)]})
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    # Throughput con lote N (si el modelo admite batch dinámico)
+    dimension_lote = entrada.shape[0] if entrada.shape else None
+    lote = tamano_lote if not isinstance(dimension_lote, int) else min(tamano_lote, dimension_lote)
+    tensor_lote = np.concatenate([clips[i % len(clips)] for i in range(lote)], axis=0)
+    sesion.run(None, {entrada.name: tensor_lote})
+    inicio = time.perf_counter()
+    rondas = max(1, repeticiones // lote)
+    for _ in range(rondas):
+        sesion.run(None, {entrada.name: tensor_lote})
+    throughput = rondas * lote / (time.perf_counter() - inicio)
+
+    return {
+        'precision': precision,
+        'modelo': str(ruta_modelo),
+        'tamano_mb': ruta_modelo.stat().st_size / (1024 * 1024),
+        'latencia_media_ms': float(np.mean(tiempos)),
+        'latencia_p95_ms': float(np.percentile(tiempos, 95)),
+        'tamano_lote': lote,
+        'throughput_clips_s': throughput,
+        'exactitud': aciertos / len(muestras),
+        'clips_evaluados': len(muestras)
+    }
+
+
+def imprimir_informe(resultados: List[Dict[str, Any]]):
+    print(f"\n{'Precisión':<10}{'MB':>8}{'Lat. media':>12}{'Lat. p95':>10}{'Clips/s':>10}{'Exactitud':>11}")
+    for r in resultados:
+        print(f"{r['precision']:<10}{r['tamano_mb']:>8.1f}{r['latencia_media_ms']:>10.1f}ms"
+              f"{r['latencia_p95_ms']:>8.1f}ms{r['throughput_clips_s']:>10.2f}{r['exactitud']:>10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cuantiza TimesFormer a INT8 y compara con FP16/FP32")
+    parser.add_argument("--calibracion", type=Path, required=True, help="Carpeta con clips de calibración")
+    parser.add_argument("--evaluacion", type=Path, required=True, help="Carpeta con clips reservados por etiqueta")
+    parser.add_argument("--modo", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--max-calibracion", type=int, default=64, help="Máximo de clips de calibración")
+    parser.add_argument("--repeticiones", type=int, default=30)
+    parser.add_argument("--informe", type=Path, default=None, help="Ruta del informe JSON")
+    args = parser.parse_args()
+
+    processor = TimesFormerProcessor()
+    ruta_fp32 = configuracion.obtener_ruta_timesformer("fp32")
+    ruta_int8 = configuracion.obtener_ruta_timesformer("int8")
+
+    if not ruta_fp32.exists():
+        print(f"❌ Se necesita el export FP32 para cuantizar: {ruta_fp32}")
+        sys.exit(1)
+
+    clips_calibracion = []
+    if args.modo == "static":
+        for video in listar_videos(args.calibracion)[:args.max_calibracion]:
+            clip = extraer_clip(video, processor)
+            if clip is not None:
+                clips_calibracion.append(clip)
+
+    cuantizar(ruta_fp32, ruta_int8, args.modo, clips_calibracion)
+    print(f"✅ Modelo INT8 guardado en: {ruta_int8}")
+
+    muestras = cargar_evaluacion(args.evaluacion, processor)
+    if not muestras:
+        print("❌ No hay clips de evaluación")
+        sys.exit(1)
+
+    resultados = []
+    for precision in ("fp16", "fp32", "int8"):
+        ruta = configuracion.obtener_ruta_timesformer(precision)
+        if not ruta.exists():
+            print(f"⚠️ Modelo {precision} no encontrado, se omite: {ruta}")
+            continue
+        print(f"📊 Evaluando {precision}...")
+        resultados.append(evaluar_variante(
+            precision, ruta, muestras, args.repeticiones, configuracion.MAX_BATCH_SIZE
+        ))
+
+    imprimir_informe(resultados)
+
+    ruta_informe = args.informe or ruta_int8.with_name("informe_cuantizacion.json")
+    with open(ruta_informe, "w", encoding="utf-8") as f:
+        json.dump({'modo': args.modo, 'resultados': resultados}, f, indent=2, ensure_ascii=False)
+    print(f"\n📝 Informe guardado en: {ruta_informe}")
+    print("Para usar el modelo INT8 en producción: TIMESFORMER_PRECISION=int8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Pruebas del ciclo de vida de las capturas compartidas del hub de cámaras
+"""
+import threading
+import time
+
+import numpy as np
+
+from app.services.camera_hub import CameraHub
+from app.services.capture_sources import FuenteCaptura
+
+
+class FuenteLenta(FuenteCaptura):
+    """Fuente falsa cuyo cierre tarda; registra cuántos dispositivos hay abiertos a la vez"""
+
+    def __init__(self, registro: dict, espera_cierre: float = 0.3):
+        super().__init__()
+        self.registro = registro
+        self.espera_cierre = espera_cierre
+        self._abierta = False
+
+    def abrir(self, ancho: int, alto: int, fps: int):
+        with self.registro['lock']:
+            self.registro['abiertas'] += 1
+            self.registro['maximo'] = max(self.registro['maximo'], self.registro['abiertas'])
+        self._abierta = True
+
+    def leer(self):
+        if self._evento_detener.wait(0.01):
+            return False, None
+        return True, np.zeros((48, 64, 3), dtype=np.uint8)
+
+    def cerrar(self):
+        super().cerrar()
+        time.sleep(self.espera_cierre)
+        self._abierta = False
+        with self.registro['lock']:
+            self.registro['abiertas'] -= 1
+
+    @property
+    def abierta(self) -> bool:
+        return self._abierta
+
+
+def test_suscribir_durante_el_cierre_espera_a_liberar_el_dispositivo():
+    registro = {'lock': threading.Lock(), 'abiertas': 0, 'maximo': 0}
+    hub = CameraHub()
+
+    def suscriptor(frame_data):
+        pass
+
+    hub.suscribir(1, suscriptor, fuente=FuenteLenta(registro), fps=30)
+    cierre = threading.Thread(target=hub.desuscribir, args=(1, suscriptor))
+    cierre.start()
+    time.sleep(0.05)
+
+    # Llega mientras la captura anterior aún se está cerrando
+    captura = hub.suscribir(1, suscriptor, fuente=FuenteLenta(registro), fps=30)
+    cierre.join()
+
+    assert registro['maximo'] == 1
+    assert hub.obtener_captura(1) is captura
+    hub.detener_todas()
+    assert registro['abiertas'] == 0
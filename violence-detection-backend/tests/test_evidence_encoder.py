@@ -0,0 +1,95 @@
+"""
+Pruebas del codificador de evidencias: duración y FPS del MP4 según los timestamps de captura
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+av = pytest.importorskip("av")
+
+from app.tasks.evidence_encoder import CodificadorEvidencia
+from app.tasks.preroll_buffer import comprimir_frame
+
+ANCHO, ALTO, FPS = 160, 120, 10
+INICIO = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def frame(indice: int) -> np.ndarray:
+    imagen = np.zeros((ALTO, ANCHO, 3), dtype=np.uint8)
+    imagen[:, : (indice * 7) % ANCHO] = 255
+    return imagen
+
+
+def codificar(tmp_path, capturas, duracion_minima: float = 0.0, **opciones):
+    """Escribe (segundo, es_violencia) como frames y devuelve (estadísticas, frames y fps del MP4)"""
+    codificador = CodificadorEvidencia(
+        tmp_path / "evidencia.mp4", ANCHO, ALTO, FPS, tamano_cola=len(capturas) + 1, **opciones
+    )
+    codificador.iniciar()
+    for indice, (segundo, es_violencia) in enumerate(capturas):
+        codificador.escribir(frame(indice), INICIO + timedelta(seconds=segundo), es_violencia)
+    estadisticas = codificador.finalizar(duracion_minima)
+
+    with av.open(str(codificador.ruta)) as contenedor:
+        stream = contenedor.streams.video[0]
+        frames = sum(1 for _ in contenedor.decode(stream))
+        fps = float(stream.average_rate)
+    return estadisticas, frames, fps
+
+
+def test_frames_a_su_ritmo_dan_la_duracion_real(tmp_path):
+    capturas = [(i / FPS, False) for i in range(30)]
+    estadisticas, frames, fps = codificar(tmp_path, capturas)
+
+    assert estadisticas['fps'] == FPS
+    assert estadisticas['frames_escritos'] == frames == 30
+    assert estadisticas['duracion_segundos'] == pytest.approx(3.0)
+    assert fps == pytest.approx(FPS)
+
+
+def test_una_captura_lenta_se_rellena_a_fps_constante(tmp_path):
+    # 5 frames en 2 s: el filtro fps repite frames hasta 10 FPS (el último dura 1/fps)
+    capturas = [(i * 0.5, False) for i in range(5)]
+    estadisticas, frames, fps = codificar(tmp_path, capturas)
+
+    assert estadisticas['frames_recibidos'] == 5
+    assert estadisticas['frames_escritos'] == 21
+    assert estadisticas['duracion_segundos'] == pytest.approx(2.1)
+    assert frames == estadisticas['frames_escritos']
+    assert fps == pytest.approx(FPS)
+
+
+def test_duracion_minima_alarga_el_video(tmp_path):
+    capturas = [(i / FPS, False) for i in range(10)]
+    estadisticas, _, _ = codificar(tmp_path, capturas, duracion_minima=4.0)
+
+    assert estadisticas['duracion_segundos'] == pytest.approx(4.0)
+
+
+def test_camara_lenta_estira_solo_los_frames_de_violencia(tmp_path):
+    capturas = [(i / FPS, i >= 10) for i in range(20)]
+    estadisticas, _, _ = codificar(tmp_path, capturas, factor_lento=2.0)
+
+    # 1 s normal + 1 s de violencia al doble de duración
+    assert estadisticas['frames_violencia'] == 10
+    assert estadisticas['duracion_segundos'] == pytest.approx(3.0, abs=2 / FPS)
+
+
+def test_max_segundos_descarta_lo_que_excede(tmp_path):
+    capturas = [(i / FPS, False) for i in range(50)]
+    estadisticas, _, _ = codificar(tmp_path, capturas, max_segundos=2.0)
+
+    assert estadisticas['frames_descartados'] > 0
+    assert estadisticas['duracion_segundos'] <= 2.0 + 2 / FPS
+
+
+def test_acepta_frames_jpeg_del_pre_roll(tmp_path):
+    codificador = CodificadorEvidencia(tmp_path / "preroll.mp4", ANCHO, ALTO, FPS, tamano_cola=20)
+    codificador.iniciar()
+    for indice in range(10):
+        codificador.escribir(comprimir_frame(frame(indice)), INICIO + timedelta(seconds=indice / FPS))
+    estadisticas = codificador.finalizar()
+
+    assert estadisticas['frames_escritos'] == 10
+    assert estadisticas['duracion_segundos'] == pytest.approx(1.0)
@@ -0,0 +1,73 @@
+"""
+Pruebas de la resolución de rangos HTTP y del mapeo de bytes a caracteres base64
+"""
+import base64
+
+import pytest
+
+from app.utils.http_range import RangoNoSatisfacible, parsear_range
+from app.utils.video_base64_utils import caracteres_base64_para_rango, tamano_base64_decodificado
+
+
+class TestParsearRange:
+    def test_sin_cabecera_devuelve_none(self):
+        assert parsear_range(None, 100) is None
+        assert parsear_range("", 100) is None
+
+    def test_rango_cerrado(self):
+        assert parsear_range("bytes=0-9", 100) == (0, 9)
+        assert parsear_range("bytes=10-19", 100) == (10, 19)
+
+    def test_rango_abierto_llega_al_final(self):
+        assert parsear_range("bytes=90-", 100) == (90, 99)
+
+    def test_fin_mas_alla_del_contenido_se_recorta(self):
+        assert parsear_range("bytes=50-1000", 100) == (50, 99)
+
+    def test_sufijo_devuelve_los_ultimos_bytes(self):
+        assert parsear_range("bytes=-10", 100) == (90, 99)
+        assert parsear_range("bytes=-500", 100) == (0, 99)
+
+    @pytest.mark.parametrize("cabecera", [
+        "items=0-9",       # otra unidad
+        "bytes=0-9,20-29", # varios rangos
+        "bytes=abc-9",     # sintaxis inválida
+        "bytes=10",        # sin separador
+        "bytes=20-10",     # fin antes del inicio
+    ])
+    def test_rangos_no_utilizables_devuelven_none(self, cabecera):
+        assert parsear_range(cabecera, 100) is None
+
+    @pytest.mark.parametrize("cabecera, tamano", [
+        ("bytes=100-", 100),
+        ("bytes=150-200", 100),
+        ("bytes=-0", 100),
+        ("bytes=-10", 0),
+    ])
+    def test_rangos_fuera_del_contenido_no_son_satisfacibles(self, cabecera, tamano):
+        with pytest.raises(RangoNoSatisfacible):
+            parsear_range(cabecera, tamano)
+
+
+class TestRangosBase64:
+    DATOS = bytes(range(256)) * 3 + b"\x01\x02"  # 770 bytes: el último grupo lleva relleno
+
+    def _decodificar_rango(self, texto: str, inicio: int, fin: int) -> bytes:
+        desde, hasta, descartar = caracteres_base64_para_rango(inicio, fin)
+        decodificado = base64.b64decode(texto[desde:hasta])
+        return decodificado[descartar:descartar + fin - inicio + 1]
+
+    @pytest.mark.parametrize("inicio, fin", [(0, 0), (0, 2), (1, 1), (2, 7), (3, 5), (100, 400), (765, 769)])
+    def test_el_tramo_decodificado_coincide_con_los_bytes(self, inicio, fin):
+        texto = base64.b64encode(self.DATOS).decode()
+        assert self._decodificar_rango(texto, inicio, fin) == self.DATOS[inicio:fin + 1]
+
+    def test_los_caracteres_van_en_grupos_completos_de_cuatro(self):
+        desde, hasta, descartar = caracteres_base64_para_rango(4, 10)
+        assert (desde, hasta, descartar) == (4, 16, 1)
+        assert desde % 4 == 0 and hasta % 4 == 0
+
+    @pytest.mark.parametrize("longitud", [0, 1, 2, 3, 4, 770])
+    def test_tamano_decodificado_descuenta_el_relleno(self, longitud):
+        texto = base64.b64encode(b"x" * longitud).decode()
+        assert tamano_base64_decodificado(len(texto), texto[-2:]) == longitud
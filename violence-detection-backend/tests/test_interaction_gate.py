@@ -0,0 +1,73 @@
+"""
+Pruebas de la compuerta de interacción (apertura, retención y contadores de clips)
+"""
+import pytest
+
+from app.ai.interaction_gate import CompuertaInteraccion
+
+# Dos personas juntas y dos muy separadas, cajas [x, y, w, h]
+PAREJA_CERCANA = [{'bbox': [100, 100, 50, 150]}, {'bbox': [140, 100, 50, 150]}]
+PAREJA_LEJANA = [{'bbox': [0, 0, 50, 150]}, {'bbox': [1000, 0, 50, 150]}]
+UNA_PERSONA = [{'bbox': [100, 100, 50, 150]}]
+
+
+@pytest.fixture
+def compuerta():
+    compuerta = CompuertaInteraccion(
+        min_personas=2, distancia_maxima=1.0, iou_minimo=0.1, frames_minimos=3, frames_retencion=2
+    )
+    compuerta.habilitada = True
+    return compuerta
+
+
+def test_se_abre_tras_los_frames_minimos_consecutivos(compuerta):
+    assert [compuerta.evaluar(PAREJA_CERCANA) for _ in range(3)] == [False, False, True]
+    assert compuerta.frames_consecutivos == 3
+
+
+def test_una_interrupcion_reinicia_la_cuenta(compuerta):
+    compuerta.evaluar(PAREJA_CERCANA)
+    compuerta.evaluar(PAREJA_CERCANA)
+    assert compuerta.evaluar(PAREJA_LEJANA) is False
+    assert compuerta.frames_consecutivos == 0
+    assert compuerta.evaluar(PAREJA_CERCANA) is False
+
+
+def test_se_mantiene_abierta_durante_la_retencion(compuerta):
+    for _ in range(3):
+        compuerta.evaluar(PAREJA_CERCANA)
+
+    assert compuerta.evaluar(UNA_PERSONA) is True
+    assert compuerta.evaluar(UNA_PERSONA) is False  # La retención (2 frames) se agota aquí
+    assert compuerta.abierta is False
+
+
+def test_deshabilitada_siempre_deja_pasar(compuerta):
+    compuerta.habilitada = False
+    assert compuerta.evaluar([]) is True
+    assert compuerta.abierta is True
+
+
+def test_registrar_clip_cuenta_puntuados_y_omitidos(compuerta):
+    for puntuado in (True, False, False, True, False):
+        compuerta.registrar_clip(puntuado=puntuado)
+
+    estadisticas = compuerta.obtener_estadisticas()
+    assert estadisticas['clips_puntuados'] == 2
+    assert estadisticas['clips_omitidos'] == 3
+    assert estadisticas['ratio_omision'] == pytest.approx(0.6)
+
+
+def test_sin_clips_el_ratio_de_omision_es_cero(compuerta):
+    assert compuerta.obtener_estadisticas()['ratio_omision'] == 0.0
+
+
+def test_reiniciar_conserva_los_contadores_de_clips(compuerta):
+    for _ in range(3):
+        compuerta.evaluar(PAREJA_CERCANA)
+    compuerta.registrar_clip(puntuado=True)
+    compuerta.reiniciar()
+
+    assert compuerta.abierta is False
+    assert compuerta.frames_consecutivos == 0
+    assert compuerta.clips_puntuados == 1
@@ -0,0 +1,115 @@
+"""
+Pruebas de descarte del buffer de pre-roll por edad, por número y por memoria
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.tasks.preroll_buffer import BufferPreRoll
+
+INICIO = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def frame(valor: int) -> np.ndarray:
+    return np.full((48, 64, 3), valor, dtype=np.uint8)
+
+
+def agregar(buffer: BufferPreRoll, indice: int, segundos_por_frame: float = 0.1):
+    return buffer.agregar(frame(indice % 256), {
+        'timestamp': INICIO + timedelta(seconds=indice * segundos_por_frame),
+        'indice': indice
+    })
+
+
+def indices(buffer: BufferPreRoll):
+    return [entrada['indice'] for entrada in buffer.entradas]
+
+
+@pytest.fixture
+def presupuesto(monkeypatch):
+    """Fija el presupuesto global de memoria del pre-roll (en bytes)"""
+    def fijar(bytes_maximos: int):
+        monkeypatch.setattr(BufferPreRoll, "presupuesto_global", staticmethod(lambda: bytes_maximos))
+    fijar(1 << 40)
+    return fijar
+
+
+def test_descarta_por_edad(presupuesto):
+    buffer = BufferPreRoll(max_segundos=1.0)
+    for i in range(30):
+        agregar(buffer, i)
+
+    # Con 0.1 s por frame solo caben los de la última ventana de 1 s
+    assert indices(buffer) == list(range(19, 30))
+    marcas = [entrada['timestamp'] for entrada in buffer.entradas]
+    assert (marcas[-1] - marcas[0]).total_seconds() <= 1.0
+
+
+def test_descarta_por_numero_de_frames(presupuesto):
+    buffer = BufferPreRoll(max_segundos=60, max_frames=5)
+    for i in range(12):
+        agregar(buffer, i)
+
+    assert indices(buffer) == list(range(7, 12))
+
+
+def test_los_bytes_totales_siguen_a_las_entradas(presupuesto):
+    buffer = BufferPreRoll(max_segundos=60, max_frames=4)
+    for i in range(10):
+        agregar(buffer, i)
+
+    assert buffer.bytes_totales == sum(len(entrada['jpeg']) for entrada in buffer.entradas)
+    buffer.limpiar()
+    assert buffer.bytes_totales == 0 and len(buffer) == 0
+
+
+def test_descarta_por_presupuesto_de_memoria(presupuesto):
+    buffer = BufferPreRoll(max_segundos=60)
+    tamano_jpeg = len(agregar(buffer, 0)['jpeg'])
+    buffer.limpiar()
+
+    presupuesto(tamano_jpeg * 4)
+    for i in range(10):
+        agregar(buffer, i)
+
+    assert buffer.bytes_totales <= tamano_jpeg * 4
+    assert indices(buffer)[-1] == 9
+    assert buffer.descartados_por_memoria == 10 - len(buffer)
+
+
+def test_el_presupuesto_se_reparte_entre_buffers_activos(presupuesto):
+    primero = BufferPreRoll(max_segundos=60)
+    segundo = BufferPreRoll(max_segundos=60)
+    tamano_jpeg = len(agregar(primero, 0)['jpeg'])
+    primero.limpiar()
+
+    presupuesto(tamano_jpeg * 8)
+    for i in range(8):
+        agregar(primero, i)
+    for i in range(8):
+        agregar(segundo, i)
+
+    # Con dos buffers activos cada uno recorta a la mitad en su siguiente frame
+    assert segundo.bytes_totales <= tamano_jpeg * 4
+    agregar(primero, 8)
+    assert primero.bytes_totales <= tamano_jpeg * 4
+    assert primero.bytes_totales + segundo.bytes_totales <= tamano_jpeg * 8
+
+
+def test_siempre_conserva_el_frame_mas_reciente(presupuesto):
+    presupuesto(1)
+    buffer = BufferPreRoll(max_segundos=60)
+    for i in range(5):
+        agregar(buffer, i)
+
+    assert indices(buffer) == [4]
+
+
+def test_los_frames_se_recuperan_del_jpeg(presupuesto):
+    buffer = BufferPreRoll(max_segundos=60)
+    entrada = agregar(buffer, 200)
+
+    decodificado = BufferPreRoll.decodificar(entrada)
+    assert decodificado.shape == (48, 64, 3)
+    assert abs(int(decodificado.mean()) - 200) <= 2
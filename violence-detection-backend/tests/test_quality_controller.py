@@ -0,0 +1,105 @@
+"""
+Pruebas del controlador de calidad: pérdida de paquetes RTCP y cambios de perfil
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("psutil")
+
+from app.services.quality_controller import ControladorCalidad
+
+
+class TrackFalso:
+    perfil = "Alta"
+    cliente_id = "cliente-prueba"
+
+    def aplicar_perfil(self, perfil: str):
+        self.perfil = perfil
+
+    def obtener_descartados(self) -> int:
+        return 0
+
+    def fps_objetivo(self) -> float:
+        return 15.0
+
+
+class SenderFalso:
+    def __init__(self, *estadisticas):
+        self.estadisticas = estadisticas
+
+    async def getStats(self):
+        return {f"stat-{i}": estadistica for i, estadistica in enumerate(self.estadisticas)}
+
+
+def informe(tipo: str, fraction_lost):
+    return SimpleNamespace(type=tipo, fractionLost=fraction_lost)
+
+
+@pytest.mark.parametrize("fraction_lost, esperado", [
+    (None, 0.0),
+    (0, 0.0),
+    (1, 1 / 256),
+    (64, 0.25),
+    (128, 0.5),
+    (255, 255 / 256),
+])
+def test_fraction_lost_se_lee_en_unidades_de_1_256(fraction_lost, esperado):
+    assert ControladorCalidad.fraccion_perdida(fraction_lost) == pytest.approx(esperado)
+
+
+def test_perdida_rtcp_en_porcentaje_del_peor_receiver_report():
+    sender = SenderFalso(
+        informe("remote-inbound-rtp", 26),
+        informe("remote-inbound-rtp", 64),
+        informe("outbound-rtp", 255),  # No es un Receiver Report: se ignora
+    )
+    controlador = ControladorCalidad(TrackFalso(), sender)
+
+    assert asyncio.run(controlador._perdida_rtcp()) == pytest.approx(25.0)
+
+
+def test_sin_sender_no_hay_perdida():
+    controlador = ControladorCalidad(TrackFalso())
+    assert asyncio.run(controlador._perdida_rtcp()) == 0.0
+
+
+def evaluar_con(controlador: ControladorCalidad, **metricas):
+    base = {'cpu_usage': 10.0, 'memory_usage': 10.0, 'frame_drop_rate': 0.0, 'inference_backlog': 0.0}
+    base.update(metricas)
+
+    async def recolectar():
+        return dict(base)
+
+    controlador._recolectar_metricas = recolectar
+    asyncio.run(controlador._evaluar())
+
+
+def test_espectador_degradado_recupera_la_calidad():
+    track = TrackFalso()
+    controlador = ControladorCalidad(track)
+
+    # Pérdida alta: baja un perfil
+    evaluar_con(controlador, frame_drop_rate=10.0)
+    assert controlador.indice == 1
+    assert track.perfil == controlador.perfiles[1]
+
+    # Carga normal de un servidor con modelos en memoria: por encima de "low"
+    # pero por debajo de "medium"; tras dos evaluaciones vuelve a subir
+    carga = dict(cpu_usage=50.0, memory_usage=75.0, frame_drop_rate=1.5)
+    evaluar_con(controlador, **carga)
+    assert controlador.indice == 1
+    evaluar_con(controlador, **carga)
+    assert controlador.indice == 0
+    assert track.perfil == controlador.perfiles[0]
+
+
+def test_carga_media_no_sube_de_perfil():
+    track = TrackFalso()
+    controlador = ControladorCalidad(track)
+    evaluar_con(controlador, frame_drop_rate=10.0)
+
+    for _ in range(3):
+        evaluar_con(controlador, cpu_usage=65.0)
+    assert controlador.indice == 1